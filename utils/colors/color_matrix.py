@@ -1,10 +1,13 @@
+import math
 from collections import defaultdict, Counter
 from contextlib import suppress
 from functools import lru_cache
+from heapq import heappop, heappush
 from itertools import islice, cycle, groupby, product, starmap
 from types import SimpleNamespace
 from typing import List, NamedTuple, Tuple, Dict, Optional, Callable, Iterable, Set, Union, Any
 
+import numpy as np
 from PIL import Image
 
 # from lifxlan import RGB, Color, Colors, init_log, timer
@@ -72,6 +75,13 @@ class DupesValids(NamedTuple):
     """
     d: frozenset
     v: frozenset
+    groups: Optional[Tuple[Tuple[int, int], ...]] = None
+
+    @classmethod
+    def from_mask(cls, valid: np.ndarray) -> 'DupesValids':
+        """create from a boolean mask of valid rows/cols, computing `by_group` up front"""
+        idxs = np.arange(len(valid))
+        return cls(frozenset(idxs[~valid].tolist()), frozenset(idxs[valid].tolist()), _groups_from_mask(valid))
 
     @property
     def first_valid(self):
@@ -87,12 +97,48 @@ class DupesValids(NamedTuple):
     @lru_cache()
     def by_group(self):
         """return tuples of (start, end) for valid regions"""
+        if self.groups is not None:
+            return list(self.groups)
         t = sorted(self.v)
         gb = groupby(zip(t, t[1:]), key=lambda p: (p[1] - p[0]) == 1)
         valids = (list(v) for k, v in gb if k)
         return [(v[0][0], v[-1][1]) for v in valids]
 
 
+def _groups_from_mask(valid: np.ndarray) -> Tuple[Tuple[int, int], ...]:
+    """(start, end) of each run of True in `valid`
+
+    matches `DupesValids.by_group`, which skips runs of length 1"""
+    edges = np.diff(np.concatenate(([0], valid.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    keep = ends > starts
+    return tuple(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+def pack_colors(arr: np.ndarray) -> np.ndarray:
+    """pack an (H, W, 3) uint8 array into (H, W) uint32s so a color compares in one op"""
+    arr = arr.astype(np.uint32)
+    return arr[..., 0] << 16 | arr[..., 1] << 8 | arr[..., 2]
+
+
+def dupes_valids_2d(arr: np.ndarray, sentinel_color=None) -> Tuple[DupesValids, DupesValids]:
+    """batched version of `ColorMatrix.duplicates` for both rows and columns
+
+    works on an (H, W, 3) array. with a `sentinel_color`, both masks come from a single
+    comparison over the packed array. without one, rows compare against their first
+    color and columns against theirs.
+    """
+    packed = pack_colors(arr)
+    if sentinel_color is None:
+        row_valid = (packed != packed[:, :1]).any(axis=1)
+        col_valid = (packed != packed[:1]).any(axis=0)
+    else:
+        diff = packed != pack_colors(np.array(tuple(sentinel_color)[:3], dtype=np.uint8))
+        row_valid, col_valid = diff.any(axis=1), diff.any(axis=0)
+    return DupesValids.from_mask(row_valid), DupesValids.from_mask(col_valid)
+
+
 _sentinel = object()
 
 
@@ -124,11 +170,9 @@ class ColorMatrix(List[List[RGB]]):
     @classmethod
     def from_filename(cls, fn) -> 'ColorMatrix':
         """read a png in using pillow and convert to ColorMatrix"""
-        im = Image.open(fn).convert('RGB')
-        px = im.load()
-        return cls([RGB(*px[c, r]).color
-                            for c in range(im.width)]
-                           for r in range(im.height))
+        with Image.open(fn) as im:
+            rows = np.asarray(im.convert('RGB')).tolist()
+        return cls([RGB(*px).color for px in row] for row in rows)
 
     @classmethod
     def from_shape(cls, shape: Shape = default_shape, default: RGB = default_color) -> 'ColorMatrix':
@@ -167,6 +211,10 @@ class ColorMatrix(List[List[RGB]]):
     def width(self) -> int:
         return self.shape[1]
 
+    def to_array(self) -> np.ndarray:
+        """(H, W, 3) uint8 array of colors"""
+        return np.array([[tuple(c)[:3] for c in row] for row in self], dtype=np.uint8)
+
     @property
     def by_coords(self) -> Tuple[RC, RGB]:
         """yield coordinates and their colors"""
@@ -185,14 +233,9 @@ class ColorMatrix(List[List[RGB]]):
 
     def strip(self, strip_color: Optional[RGB] = None) -> 'ColorMatrix':
         """strip out empty rows/cols from sides of image"""
-        row_info = self.duplicates(strip_color)
-        col_info = self.T.duplicates(strip_color)
-
-        res = ([color for c, color in enumerate(row)
-                if col_info.first_valid <= c <= col_info.last_valid]
-               for r, row in enumerate(self)
-               if row_info.first_valid <= r <= row_info.last_valid)
-        return type(self)(res)
+        row_info, col_info = self.dupes_valids(strip_color)
+        c_slice = slice(col_info.first_valid, col_info.last_valid + 1)
+        return type(self)(row[c_slice] for row in self[row_info.first_valid:row_info.last_valid + 1])
 
     def duplicates(self, sentinel_color: Optional[RGB] = None) -> DupesValids:
         """
@@ -212,6 +255,14 @@ class ColorMatrix(List[List[RGB]]):
 
         return DupesValids(frozenset(dupes), frozenset(valids))
 
+    def dupes_valids(self, sentinel_color: Optional[RGB] = None) -> Tuple[DupesValids, DupesValids]:
+        """
+        (rows, cols) `DupesValids` computed in one pass over a packed array
+
+        equivalent to `(self.duplicates(sentinel_color), self.T.duplicates(sentinel_color))`
+        """
+        return dupes_valids_2d(self.to_array(), sentinel_color)
+
     def split(self, split_color: Optional[RGB] = None) -> List['ColorMatrix']:
         """
         split image into boxes based on rows/columns of empty colors
@@ -227,8 +278,7 @@ class ColorMatrix(List[List[RGB]]):
         would end up with 9 images: a, b, ccccccc, d, e, fffffff, g, h, and iiiiiii 6 images
 
         """
-        row_info = self.duplicates(split_color)
-        col_info = self.T.duplicates(split_color)
+        row_info, col_info = self.dupes_valids(split_color)
         return [self.get_range(RC(r_start, c_start), RC(r_end + 1, c_end + 1), default_color)
                 for r_start, r_end in row_info.by_group
                 for c_start, c_end in col_info.by_group]
@@ -308,153 +358,194 @@ class ColorMatrix(List[List[RGB]]):
         return type(self)([converter(c) for c in row] for row in self)
 
     def resize(self, shape: Shape = (8, 8)) -> 'ColorMatrix':
-        """resize image using pillow and return a new ColorMatrix"""
+        """resize image and return a new ColorMatrix. see `resize_array`"""
         if self.shape == shape:
             return self.copy()
+        return type(self)([RGB(*px) for px in row] for row in resize_array(self.to_array(), shape).tolist())
 
-        cm = self
 
-        im = Image.new('RGB', cm.shape, 'black')
-        pixels = im.load()
-        for c, r in product(range(im.width), range(im.height)):
-            with suppress(IndexError):
-                pixels[c, r] = cm[r][c]
+# resizing
 
-        y, x = shape
-        im = im.resize((x, y), Image.ANTIALIAS)
-        pixels = im.load()
-        res = type(self).from_shape(shape)
+_max_kernel_len = 256
+_precision_bits = 32 - 8 - 2  # pillow's fixed point precision for 8 bit images
 
-        for c, r in product(range(im.width), range(im.height)):
-            with suppress(IndexError):
-                res[r][c] = pixels[c, r]
 
-        return res.cast(lambda rgb: RGB(*rgb))
+def _lanczos(x: float) -> float:
+    def sinc(v):
+        return 1.0 if v == 0.0 else math.sin(v * math.pi) / (v * math.pi)
 
+    return sinc(x) * sinc(x / 3) if -3.0 <= x < 3.0 else 0.0
 
-# utils
 
-def to_n_colors(*colors, n=64):
-    return list(islice(cycle(colors), n))
+@lru_cache()
+def _axis_kernel(src_len: int, dst_len: int) -> np.ndarray:
+    """(dst_len, src_len) fixed point weights pillow's LANCZOS filter uses along a single axis
+
+    same math as pillow's `precompute_coeffs` and `normalize_coeffs_8bpc` (Resample.c)
+    """
+    scale = src_len / dst_len
+    filter_scale = max(scale, 1.0)
+    support = 3.0 * filter_scale
+    res = np.zeros((dst_len, src_len), dtype=np.int64)
+    for i in range(dst_len):
+        center = (i + .5) * scale
+        lo = max(int(center - support + .5), 0)
+        hi = min(int(center + support + .5), src_len)
+        weights = [_lanczos((x - center + .5) / filter_scale) for x in range(lo, hi)]
+        total = 0.0
+        for w in weights:
+            total += w
+        for x, w in enumerate(weights, lo):
+            w = w / total if total else w
+            res[i, x] = int(w * (1 << _precision_bits) + (.5 if w >= 0 else -.5))
+    return res
 
 
-class ANode(NamedTuple):
-    """represent a node in A* algo"""
-    parent: Optional['ANode']
-    pos: RC
-    g: int = 0  # distance to start node
-    h: int = 0  # heuristic for distance to goal
+@lru_cache()
+def resize_kernel(src_shape: Shape, dst_shape: Shape) -> Tuple[np.ndarray, np.ndarray]:
+    """row and column weights to resize from `src_shape` to `dst_shape`"""
+    (src_h, src_w), (dst_h, dst_w) = src_shape, dst_shape
+    return _axis_kernel(src_h, dst_h), _axis_kernel(src_w, dst_w)
 
-    @property
-    def f(self) -> float:
-        return self.g + self.h
 
-    @classmethod
-    def create(cls, parent: 'ANode', pos, *goals: RC):
-        g = cls.calc_g(parent)
-        h = cls.calc_h(pos, *goals)
-        return cls(parent, pos, g, h)
+def _pil_resize(arr: np.ndarray, shape: Shape) -> np.ndarray:
+    h, w = arr.shape[:2]
+    im = Image.frombuffer('RGB', (w, h), np.ascontiguousarray(arr).tobytes(), 'raw', 'RGB', 0, 1)
+    y, x = shape
+    return np.asarray(im.resize((x, y), Image.LANCZOS))
 
-    @staticmethod
-    def calc_g(parent: Optional['ANode']):
-        return (parent.g if parent else 0) + 1
 
-    @staticmethod
-    def calc_h(pos: RC, *goals: RC):
-        diffs = (g - pos for g in goals)
-        return min(rc.r ** 2 + rc.c ** 2 for rc in diffs)
+def _apply_kernel(kernel: np.ndarray, arr: np.ndarray) -> np.ndarray:
+    """weighted sums in fixed point, rounded and clamped to 8 bits like pillow's `clip8`"""
+    res = (kernel @ arr + (1 << (_precision_bits - 1))) >> _precision_bits
+    return np.clip(res, 0, 255)
 
-    def __eq__(self, other):
-        return self.pos == other.pos
 
-    def __hash__(self):
-        return hash(self.pos)
+def resize_array(arr: np.ndarray, shape: Shape) -> np.ndarray:
+    """resize an (H, W, 3) uint8 array to `shape`, with the same result as pillow's LANCZOS `Image.resize`
 
+    small images (i.e. tiles) are resized with fixed point weights cached per (src_shape, dst_shape),
+    which is just two small integer matrix multiplies. anything bigger goes through pillow in bulk
+    """
+    src_shape, shape = arr.shape[:2], tuple(shape)
+    if max(*src_shape, *shape) > _max_kernel_len:
+        return _pil_resize(arr, shape)
 
-def _get_path(node: ANode) -> List[RC]:
-    res = [node.pos]
-    p = node.parent
-    while p:
-        res.append(p.pos)
-        p = p.parent
-    res.reverse()
-    return res
+    # like pillow: horizontal pass, then vertical, clamping to 8 bits in between
+    rows, cols = resize_kernel(src_shape, shape)
+    res = _apply_kernel(cols, arr.astype(np.int64))
+    res = _apply_kernel(rows, res.reshape(len(res), -1))
+    return res.astype(np.uint8).reshape(*shape, 3)
 
 
-def _create_children(shape_ul: RC, shape_lr: RC, impassable: Set[RC], n: ANode, goals: Iterable[RC]) -> List[ANode]:
-    offsets = RC(1, 0), RC(0, 1), RC(-1, 0), RC(0, -1)
-    res = []
+# utils
 
-    for o in offsets:
-        rc = n.pos + o
-        if rc in impassable:
-            continue
+def to_n_colors(*colors, n=64):
+    return list(islice(cycle(colors), n))
 
-        if not rc.in_bounds(shape_ul, shape_lr):
-            continue
 
-        res.append(ANode.create(n, rc, *goals))
+class AStarGrid:
+    """precomputed passability grid for a* queries
 
-    return res
+    build once per board and reuse across many start/goal queries.
+    neighbors of every passable cell are computed up front; with `allow_wrap`,
+    they wrap around the edges via modular arithmetic and the heuristic
+    is the toroidal manhattan distance
+    """
 
+    _offsets = RC(1, 0), RC(0, 1), RC(-1, 0), RC(0, -1)
 
-class WrappedGoals(NamedTuple):
-    bounds: Tuple[RC, RC]
-    goals: Set[RC]
-    impassable: Set[RC]
+    def __init__(self, shape: Shape, impassable: Iterable[RC] = frozenset(), *, allow_wrap=False):
+        self.shape = RC(*shape)
+        self.allow_wrap = allow_wrap
+        num_rows, num_cols = self.shape
+        self._blocked = {self._idx(rc) for rc in impassable
+                         if allow_wrap or RC(*rc).in_bounds(RC(0, 0), self.shape)}
+        self._neighbors = [self._calc_neighbors(r, c)
+                           for r in range(num_rows)
+                           for c in range(num_cols)]
 
+    @classmethod
+    def from_maze(cls, maze: List[List[Any]], impassable: Iterable[RC] = frozenset(), *, allow_wrap=False):
+        return cls((len(maze), len(maze[0])), impassable, allow_wrap=allow_wrap)
+
+    def _idx(self, rc) -> int:
+        num_rows, num_cols = self.shape
+        return rc[0] % num_rows * num_cols + rc[1] % num_cols
+
+    def _calc_neighbors(self, r: int, c: int) -> Tuple[int, ...]:
+        num_rows, num_cols = self.shape
+        res = []
+        for dr, dc in self._offsets:
+            nr, nc = r + dr, c + dc
+            if not (self.allow_wrap or (0 <= nr < num_rows and 0 <= nc < num_cols)):
+                continue
+            if (idx := nr % num_rows * num_cols + nc % num_cols) not in self._blocked:
+                res.append(idx)
+        return tuple(res)
+
+    def _heuristic(self, goal: RC) -> Callable[[int], int]:
+        num_rows, num_cols = self.shape
+        goal_r, goal_c = RC(*goal) % self.shape
+
+        if not self.allow_wrap:
+            def h(idx):
+                r, c = divmod(idx, num_cols)
+                return abs(r - goal_r) + abs(c - goal_c)
+            return h
+
+        def h(idx):
+            r, c = divmod(idx, num_cols)
+            dr, dc = abs(r - goal_r), abs(c - goal_c)
+            return min(dr, num_rows - dr) + min(dc, num_cols - dc)
+
+        return h
+
+    def path(self, start: RC, end: RC) -> Optional[List[RC]]:
+        """return shortest path from start to end, inclusive, or None if there isn't one"""
+        start_idx, end_idx = self._idx(start), self._idx(end)
+        h = self._heuristic(end)
+        neighbors = self._neighbors
+        g_scores = {start_idx: 0}
+        parents = {start_idx: None}
+        # ties on f are broken by h so the search prefers going deeper
+        opened = [(h(start_idx), h(start_idx), 0, start_idx)]
+
+        while opened:
+            *_, g, idx = heappop(opened)
+            if idx == end_idx:
+                return self._get_path(parents, idx)
+            if g > g_scores[idx]:
+                # stale entry, already found a shorter way here
+                continue
 
-def _create_wrapped_goals(shape: RC, goal: RC, impassable: Set[RC]) -> WrappedGoals:
-    """set up maze for when an object is allowed to wrap around the screen"""
-    s = RC(*shape)
-    r_offsets = -s.r, 0, s.r
-    c_offsets = -s.c, 0, s.c
-    offsets = [RC(*rc) for rc in product(r_offsets, c_offsets)]
-    goals = {goal - rc for rc in offsets}
-    impassables = {impass - rc for impass in impassable for rc in offsets}
-    bounds = -shape, shape + shape
+            g += 1
+            for n in neighbors[idx]:
+                if g < g_scores.get(n, g + 1):
+                    g_scores[n] = g
+                    parents[n] = idx
+                    cur_h = h(n)
+                    heappush(opened, (g + cur_h, cur_h, g, n))
 
-    return WrappedGoals(bounds, goals, impassables)
+    def _get_path(self, parents: Dict[int, Optional[int]], idx: int) -> List[RC]:
+        res = []
+        while idx is not None:
+            res.append(RC(*divmod(idx, self.shape.c)))
+            idx = parents[idx]
+        res.reverse()
+        return res
 
 
 def a_star(maze: List[List[Any]], start: RC, end: RC, impassable: Set[RC] = frozenset(), allow_wrap=False):
     """return a* path for maze"""
-    start_n = ANode(None, start)
-    shape_ul, shape_lr = RC(0, 0), RC(len(maze), len(maze[0]))
-
-    if allow_wrap:
-        (shape_ul, shape_lr), goals, impassable = _create_wrapped_goals(shape_lr, end, impassable)
-    else:
-        goals = {end, }
-
-    opened, closed = [start_n], set()
-
-    while opened:
-        cur_n, cur_i = opened[0], 0
-
-        for i, n in enumerate(opened):
-            if n.f < cur_n.f:
-                cur_n, cur_i = n, i
-
-        closed.add(opened.pop(cur_i))
-
-        # found the end
-        if cur_n.pos in goals:
-            return _get_path(cur_n)
-
-        children = _create_children(shape_ul, shape_lr, impassable, cur_n, goals)
-        for c in children:
-            if c in closed:
-                continue
+    return AStarGrid.from_maze(maze, impassable, allow_wrap=allow_wrap).path(start, end)
 
-            with suppress(ValueError):
-                opened_idx = opened.index(c)
-                opened_c = opened[opened_idx]
-                if c.g > opened_c.g:
-                    continue
-                opened.pop(opened_idx)
 
-            opened.append(c)
+def a_star_many(maze: List[List[Any]], queries: Iterable[Tuple[RC, RC]], impassable: Set[RC] = frozenset(),
+                allow_wrap=False) -> List[Optional[List[RC]]]:
+    """return a* paths for many (start, end) queries on the same maze, reusing one precomputed grid"""
+    grid = AStarGrid.from_maze(maze, impassable, allow_wrap=allow_wrap)
+    return [grid.path(start, end) for start, end in queries]
 
 
 def play():
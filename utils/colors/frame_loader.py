@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from pathlib import Path
+from queue import Queue, Full
+from threading import Event, Lock, Thread
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from utils.colors.color_matrix import Shape
+from utils.colors.np_color_matrix import NPColorMatrix
+
+__author__ = 'acushner'
+
+image_suffixes = frozenset('.png .gif .jpg .jpeg .bmp .webp'.split())
+default_duration_secs = .1
+_done = object()
+
+PathLike = Union[str, Path]
+
+
+class FrameKey(NamedTuple):
+    path: str
+    mtime: float
+    shape: Shape
+
+
+class Frame(NamedTuple):
+    """a single decoded frame, already resized to the tile shape"""
+    cm: NPColorMatrix
+    duration_secs: float
+
+
+class FrameCache:
+    """LRU cache of decoded frames keyed by (path, mtime, shape)
+
+    bounded by total number of frames across all entries, not by number of entries
+    """
+
+    def __init__(self, max_frames=1024):
+        self.max_frames = max_frames
+        self._entries: OrderedDict[FrameKey, tuple[Frame, ...]] = OrderedDict()
+        self._num_frames = 0
+        self._lock = Lock()
+
+    def get(self, key: FrameKey) -> Optional[tuple[Frame, ...]]:
+        with self._lock:
+            if (res := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+            return res
+
+    def put(self, key: FrameKey, frames: tuple[Frame, ...]):
+        if len(frames) > self.max_frames:
+            return
+        with self._lock:
+            if (old := self._entries.pop(key, None)) is not None:
+                self._num_frames -= len(old)
+            self._entries[key] = frames
+            self._num_frames += len(frames)
+            while self._num_frames > self.max_frames:
+                _, evicted = self._entries.popitem(last=False)
+                self._num_frames -= len(evicted)
+
+    @property
+    def num_frames(self) -> int:
+        return self._num_frames
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: FrameKey):
+        return key in self._entries
+
+
+frame_cache = FrameCache()
+
+
+def image_paths(paths: Union[PathLike, Iterable[PathLike]]) -> list[Path]:
+    """expand any directories in `paths` to the (sorted) images they contain"""
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+
+    res = []
+    for p in (Path(p).expanduser() for p in paths):
+        if p.is_dir():
+            res.extend(sorted(f for f in p.iterdir() if f.suffix.lower() in image_suffixes))
+        else:
+            res.append(p)
+    return res
+
+
+def decode_frames(path: PathLike, shape: Shape) -> Iterator[Frame]:
+    """lazily decode every frame in `path` (1 for still images), resized to `shape`"""
+    y, x = shape
+    with Image.open(path) as im:
+        for frame in ImageSequence.Iterator(im):
+            arr = np.asarray(frame.convert('RGB').resize((x, y), Image.LANCZOS))
+            arr.flags.writeable = False
+            duration_msecs = frame.info.get('duration') or 1000 * default_duration_secs
+            yield Frame(NPColorMatrix(arr), duration_msecs / 1000)
+
+
+class FrameLoader:
+    """stream frames from images/gifs/folders of images as ready-to-send matrices
+
+    frames are decoded lazily and resized to `shape` on a background thread, staying
+    at most `prefetch` frames ahead of the consumer. decoded files are kept in `cache`,
+    so looping through the same images again doesn't decode them again.
+
+    frames are read-only since they may be shared through the cache. `copy()` them
+    before modifying.
+
+    usage:
+        for cm, duration_secs in FrameLoader('~/gifs', (16, 16), loop=True):
+            set_cm(cm)
+            time.sleep(duration_secs)
+    """
+
+    def __init__(self, paths: Union[PathLike, Iterable[PathLike]], shape: Shape = (16, 16), *,
+                 prefetch=16, cache: Optional[FrameCache] = frame_cache, loop=False):
+        self._paths = image_paths(paths)
+        self._shape = tuple(shape)
+        self._prefetch = prefetch
+        self._cache = cache
+        self._loop = loop
+
+    def _key(self, path: Path) -> FrameKey:
+        return FrameKey(str(path.resolve()), os.path.getmtime(path), self._shape)
+
+    def _frames_for(self, path: Path) -> Iterator[Frame]:
+        if self._cache is None:
+            yield from decode_frames(path, self._shape)
+            return
+
+        key = self._key(path)
+        if (frames := self._cache.get(key)) is not None:
+            yield from frames
+            return
+
+        decoded = []
+        for f in decode_frames(path, self._shape):
+            decoded.append(f)
+            yield f
+        self._cache.put(key, tuple(decoded))
+
+    def frames(self) -> Iterator[Frame]:
+        """decode frames in the current thread"""
+        while True:
+            for path in self._paths:
+                yield from self._frames_for(path)
+            if not (self._loop and self._paths):
+                return
+
+    def _produce(self, q: Queue, stop: Event):
+        def put(v):
+            while not stop.is_set():
+                try:
+                    return q.put(v, timeout=.1)
+                except Full:
+                    pass
+
+        try:
+            for f in self.frames():
+                if stop.is_set():
+                    return
+                put(f)
+        except Exception as e:
+            put(e)
+        put(_done)
+
+    def __iter__(self) -> Iterator[Frame]:
+        q = Queue(self._prefetch)
+        stop = Event()
+        t = Thread(target=self._produce, args=(q, stop), daemon=True)
+        t.start()
+        try:
+            while (v := q.get()) is not _done:
+                if isinstance(v, Exception):
+                    raise v
+                yield v
+        finally:
+            stop.set()
+
+
+def __main():
+    import sys
+    for i, (cm, duration_secs) in enumerate(FrameLoader(sys.argv[1:])):
+        print(i, cm, duration_secs)
+
+
+if __name__ == '__main__':
+    __main()
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Union
+
+import numpy as np
+from PIL import Image
+
+from misty_py.utils import RGB
+
+from utils.colors.color_matrix import (RC, ColorMatrix, DupesValids, Shape, default_color, default_shape,
+                                      dupes_valids_2d, resize_array)
+
+__author__ = 'acushner'
+
+
+def _to_rgb(px) -> RGB:
+    return RGB(*px.tolist())
+
+
+def _to_px(color) -> tuple:
+    return tuple(color)[:3]
+
+
+class NPColorMatrix:
+    """ColorMatrix backed by an (H, W, 3) uint8 ndarray
+
+    transposing, rotating, cropping and slicing return views onto the same buffer,
+    so they're ~free. the list-style api of `ColorMatrix` (`cm[r, c]`, `cm[r][c]`,
+    `by_coords`, `flattened`, `shape`, ...) is kept working on top of the array
+
+    NOTE: `cm[r]` returns a list of colors, so `cm[r][c] = color` will NOT write through.
+    use `cm[r, c] = color` instead
+    """
+
+    def __init__(self, arr: np.ndarray, *, wrap=False):
+        arr = np.asarray(arr, dtype=np.uint8)
+        if arr.ndim != 3 or arr.shape[2] != 3:
+            raise ValueError(f'expected array of shape (H, W, 3), got {arr.shape}')
+        self._arr = arr
+        self.wrap = wrap
+
+    # ==================================================================================================================
+    # constructors
+    # ==================================================================================================================
+
+    @classmethod
+    def from_shape(cls, shape: Shape = default_shape, default: RGB = default_color) -> NPColorMatrix:
+        """create a NPColorMatrix with shape `shape` and colors set to `default`"""
+        arr = np.empty((*shape, 3), dtype=np.uint8)
+        arr[...] = _to_px(default)
+        return cls(arr)
+
+    @classmethod
+    def from_colors(cls, colors: List[RGB], shape: Shape = (8, 8)) -> NPColorMatrix:
+        """convert a list of colors into a NPColorMatrix of shape `shape`"""
+        num_rows, num_cols = shape
+        if len(colors) != num_rows * num_cols:
+            raise ValueError('incompatible shape!')
+        return cls(np.array([_to_px(c) for c in colors], dtype=np.uint8).reshape(num_rows, num_cols, 3))
+
+    @classmethod
+    def from_color_matrix(cls, cm: ColorMatrix) -> NPColorMatrix:
+        return cls(np.array([[_to_px(c) for c in row] for row in cm], dtype=np.uint8), wrap=cm.wrap)
+
+    @classmethod
+    def from_image(cls, im: Image.Image) -> NPColorMatrix:
+        return cls(np.asarray(im.convert('RGB')))
+
+    @classmethod
+    def from_filename(cls, fn) -> NPColorMatrix:
+        """read an image in using pillow and convert to NPColorMatrix"""
+        with Image.open(fn) as im:
+            return cls.from_image(im)
+
+    def to_color_matrix(self) -> ColorMatrix:
+        return ColorMatrix(self, wrap=self.wrap)
+
+    # ==================================================================================================================
+    # list-style compatibility
+    # ==================================================================================================================
+
+    @property
+    def array(self) -> np.ndarray:
+        """the underlying (H, W, 3) array. NOT a copy"""
+        return self._arr
+
+    def _wrap(self, arr: np.ndarray) -> Union[NPColorMatrix, List[RGB]]:
+        if arr.ndim == 3:
+            return type(self)(arr, wrap=self.wrap)
+        if arr.ndim == 2:
+            return [_to_rgb(px) for px in arr]
+        return _to_rgb(arr)
+
+    def __getitem__(self, item):
+        if self.wrap and isinstance(item, RC):
+            item %= self.shape
+        return self._wrap(self._arr[item])
+
+    def __setitem__(self, item, val):
+        if self.wrap and isinstance(item, RC):
+            item %= self.shape
+        if isinstance(val, NPColorMatrix):
+            val = val.array
+        elif isinstance(item, tuple) and all(isinstance(i, (int, np.integer)) for i in item):
+            val = _to_px(val)
+        elif not isinstance(val, np.ndarray):
+            val = np.array([_to_px(c) for c in val], dtype=np.uint8)
+        self._arr[item] = val
+
+    def __len__(self):
+        return len(self._arr)
+
+    def __iter__(self) -> Iterator[List[RGB]]:
+        return (self._wrap(row) for row in self._arr)
+
+    def __eq__(self, other):
+        if isinstance(other, NPColorMatrix):
+            return self.shape == other.shape and np.array_equal(self._arr, other._arr)
+        try:
+            return self.shape == (len(other), len(other[0])) and all(map(list.__eq__, self, map(list, other)))
+        except (TypeError, IndexError):
+            return NotImplemented
+
+    def __repr__(self):
+        return f'{type(self).__name__}(shape={self.shape})'
+
+    @property
+    def flattened(self) -> List[RGB]:
+        """flatten NPColorMatrix to 1d-array (opposite of `from_colors`)"""
+        return [_to_rgb(px) for px in self._arr.reshape(-1, 3)]
+
+    @property
+    def shape(self) -> Shape:
+        """(num_rows, num_cols)"""
+        return self._arr.shape[:2]
+
+    @property
+    def height(self) -> int:
+        return self.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.shape[1]
+
+    @property
+    def by_coords(self) -> Iterator[tuple[RC, RGB]]:
+        """yield coordinates and their colors"""
+        num_cols = self.width
+        yield from ((RC(*divmod(i, num_cols)), _to_rgb(px))
+                    for i, px in enumerate(self._arr.reshape(-1, 3)))
+
+    def copy(self) -> NPColorMatrix:
+        return type(self)(self._arr.copy(), wrap=self.wrap)
+
+    # ==================================================================================================================
+    # views
+    # ==================================================================================================================
+
+    @property
+    def T(self) -> NPColorMatrix:
+        """transpose (view)"""
+        return type(self)(self._arr.transpose(1, 0, 2), wrap=self.wrap)
+
+    def rotate_clockwise(self, n=1) -> NPColorMatrix:
+        """rotate (view)"""
+        return type(self)(np.rot90(self._arr, k=-n, axes=(0, 1)), wrap=self.wrap)
+
+    def get_range(self, rc0, rc1, default: RGB = default_color) -> NPColorMatrix:
+        """box bounded by rc0, rc1
+
+        a view if the box lies within self, otherwise a copy padded with `default`"""
+        (r0, c0), (r1, c1) = rc0, rc1
+        if 0 <= r0 <= r1 <= self.height and 0 <= c0 <= c1 <= self.width:
+            return type(self)(self._arr[r0:r1, c0:c1])
+
+        res = type(self).from_shape((r1 - r0, c1 - c0), default)
+        src_r0, src_c0 = max(r0, 0), max(c0, 0)
+        src_r1, src_c1 = min(r1, self.height), min(c1, self.width)
+        if src_r0 < src_r1 and src_c0 < src_c1:
+            res._arr[src_r0 - r0:src_r1 - r0, src_c0 - c0:src_c1 - c0] = self._arr[src_r0:src_r1, src_c0:src_c1]
+        return res
+
+    crop = get_range
+
+    # ==================================================================================================================
+    # analysis
+    # ==================================================================================================================
+
+    def duplicates(self, sentinel_color: Optional[RGB] = None) -> DupesValids:
+        """
+        return rows where all colors are either `sentinel_color` or dupes
+
+        to get columns, simply call with `self.T.duplicates()`
+        """
+        arr = self._arr
+        ref = arr[:, :1] if sentinel_color is None else np.array(_to_px(sentinel_color), dtype=np.uint8)
+        valid = (arr != ref).any(axis=(1, 2))
+        idxs = np.arange(len(arr))
+        return DupesValids(frozenset(idxs[~valid].tolist()), frozenset(idxs[valid].tolist()))
+
+    def dupes_valids(self, sentinel_color: Optional[RGB] = None) -> tuple[DupesValids, DupesValids]:
+        """(rows, cols) `DupesValids` computed in one pass over the packed array"""
+        return dupes_valids_2d(self._arr, sentinel_color)
+
+    def strip(self, strip_color: Optional[RGB] = None) -> NPColorMatrix:
+        """strip out empty rows/cols from sides of image (view)"""
+        row_info, col_info = self.dupes_valids(strip_color)
+        return type(self)(self._arr[row_info.first_valid:row_info.last_valid + 1,
+                                    col_info.first_valid:col_info.last_valid + 1])
+
+    def split(self, split_color: Optional[RGB] = None) -> List[NPColorMatrix]:
+        """split image into boxes based on rows/columns of empty colors
+
+        see `ColorMatrix.split`"""
+        row_info, col_info = self.dupes_valids(split_color)
+        return [self.get_range(RC(r_start, c_start), RC(r_end + 1, c_end + 1), default_color)
+                for r_start, r_end in row_info.by_group
+                for c_start, c_end in col_info.by_group]
+
+    def find_all(self, color: Union[RGB, Set[RGB]]) -> List[RC]:
+        colors = [color] if isinstance(color, RGB) else color
+        targets = np.array([_to_px(c) for c in colors], dtype=np.uint8)
+        mask = (self._arr[:, :, None, :] == targets).all(axis=-1).any(axis=-1)
+        return [RC(r, c) for r, c in zip(*(idxs.tolist() for idxs in np.nonzero(mask)))]
+
+    @property
+    def color_str(self):
+        return self.to_color_matrix().color_str
+
+    @property
+    def describe(self) -> str:
+        """
+        return a histogram string of sorts showing colors and a visual representation
+        of how much of that color is present in the image
+        """
+        d = sorted(Counter(self.flattened).items(), key=lambda kv: -kv[1])
+        return '\n'.join(f'{str(c):>68}: {c.color_str(" " * count, set_bg=True)}' for c, count in d)
+
+    def cast(self, converter: Callable) -> NPColorMatrix:
+        """
+        cast individual colors using the converter callable
+        """
+        return type(self).from_colors([converter(c) for c in self.flattened], self.shape)
+
+    def resize(self, shape: Shape = (8, 8)) -> NPColorMatrix:
+        """resize image and return a new NPColorMatrix. see `resize_array`"""
+        if self.shape == shape:
+            return self.copy()
+        return type(self)(resize_array(self._arr, shape), wrap=self.wrap)
+
+
+def to_np(cm: Union[ColorMatrix, NPColorMatrix, Iterable[Iterable[RGB]]]) -> NPColorMatrix:
+    """convert any ColorMatrix-ish thing to an NPColorMatrix"""
+    if isinstance(cm, NPColorMatrix):
+        return cm
+    if isinstance(cm, ColorMatrix):
+        return NPColorMatrix.from_color_matrix(cm)
+    return NPColorMatrix.from_color_matrix(ColorMatrix(cm))
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip('misty_py')
+
+from utils.colors.color_matrix import RC, AStarGrid, a_star, a_star_many
+
+maze = [[0] * 8 for _ in range(8)]
+wall = {RC(r, 3) for r in range(7)}
+
+
+def _is_valid(path, impassable, shape=None):
+    for a, b in zip(path, path[1:]):
+        dr, dc = abs(a.r - b.r), abs(a.c - b.c)
+        if shape:
+            dr, dc = min(dr, shape[0] - dr), min(dc, shape[1] - dc)
+        if dr + dc != 1:
+            return False
+    return not set(path) & impassable
+
+
+def test_a_star():
+    path = a_star(maze, RC(0, 0), RC(0, 7), wall)
+    assert path[0] == RC(0, 0) and path[-1] == RC(0, 7)
+    assert len(path) == 22
+    assert _is_valid(path, wall)
+
+
+def test_a_star_wrap():
+    path = a_star(maze, RC(0, 0), RC(0, 7), wall, allow_wrap=True)
+    assert path == [RC(0, 0), RC(0, 7)]
+
+    path = a_star(maze, RC(0, 2), RC(0, 4), wall, allow_wrap=True)
+    assert len(path) == 5
+    assert _is_valid(path, wall, (8, 8))
+
+
+def test_a_star_no_path():
+    assert a_star(maze, RC(0, 0), RC(0, 7), wall | {RC(7, 3)}) is None
+
+
+def test_a_star_many():
+    queries = [(RC(0, 0), RC(7, 7)), (RC(7, 7), RC(0, 0)), (RC(2, 2), RC(2, 2))]
+    paths = a_star_many(maze, queries, wall)
+    grid = AStarGrid((8, 8), wall)
+    assert paths == [grid.path(s, e) for s, e in queries]
+    assert paths[2] == [RC(2, 2)]
+    assert len(paths[0]) == len(paths[1]) == 15
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('misty_py')
+
+from PIL import Image
+
+from utils.colors.frame_loader import FrameCache, FrameLoader, FrameKey
+
+
+@pytest.fixture
+def gif(tmp_path):
+    frames = [Image.fromarray(np.full((32, 24, 3), v, dtype=np.uint8)) for v in (0, 100, 200)]
+    fn = tmp_path / 'anim.gif'
+    frames[0].save(fn, save_all=True, append_images=frames[1:], duration=50, loop=0)
+    Image.fromarray(np.full((5, 5, 3), 7, dtype=np.uint8)).save(tmp_path / 'still.png')
+    return fn
+
+
+def test_frame_loader(gif):
+    cache = FrameCache()
+    frames = list(FrameLoader(gif.parent, (16, 16), cache=cache))
+    assert len(frames) == 4
+    assert all(f.cm.shape == (16, 16) for f in frames)
+    assert [f.cm.array[0, 0, 0] for f in frames[:3]] == [0, 100, 200]
+    assert frames[0].duration_secs == .05
+    assert len(cache) == 2 and cache.num_frames == 4
+
+    again = list(FrameLoader(gif.parent, (16, 16), cache=cache))
+    assert all(a.cm is b.cm for a, b in zip(frames, again))
+
+
+def test_frame_loader_loop(gif):
+    frames = FrameLoader(gif, (8, 8), cache=None, loop=True, prefetch=2)
+    it = iter(frames)
+    assert len([next(it) for _ in range(7)]) == 7
+    it.close()
+
+
+def test_frame_cache_evicts_lru():
+    cache = FrameCache(max_frames=3)
+    keys = [FrameKey(str(i), 0., (16, 16)) for i in range(3)]
+    cache.put(keys[0], (1, 2))
+    cache.put(keys[1], (1,))
+    cache.get(keys[0])
+    cache.put(keys[2], (1,))
+    assert keys[0] in cache and keys[1] not in cache and keys[2] in cache
+    assert cache.num_frames == 3
@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip('misty_py')
+
+from misty_py.utils import RGB
+
+from utils.colors.color_matrix import ColorMatrix, RC
+from utils.colors.np_color_matrix import NPColorMatrix
+
+on = RGB(1, 1, 1)
+
+
+@pytest.fixture
+def cm():
+    return ColorMatrix([[RGB(r, c, 0) for c in range(5)] for r in range(4)])
+
+
+@pytest.fixture
+def sparse_cm():
+    res = ColorMatrix.from_shape((6, 7))
+    for rc in (2, 3), (3, 3), (2, 4), (2, 6):
+        res[rc] = on
+    return res
+
+
+def test_compat(cm):
+    n = NPColorMatrix.from_color_matrix(cm)
+    assert n == cm
+    assert n.shape == cm.shape
+    assert n[1, 2] == n[1][2] == n[RC(1, 2)] == cm[1, 2]
+    assert n.flattened == cm.flattened
+    assert list(n.by_coords) == list(cm.by_coords)
+
+
+def test_views(cm):
+    n = NPColorMatrix.from_color_matrix(cm)
+    for view, expected in ((n.T, cm.T),
+                           (n.rotate_clockwise(), cm.rotate_clockwise()),
+                           (n.rotate_clockwise(3), cm.rotate_clockwise(3)),
+                           (n.get_range(RC(1, 1), RC(3, 4)), cm.get_range(RC(1, 1), RC(3, 4)))):
+        assert view == expected
+        assert view.array.base is not None
+
+    n.T[2, 1] = on
+    assert n[1, 2] == on
+
+
+def test_get_range_out_of_bounds(cm):
+    n = NPColorMatrix.from_color_matrix(cm)
+    assert n.get_range(RC(1, 1), RC(6, 7)) == cm.get_range(RC(1, 1), RC(6, 7))
+
+
+def test_strip_split(sparse_cm):
+    n = NPColorMatrix.from_color_matrix(sparse_cm)
+    assert n.duplicates() == sparse_cm.duplicates()
+    assert n.strip() == sparse_cm.strip()
+    assert n.split() == sparse_cm.split()
+
+
+@pytest.mark.parametrize('sentinel', [None, RGB(0, 0, 0)])
+def test_dupes_valids(sparse_cm, sentinel):
+    expected = sparse_cm.duplicates(sentinel), sparse_cm.T.duplicates(sentinel)
+    for m in sparse_cm, NPColorMatrix.from_color_matrix(sparse_cm):
+        for got, exp in zip(m.dupes_valids(sentinel), expected):
+            assert (got.d, got.v) == (exp.d, exp.v)
+            assert got.by_group == exp.by_group
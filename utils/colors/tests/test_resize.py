@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('misty_py')
+
+from PIL import Image
+
+from utils.colors.color_matrix import ColorMatrix, resize_array
+from utils.colors.np_color_matrix import NPColorMatrix
+
+
+@pytest.mark.parametrize('src, dst', [((16, 16), (16, 16)), ((8, 8), (16, 16)), ((48, 48), (16, 16)),
+                                      ((10, 10), (16, 16)), ((3, 3), (16, 16)), ((20, 20), (16, 16)),
+                                      ((32, 32), (16, 16)), ((5, 9), (13, 7)), ((300, 20), (16, 16))])
+def test_resize_array_matches_pillow(src, dst):
+    for seed in range(20):
+        arr = np.random.default_rng(seed).integers(0, 256, (*src, 3), dtype=np.uint8)
+        expected = np.asarray(Image.fromarray(arr).resize(dst[::-1], Image.LANCZOS))
+        assert np.array_equal(resize_array(arr, dst), expected), seed
+
+
+def test_resize_array_random_shapes():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        src, dst = rng.integers(1, 40, 2), rng.integers(1, 40, 2)
+        arr = rng.integers(0, 256, (*src, 3), dtype=np.uint8)
+        expected = np.asarray(Image.fromarray(arr).resize(tuple(dst[::-1]), Image.LANCZOS))
+        assert np.array_equal(resize_array(arr, tuple(dst)), expected), (src, dst)
+
+
+def test_resize_color_matrix():
+    n = NPColorMatrix(np.random.default_rng(1).integers(0, 256, (8, 8, 3), dtype=np.uint8))
+    cm = n.to_color_matrix()
+    assert cm.resize((16, 16)) == n.resize((16, 16))
+    assert n.resize((8, 8)) == n
+    assert isinstance(cm.resize((4, 4)), ColorMatrix)
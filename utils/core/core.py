@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import random
+import threading
 import time
 from collections import deque
-from contextlib import suppress
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
 from functools import partial, wraps
 from itertools import islice, tee, zip_longest
-from typing import Iterable, Any
+from typing import Iterable, Any, Optional
 
 from memoize.wrapper import memoize
 from rich.table import Table
@@ -107,23 +110,62 @@ class classproperty:
         return self.f(cls)
 
 
-class localtimer:
-    """context manager timer"""
-
-    def __init__(self, name='', *, handler=print, prec=3):
-        self.name = name or 'snippet'
-        self.handler = handler
-        self.prec = prec
-
-    def __enter__(self):
-        self.start = time.perf_counter()
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.handler(f'{self.name} took {time.perf_counter() - self.start:.0{self.prec}f} seconds')
-
-
-class _TimerObj:
+# =================================================
+# timing
+# =================================================
+class Histogram:
+    """HDR-style latency histogram
+
+    values are stored in integer nanoseconds, bucketed by power of 2 and then linearly
+    within each power of 2, so every bucket is within 1 / 2**(sig_bits - 1) of its values
+    no matter how large they get"""
+
+    def __init__(self, sig_bits=7):
+        self.sig_bits = sig_bits
+        self.counts: dict[tuple[int, int], int] = {}
+        self.count = 0
+        self.min_ns = None
+        self.max_ns = None
+
+    def _bucket(self, ns: int) -> tuple[int, int]:
+        shift = max(0, ns.bit_length() - self.sig_bits)
+        return shift, ns >> shift
+
+    def record(self, secs: float):
+        ns = max(0, int(secs * 1e9))
+        key = self._bucket(ns)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.min_ns = ns if self.min_ns is None else min(self.min_ns, ns)
+        self.max_ns = ns if self.max_ns is None else max(self.max_ns, ns)
+
+    def merge(self, other: Histogram):
+        for key, n in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.count += other.count
+        for ns in other.min_ns, other.max_ns:
+            if ns is not None:
+                self.min_ns = ns if self.min_ns is None else min(self.min_ns, ns)
+                self.max_ns = ns if self.max_ns is None else max(self.max_ns, ns)
+
+    def percentile(self, p: float) -> float:
+        """value in seconds at or below which `p` percent of recorded values fall"""
+        if not self.count:
+            return 0.0
+        if p >= 100:
+            return self.max_ns / 1e9
+        target = max(1, -(-self.count * p // 100))
+        seen = 0
+        for (shift, mantissa), n in sorted(self.counts.items()):
+            seen += n
+            if seen >= target:
+                # middle of the bucket, but never outside what was actually recorded
+                mid = (mantissa << shift) + ((1 << shift) - 1) / 2
+                return min(max(mid, self.min_ns), self.max_ns) / 1e9
+        return 0.0
+
+
+class TimerStats:
     def __init__(self, name):
         self.name = name
         self.total = 0
@@ -131,6 +173,7 @@ class _TimerObj:
         self.min = float('inf')
         self.max = -float('inf')
         self.last = None
+        self.hist = Histogram()
 
     def update(self, time):
         self.total += time
@@ -138,6 +181,7 @@ class _TimerObj:
         self.last = time
         self.min = min(self.min, time)
         self.max = max(self.max, time)
+        self.hist.record(time)
 
     @property
     def avg(self):
@@ -145,6 +189,9 @@ class _TimerObj:
             return 0
         return self.total / self.ncalls
 
+    def percentile(self, p: float) -> float:
+        return self.hist.percentile(p)
+
     def __repr__(self):
         return (f'{self.name!r} took {(self.last):.6f}s, '
                 f'ncalls={self.ncalls} for {self.total:.3f}s (avg: {self.avg:.3f}s)')
@@ -159,10 +206,114 @@ class _TimerObj:
         return t
 
 
-def timer(func=None, *, pretty=False):
-    """timing decorator"""
+# path of names of the spans currently running, outermost first
+_current_span: ContextVar[tuple[str, ...]] = ContextVar('_current_span', default=())
+
+
+class _Span:
+    __slots__ = 'stats', 'elapsed', '_path', '_token', '_start'
+
+    def __init__(self, registry: TimerRegistry, name: str):
+        self._path = registry.path(name)
+        self.stats = registry.get(self._path)
+
+    def __enter__(self) -> TimerStats:
+        self._token = _current_span.set(self._path)
+        self._start = time.perf_counter()
+        return self.stats
+
+    def __exit__(self, *_):
+        self.elapsed = time.perf_counter() - self._start
+        self.stats.update(self.elapsed)
+        _current_span.reset(self._token)
+
+
+class TimerRegistry:
+    """every `timer` and `localtimer` span, keyed by path
+
+    a path is just the span's name unless `nested`, in which case it's the names of the
+    enclosing spans (in this context: thread, task, etc.) followed by the span's name"""
+
+    def __init__(self):
+        self.stats: dict[tuple[str, ...], TimerStats] = {}
+        self.nested = False
+        self.quiet = False  # don't print on every call unless a timer asks to
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> tuple[str, ...]:
+        return (*_current_span.get(), name) if self.nested else (name,)
+
+    def get(self, path: tuple[str, ...]) -> TimerStats:
+        if (res := self.stats.get(path)) is None:
+            with self._lock:
+                res = self.stats.setdefault(path, TimerStats(' > '.join(path)))
+        return res
+
+    def span(self, name: str) -> _Span:
+        """context manager that times its body as `name`"""
+        return _Span(self, name)
+
+    @contextmanager
+    def nesting(self, nested=True):
+        prev, self.nested = self.nested, nested
+        try:
+            yield self
+        finally:
+            self.nested = prev
+
+    def reset(self):
+        self.stats.clear()
+
+    def report(self, percentiles=(50, 90, 99)) -> Table:
+        """one row per span, children indented under their parents"""
+        t = Table('name', 'ncalls', 'total', 'avg', *(f'p{p}' for p in percentiles), 'max',
+                  border_style='blue')
+        r6 = '{:.6f}'.format
+        for path, stats in sorted(self.stats.items()):
+            t.add_row('  ' * (len(path) - 1) + path[-1], str(stats.ncalls), f'{stats.total:.3f}', r6(stats.avg),
+                      *map(r6, map(stats.percentile, percentiles)), r6(stats.max))
+        return t
+
+
+class localtimer:
+    """context manager timer
+
+    recorded in `timer.registry` as well. when nesting, it's a child of the enclosing span"""
+
+    def __init__(self, name='', *, handler=print, prec=3):
+        self.name = name or 'snippet'
+        self.handler = handler
+        self.prec = prec
+
+    def __enter__(self):
+        self._span = timer.registry.span(self.name)
+        self._span.__enter__()
+        self.start = self._span._start
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._span.__exit__(exc_type, exc_val, exc_tb)
+        if self.handler:
+            self.handler(f'{self.name} took {self._span.elapsed:.0{self.prec}f} seconds')
+
+
+# separate from the global `random` so sampling doesn't change seeded runs
+_sample_rng = random.Random()
+
+
+def timer(func=None, *, pretty=False, quiet: Optional[bool] = None, sample=1.0, name: Optional[str] = None):
+    """timing decorator
+
+    calls are recorded in `timer.registry`. see `timer.report()`
+        - quiet: don't print after each call. defaults to `timer.registry.quiet`
+        - sample: fraction of calls to time. the rest just run
+        - name: what to record calls as. defaults to the function's module and qualified name.
+          functions given the same name share their stats in the registry
+
+    what's printed after each call only counts calls to this function, as it did before the registry
+    """
     if not func:
-        return partial(timer, pretty=pretty)
+        return partial(timer, pretty=pretty, quiet=quiet, sample=sample, name=name)
 
     local_print = print
     if pretty:
@@ -170,21 +321,30 @@ def timer(func=None, *, pretty=False):
             from rich import print as rich_print
             local_print = rich_print
 
-    to = _TimerObj(func.__name__)
+    key = name or f'{func.__module__}.{func.__qualname__}'
+    own_stats = TimerStats(name or func.__name__)
+    registry = timer.registry
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.perf_counter()
-        try:
+        if sample < 1 and _sample_rng.random() >= sample:
             return func(*args, **kwargs)
+        span = registry.span(key)
+        try:
+            with span:
+                return func(*args, **kwargs)
         finally:
-            cur = time.perf_counter() - start
-            to.update(cur)
-            local_print(to)
+            own_stats.update(span.elapsed)
+            if not (registry.quiet if quiet is None else quiet):
+                local_print(own_stats)
 
     return wrapper
 
 
+timer.registry = TimerRegistry()
+timer.report = lambda *args, **kwargs: timer.registry.report(*args, **kwargs)
+
+
 def take(n: int, iterable):
     return list(islice(iterable, n))
 
@@ -224,3 +384,6 @@ if __name__ == '__main__':
 
 
     [(f(), g()) for _ in range(20)]
+
+    from rich import print as rich_print
+    rich_print(timer.report())
@@ -1,8 +1,10 @@
+import random
+import time
 from itertools import repeat
 
 import pytest
 
-from utils.core import interleave, pairwise, take
+from utils.core import Histogram, TimerRegistry, interleave, localtimer, pairwise, take, timer
 
 
 def test_interleave():
@@ -27,3 +29,122 @@ def test_take():
     assert take(0, range(3)) == []
     assert take(1, range(3)) == [0]
     assert take(62, range(3)) == [0, 1, 2]
+
+
+# =================================================
+# timer
+# =================================================
+@pytest.fixture
+def registry(monkeypatch):
+    res = TimerRegistry()
+    monkeypatch.setattr(timer, 'registry', res)
+    return res
+
+
+def _key(f) -> tuple[str]:
+    return (f'{f.__module__}.{f.__qualname__}',)
+
+
+def test_histogram():
+    h = Histogram()
+    assert h.percentile(50) == 0
+    for ms in range(1, 1001):
+        h.record(ms / 1000)
+    assert h.count == 1000
+    for p in 1, 50, 90, 99:
+        assert h.percentile(p) == pytest.approx(p / 100, rel=1 / 64)
+    assert h.percentile(100) == 1.0
+
+    other = Histogram()
+    other.record(5.0)
+    h.merge(other)
+    assert h.count == 1001 and h.percentile(100) == 5.0
+
+
+def test_timer_registry(registry, capsys):
+    @timer(quiet=True)
+    def f(x):
+        return x + 1
+
+    @timer
+    def g():
+        pass
+
+    assert [f(i) for i in range(10)] == list(range(1, 11))
+    g()
+    assert registry.stats[_key(f)].ncalls == 10
+    assert registry.stats[_key(g)].ncalls == 1
+    assert capsys.readouterr().out.count('took') == 1
+
+    registry.quiet = True
+    g()
+    assert not capsys.readouterr().out
+    assert timer.report().row_count == 2
+
+
+def test_timer_sampling(registry):
+    @timer(quiet=True, sample=0)
+    def f():
+        return 4
+
+    state = random.getstate()
+    assert f() == 4
+    assert _key(f) not in registry.stats
+    assert random.getstate() == state
+
+    @timer(quiet=True, sample=.5)
+    def g():
+        pass
+
+    for _ in range(20):
+        g()
+    assert random.getstate() == state
+
+
+def test_nesting(registry):
+    @timer(quiet=True)
+    def outer():
+        with localtimer('inner', handler=None):
+            time.sleep(.001)
+
+    outer()
+    key, = _key(outer)
+    assert set(registry.stats) == {(key,), ('inner',)}
+
+    registry.reset()
+    with registry.nesting():
+        outer()
+        with localtimer('alone', handler=None):
+            pass
+    assert set(registry.stats) == {(key,), (key, 'inner'), ('alone',)}
+    assert registry.stats[(key,)].total >= registry.stats[(key, 'inner')].total
+    assert not registry.nested
+
+
+def test_same_name(registry, capsys):
+    class A:
+        @timer
+        def run(self):
+            pass
+
+    class B:
+        @timer
+        def run(self):
+            pass
+
+    A().run()
+    B().run()
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 2 and all("'run'" in line and 'ncalls=1 ' in line for line in out)
+    assert registry.stats[_key(A.run)].ncalls == registry.stats[_key(B.run)].ncalls == 1
+
+    @timer(name='shared', quiet=True)
+    def f():
+        pass
+
+    @timer(name='shared', quiet=True)
+    def g():
+        pass
+
+    f(), g()
+    assert registry.stats[('shared',)].ncalls == 2
@@ -0,0 +1,167 @@
+"""
+is `generate_crossword` getting faster?
+
+runs seeded batches over a fixed set of grids and records, for every puzzle, how long it took,
+how many words were taken back, how many candidate lookups were made and how many times the
+search started over. prints percentiles per grid and, given a baseline saved by an earlier run,
+how each percentile changed
+
+    python -m utils.crossword_gen.benchmark words.txt [baseline.json] [--save]
+
+runs are seeded, so with the same word list and engine two runs try the same puzzles.
+runs that take longer than `max_secs` are cancelled and counted as unsolved
+"""
+from __future__ import annotations
+
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+from rich import print
+from rich.table import Table
+
+from utils.crossword_gen.core import Grid, GridUnsolvable, SearchCancelled, SearchStats
+from utils.crossword_gen.generate_constraints import ConstraintManager
+from utils.crossword_gen.generate_crosswords import CUSTOM_6X6, Engine, _create_waffle_grid, generate_crossword
+from utils.crossword_gen.grid_compiler import compile_grid
+
+__author__ = 'acushner'
+
+GRIDS: dict[str, Grid] = {
+    **{f'waffle_{n}': _create_waffle_grid(n) for n in (5, 7, 9, 11)},
+    'custom_6x6': CUSTOM_6X6,
+}
+metrics = 'secs', 'backtracks', 'matches_calls', 'restarts'
+percentiles = 50, 90, 99
+_version = 1
+
+# skip the per call print from `@timer`
+_generate = getattr(generate_crossword, '__wrapped__', generate_crossword)
+
+
+class RunStats(NamedTuple):
+    grid: str
+    seed: int
+    solved: bool
+    secs: float
+    backtracks: int
+    matches_calls: int
+    restarts: int
+
+
+def run_one(cm: ConstraintManager, grid_name: str, g: Grid, seed: int, *, engine: Engine = 'backtrack',
+            retry_after_secs=0.0, max_secs=60.0) -> RunStats:
+    random.seed(seed)
+    stats = SearchStats()
+    deadline = time.perf_counter() + max_secs
+    start = time.perf_counter()
+    try:
+        bi = _generate(cm, compile_grid(g), retry_after_secs, engine=engine,
+                       cancelled=lambda: time.perf_counter() > deadline, stats=stats)
+        solved = bool(bi.board)
+    except (SearchCancelled, GridUnsolvable):
+        solved = False
+    return RunStats(grid_name, seed, solved, time.perf_counter() - start,
+                    stats.backtracks, stats.matches_calls, stats.restarts)
+
+
+def run_batch(cm: ConstraintManager, grids: Optional[dict[str, Grid]] = None, num_seeds=10, *,
+              engine: Engine = 'backtrack', retry_after_secs=0.0, max_secs=60.0) -> list[RunStats]:
+    """every grid with seeds 0..num_seeds-1"""
+    return [run_one(cm, name, g, seed, engine=engine, retry_after_secs=retry_after_secs, max_secs=max_secs)
+            for name, g in (grids or GRIDS).items()
+            for seed in range(num_seeds)]
+
+
+# ======================================================================================================================
+# reporting
+# ======================================================================================================================
+
+def summarize(runs: Iterable[RunStats]) -> dict[str, dict]:
+    """per grid: number of runs and solves, plus percentiles of each metric"""
+    by_grid: dict[str, list[RunStats]] = {}
+    for r in runs:
+        by_grid.setdefault(r.grid, []).append(r)
+
+    res = {}
+    for grid, rs in by_grid.items():
+        res[grid] = summary = dict(runs=len(rs), solved=sum(r.solved for r in rs))
+        for m in metrics:
+            values = np.array([getattr(r, m) for r in rs], dtype=float)
+            summary[m] = {f'p{p}': float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+            summary[m]['mean'] = float(values.mean())
+    return res
+
+
+def save_baseline(path, summary: dict, **info):
+    """`info` is stored alongside, e.g. the engine and word list used"""
+    Path(path).write_text(json.dumps(dict(version=_version, info=info, summary=summary), indent=2))
+
+
+def load_baseline(path) -> Optional[dict]:
+    try:
+        res = json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+    return res['summary'] if res.get('version') == _version else None
+
+
+def _fmt(v: float) -> str:
+    return f'{v:.3f}' if v < 100 else f'{v:.0f}'
+
+
+def _change(cur: float, base: float, threshold: float) -> str:
+    if not base:
+        return '[red]new[/]' if cur else ''
+    ratio = cur / base
+    color = 'red' if ratio > 1 + threshold else 'green' if ratio < 1 - threshold else 'white'
+    return f'[{color}]{ratio:.2f}x[/]'
+
+
+def report(summary: dict, baseline: Optional[dict] = None, *, threshold=.1) -> Table:
+    """percentiles per grid. with a `baseline`, each cell also shows current / baseline
+
+    changes bigger than `threshold` are red (slower) or green (faster)"""
+    cols = [f'{m} p{p}' for m in metrics for p in percentiles]
+    t = Table('grid', 'solved', *cols, border_style='blue')
+    for grid, cur in summary.items():
+        base = (baseline or {}).get(grid)
+        cells = []
+        for m in metrics:
+            for p in percentiles:
+                v = cur[m][f'p{p}']
+                cell = _fmt(v)
+                if base and (change := _change(v, base[m][f'p{p}'], threshold)):
+                    cell += f' ({change})'
+                cells.append(cell)
+        t.add_row(grid, f'{cur["solved"]}/{cur["runs"]}', *cells)
+    return t
+
+
+def run(filename, baseline_path=None, *, save=False, engine: Engine = 'backtrack', num_seeds=10,
+        grids: Optional[dict[str, Grid]] = None, retry_after_secs=0.0, max_secs=60.0, index='bitset') -> dict:
+    """benchmark, print the report and return the summary
+
+    if `save`, overwrite the baseline with this run"""
+    cm = ConstraintManager(filename, index=index)
+    summary = summarize(run_batch(cm, grids, num_seeds, engine=engine, retry_after_secs=retry_after_secs,
+                                  max_secs=max_secs))
+    baseline = load_baseline(baseline_path) if baseline_path else None
+    print(report(summary, baseline))
+    if save and baseline_path:
+        save_baseline(baseline_path, summary, filename=str(filename), engine=engine, num_seeds=num_seeds)
+    return summary
+
+
+def __main():
+    args = [a for a in sys.argv[1:] if a != '--save']
+    filename, *rest = args or ['words_in_order.txt']
+    run(filename, *rest[:1], save='--save' in sys.argv, engine='csp')
+
+
+if __name__ == '__main__':
+    __main()
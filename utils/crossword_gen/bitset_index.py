@@ -0,0 +1,115 @@
+"""
+index words by (length, position, letter) instead of by every subset of positions
+
+every word of a given length gets an id: its index in the sorted list of words of that length.
+for each (length, position, letter), a python int holds a bitset of the ids of the words
+with `letter` at `position`. a partial constraint like ((0, 2), 'fy') is then just:
+    bitsets[len, 0, 'f'] & bitsets[len, 2, 'y']
+
+building is linear in the number of letters across all words, compared to 2^len - 1
+powerset keys per word
+"""
+from __future__ import annotations
+
+from typing import Iterable, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from utils.crossword_gen.generate_constraints import ConstraintInfo
+
+__author__ = 'acushner'
+
+
+def to_bitset(mask: np.ndarray) -> int:
+    """bool array -> int with bit i set if mask[i]"""
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+def from_bitset(bits: int, num_bits: int) -> np.ndarray:
+    """int -> sorted array of the indexes of its set bits"""
+    packed = np.frombuffer(bits.to_bytes((num_bits + 7) // 8, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed, bitorder='little'))
+
+
+class BitsetIndex:
+    """one bitset per (length, position, letter) over the sorted words of each length"""
+
+    def __init__(self, len_to_words: dict[int, Iterable[str]]):
+        self.words: dict[int, list[str]] = {}
+        self._ids: dict[int, dict[str, int]] = {}
+        self._all: dict[int, int] = {}
+        self._bitsets: dict[tuple[int, int, str], int] = {}
+        self._by_pos: dict[tuple[int, int], list[tuple[str, int]]] = {}
+        for word_len, words in len_to_words.items():
+            self._add(word_len, sorted(words))
+
+    def _add(self, word_len: int, words: list[str]):
+        self.words[word_len] = words
+        self._ids[word_len] = {w: i for i, w in enumerate(words)}
+        self._all[word_len] = (1 << len(words)) - 1
+        if not words:
+            return
+
+        letters = np.array(words, dtype=f'<U{word_len}').view('<U1').reshape(len(words), word_len)
+        for pos in range(word_len):
+            col = letters[:, pos]
+            by_letter = self._by_pos[word_len, pos] = []
+            for letter in np.unique(col).tolist():
+                self._bitsets[word_len, pos, letter] = bits = to_bitset(col == letter)
+                by_letter.append((letter, bits))
+
+    def __len__(self):
+        return len(self._bitsets)
+
+    def bitset(self, word_len: int, ci: Optional[ConstraintInfo] = None) -> int:
+        """ids of words of `word_len` matching `ci` (all of them if there's no `ci`)"""
+        res = self._all.get(word_len, 0)
+        if ci:
+            get = self._bitsets.get
+            for pos, letter in zip(*ci):
+                if not (res := res & get((word_len, pos, letter), 0)):
+                    break
+        return res
+
+    def letter_bitset(self, word_len: int, pos: int, letter: str) -> int:
+        """ids of words of `word_len` with `letter` at `pos`"""
+        return self._bitsets.get((word_len, pos, letter), 0)
+
+    def letters(self, word_len: int, pos: int, bits: int) -> list[str]:
+        """letters at `pos` among the words in `bits`"""
+        return [letter for letter, b in self._by_pos.get((word_len, pos), ()) if b & bits]
+
+    def supported(self, word_len: int, pos: int, letters: Iterable[str]) -> int:
+        """ids of words of `word_len` with any of `letters` at `pos`"""
+        res = 0
+        for letter in letters:
+            res |= self._bitsets.get((word_len, pos, letter), 0)
+        return res
+
+    def exclude_bitset(self, word_len: int, words: Iterable[str]) -> int:
+        """ids of any of `words` with length `word_len`"""
+        ids = self._ids.get(word_len, {})
+        res = 0
+        for w in words:
+            if (i := ids.get(w)) is not None:
+                res |= 1 << i
+        return res
+
+    def to_words(self, word_len: int, bits: int) -> list[str]:
+        words = self.words.get(word_len, [])
+        return [words[i] for i in from_bitset(bits, len(words)).tolist()]
+
+    def match_bitset(self, word_len: int, ci: Optional[ConstraintInfo] = None, exclude: Iterable[str] = ()) -> int:
+        """ids of words of `word_len` that match `ci`, minus `exclude`"""
+        bits = self.bitset(word_len, ci)
+        if bits and exclude:
+            bits &= ~self.exclude_bitset(word_len, exclude)
+        return bits
+
+    def count(self, word_len: int, ci: Optional[ConstraintInfo] = None, exclude: Iterable[str] = ()) -> int:
+        return self.match_bitset(word_len, ci, exclude).bit_count()
+
+    def matches(self, word_len: int, ci: Optional[ConstraintInfo] = None, exclude: Iterable[str] = ()) -> set[str]:
+        """words of `word_len` that match `ci`, minus `exclude`"""
+        return set(self.to_words(word_len, self.match_bitset(word_len, ci, exclude)))
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from collections import defaultdict
+from dataclasses import dataclass
 from enum import Enum
 from functools import partial
 from itertools import count, product
@@ -13,6 +14,22 @@ from rich.table import Table, Column
 from rich.text import Text
 
 
+class SearchCancelled(Exception):
+    """someone else asked a running search to stop: unlike TimeoutError, don't retry"""
+
+
+class GridUnsolvable(Exception):
+    """a search tried everything: there's no way to fill the grid with these words"""
+
+
+@dataclass
+class SearchStats:
+    """counters a search fills in as it goes"""
+    restarts: int = 0  # searches abandoned after `retry_after_secs` and started over
+    backtracks: int = 0  # words placed and then taken back
+    matches_calls: int = 0  # candidate lookups: ConstraintManager calls for backtrack, domain scans for csp
+
+
 class Dir(Enum):
     down = 'down'
     right = 'across'
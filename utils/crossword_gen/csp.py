@@ -0,0 +1,187 @@
+"""
+fill a crossword grid as a constraint satisfaction problem
+
+each slot (WordStart) keeps a domain: a bitset of the ids of words that can still go there
+(see `BitsetIndex`). placing a word:
+    - narrows each crossing slot's domain to words with the same letter at the crossing (forward checking)
+    - removes the word from every other slot of the same length: words can't repeat
+    - if `propagate`, keeps narrowing until every crossing letter is supported by some word
+      in both slots' domains (arc consistency)
+a slot whose domain becomes empty fails the placement right away.
+
+which slots cross where comes from the grid's `CompiledGrid`. slots are filled most-constrained
+first (fewest remaining words, then most unfilled crossings), and every change is recorded on a
+trail so backtracking undoes exactly what a placement did instead of copying the board
+"""
+from __future__ import annotations
+
+import random
+import time
+from typing import Callable, Optional, TYPE_CHECKING
+
+from utils.crossword_gen.bitset_index import BitsetIndex, from_bitset
+from utils.crossword_gen.core import Board, BoardInfo, SearchCancelled, SearchStats, WordInfo
+from utils.crossword_gen.grid_compiler import CompiledGrid
+from utils.crossword_gen.mmap_store import StoreBitsetIndex
+
+if TYPE_CHECKING:
+    from utils.crossword_gen.generate_constraints import ConstraintManager
+    from utils.crossword_gen.gif_recorder import GifRecorder
+
+__author__ = 'acushner'
+
+
+class CSPSolver:
+    """see module docstring. slots are referred to by their index in `grid.slots`"""
+
+    def __init__(self, index: BitsetIndex | StoreBitsetIndex, grid: WordInfo | CompiledGrid, *, propagate=True, abort_after_secs=0.0,
+                 gif_recorder: GifRecorder = None, rng: Optional[random.Random] = None,
+                 cancelled: Optional[Callable[[], bool]] = None, stats: Optional[SearchStats] = None):
+        if not isinstance(grid, CompiledGrid):
+            grid = CompiledGrid.from_word_info(grid)
+        self.index = index
+        self.grid = grid
+        self.propagate = propagate
+        self.abort_after_secs = max(0.0, abort_after_secs)
+        self.gif_recorder = gif_recorder
+        # seeded from the global state so `random.seed` makes runs repeatable
+        self.rng = rng or random.Random(random.getrandbits(64))
+        self.cancelled = cancelled
+
+        lens = grid.lengths
+        self._same_len = [tuple(j for j, l in enumerate(lens) if l == lens[i] and j != i) for i in range(len(lens))]
+        self.domains = [index.bitset(l) for l in lens]
+        self.board: Board = {}
+        self.assigned: dict[int, str] = {}
+        self._trail: list[tuple[int, int]] = []
+        self.stats = stats if stats is not None else SearchStats()
+        self._start = time.perf_counter()
+
+    @classmethod
+    def from_constraint_manager(cls, cm: ConstraintManager, grid: WordInfo | CompiledGrid, **kwargs) -> CSPSolver:
+        return cls(cm.csp_index, grid, **kwargs)
+
+    # ==================================================================================================================
+    # domains
+    # ==================================================================================================================
+
+    def _narrow(self, slot: int, bits: int) -> bool:
+        """set slot's domain to `bits`, recording the old one. False if that empties it"""
+        self._trail.append((slot, self.domains[slot]))
+        self.domains[slot] = bits
+        return bool(bits)
+
+    def _undo(self, mark: int):
+        trail, domains = self._trail, self.domains
+        while len(trail) > mark:
+            slot, bits = trail.pop()
+            domains[slot] = bits
+
+    def _revise(self, slot: int) -> Optional[list[int]]:
+        """narrow the unassigned slots crossing `slot` to words supported by slot's domain
+
+        return the slots that changed, or None if one became empty"""
+        changed = []
+        bits = self.domains[slot]
+        lens = self.grid.lengths
+        for pos, other, other_pos in self.grid.crossings[slot]:
+            if other in self.assigned:
+                continue
+            letters = self.index.letters(lens[slot], pos, bits)
+            cur = self.domains[other]
+            if (new := cur & self.index.supported(lens[other], other_pos, letters)) != cur:
+                if not self._narrow(other, new):
+                    return None
+                changed.append(other)
+        return changed
+
+    def _place(self, slot: int, word: str, word_id: int) -> bool:
+        """assign `word` to `slot` and narrow everything else. False if that leaves a slot with no words"""
+        self.assigned[slot] = word
+        self._narrow(slot, 1 << word_id)
+
+        for other in self._same_len[slot]:
+            if other not in self.assigned and self.domains[other] >> word_id & 1:
+                if not self._narrow(other, self.domains[other] & ~(1 << word_id)):
+                    return False
+
+        lens = self.grid.lengths
+        for pos, other, other_pos in self.grid.crossings[slot]:
+            if other not in self.assigned:
+                cur = self.domains[other]
+                if not self._narrow(other, cur & self.index.letter_bitset(lens[other], other_pos, word[pos])):
+                    return False
+
+        if self.propagate:
+            queue = [other for _, other, _ in self.grid.crossings[slot] if other not in self.assigned]
+            while queue:
+                if (changed := self._revise(queue.pop())) is None:
+                    return False
+                queue.extend(changed)
+        return True
+
+    # ==================================================================================================================
+    # search
+    # ==================================================================================================================
+
+    def _select_slot(self) -> int:
+        """fewest remaining values, then most unassigned crossings, then random"""
+        unassigned = [i for i in range(len(self.grid)) if i not in self.assigned]
+
+        def key(i):
+            degree = sum(other not in self.assigned for _, other, _ in self.grid.crossings[i])
+            return self.domains[i].bit_count(), -degree, self.rng.random()
+
+        return min(unassigned, key=key)
+
+    def _set_board(self, slot: int, word: str) -> list:
+        coords = self.grid.coords[slot]
+        new_coords = [coord for coord in coords if coord not in self.board]
+        for coord, char in zip(coords, word):
+            self.board[coord] = char
+        if self.gif_recorder:
+            self.gif_recorder.record(self.board)
+        return new_coords
+
+    def _search(self) -> bool:
+        if len(self.assigned) == len(self.grid):
+            return True
+        if self.abort_after_secs and time.perf_counter() - self._start > self.abort_after_secs:
+            raise TimeoutError
+        if self.cancelled and self.cancelled():
+            raise SearchCancelled
+
+        slot = self._select_slot()
+        words = self.index.words[self.grid.lengths[slot]]
+        self.stats.matches_calls += 1
+        ids = from_bitset(self.domains[slot], len(words)).tolist()
+        self.rng.shuffle(ids)
+        for word_id in ids:
+            word = words[word_id]
+            mark = len(self._trail)
+            new_coords = self._set_board(slot, word)
+            if self._place(slot, word, word_id) and self._search():
+                return True
+
+            self.stats.backtracks += 1
+            self._undo(mark)
+            del self.assigned[slot]
+            for coord in new_coords:
+                del self.board[coord]
+        return False
+
+    def solve(self) -> Optional[BoardInfo]:
+        """fill the grid. None if it can't be done with these words"""
+        self._start = time.perf_counter()
+        if not all(self.domains) or not self._search():
+            return None
+        clues = {self.grid.slots[i]: w for i, w in self.assigned.items()}
+        return BoardInfo.from_board_clues(dict(self.board), clues)
+
+
+def solve(cm: ConstraintManager, grid: WordInfo | CompiledGrid, *, abort_after_secs=0.0,
+          gif_recorder: GifRecorder = None, propagate=True,
+          cancelled: Optional[Callable[[], bool]] = None, stats: Optional[SearchStats] = None) -> Optional[BoardInfo]:
+    return CSPSolver.from_constraint_manager(cm, grid, abort_after_secs=abort_after_secs,
+                                             gif_recorder=gif_recorder, propagate=propagate,
+                                             cancelled=cancelled, stats=stats).solve()
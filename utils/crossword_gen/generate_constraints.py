@@ -3,12 +3,16 @@ from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from functools import cache
 from itertools import combinations
-from random import shuffle
-from typing import NamedTuple, Callable
+from pathlib import Path
+from random import randint, shuffle
+from typing import NamedTuple, Callable, Iterator, Literal, Sequence
 
 from rich import print
 
 from utils.core import timer, Pickle, localtimer, first, exhaust
+from utils.crossword_gen.bitset_index import BitsetIndex, from_bitset
+from utils.crossword_gen.ingest import build_shards
+from utils.crossword_gen.mmap_store import MmapStore, StoreBitsetIndex, default_store_dir, store_key
 
 MAX_NUM_WORDS = float('inf')
 
@@ -61,34 +65,86 @@ def get_constraint_powerset(w) -> list[ConstraintInfo]:
 
 
 def read_words(filename='qtyp.txt', num_words=MAX_NUM_WORDS) -> dict[int, set[str]]:
+    """words from the first `num_words` lines of `filename`, by length
+
+    see `ingest` for cleaning up a raw word list first"""
     res = defaultdict(set)
     with open(filename) as f:
         for i, l in enumerate(f):
-            l = l.strip().lower()
-            res[len(l)].add(l)
-            if i > num_words:
+            if i >= num_words:
                 break
+            if l := l.strip().lower():
+                res[len(l)].add(l)
     return res
 
 
+def lazy_shuffle(items: list) -> Iterator:
+    """yield `items` in random order, shuffling in place only as far as has been consumed
+
+    fisher-yates from the back: stopping after k items costs k swaps instead of len(items)"""
+    for i in range(len(items) - 1, -1, -1):
+        j = randint(0, i)
+        items[i], items[j] = items[j], items[i]
+        yield items[i]
+
+
+def _lazy_words(words: Sequence[str], ids: list[int]) -> Iterator[str]:
+    return (words[i] for i in lazy_shuffle(ids))
+
+
+IndexType = Literal['powerset', 'bitset', 'mmap']
+
+
 class ConstraintManager:
+    """answer "which words fit these letters at these positions?"
+
+    `index` picks how:
+        - 'powerset': look up pickles made by `generate_constraints`, which map every subset of
+          every word's letters to the words containing them. fast lookups, but EXPENSIVE to build
+        - 'bitset': AND together one bitset per (length, position, letter). see `BitsetIndex`.
+          built in linear time when the manager is created, nothing to pickle
+        - 'mmap': the same bitsets, stored per word length in flat arrays under `store_dir` and
+          memory mapped read-only. see `MmapStore`. worker processes share the pages instead of
+          each unpickling their own copy. stores are built on first use, or up front with
+          `generate_constraints`. the csp engine reads them too, see `csp_index`
+    """
     filename: str
     num_cores: int = 4
+    index: IndexType = 'powerset'
+    store_dir: Path = default_store_dir
     _cache = {}
 
-    def __init__(self, filename: str, num_cores: int = 4, num_words=MAX_NUM_WORDS):
-        if filename in self._cache:
-            self.__dict__ = self._cache[filename]
+    def __init__(self, filename: str, num_cores: int = 4, num_words=MAX_NUM_WORDS, *, index: IndexType = 'powerset',
+                 store_dir: Path = default_store_dir):
+        key = filename, index, num_words, Path(store_dir)
+        if key in self._cache:
+            self.__dict__ = self._cache[key]
             return
 
         self.filename = filename
         self.num_cores = num_cores
+        self.index = index
+        self.store_dir = Path(store_dir)
         self.len_to_words_dict = read_words(self.filename, num_words)
-        self._cache[filename] = self.__dict__
+        if index == 'bitset':
+            self._bitset_index = BitsetIndex(self.len_to_words_dict)
+        elif index == 'mmap':
+            self._stores: dict[int, MmapStore] = {}
+            self._store_keys: dict[int, str] = {}
+        elif index != 'powerset':
+            raise ValueError(f'invalid index type: {index!r}')
+        self._cache[key] = self.__dict__
 
     @timer
     def generate_constraints(self, pred: Callable[[int], bool] = lambda word_len: word_len <= 9):
-        """EXPENSIVE!"""
+        """EXPENSIVE! (for the powerset index)"""
+        if self.index == 'mmap':
+            lens = [l for l in self.len_to_words_dict if pred(l)]
+            missing = {stem: dict.fromkeys(self.len_to_words_dict[l], 0.0)
+                       for l in lens if MmapStore.load(stem := self._store_stem(l)) is None}
+            build_shards(missing, self.num_cores)
+            return {l: self._get_store(l) for l in lens}
+
         pool = ProcessPoolExecutor(self.num_cores)
         words = {l: words for l, words in self.len_to_words_dict.items() if pred(l)}
         res = {l: pool.submit(self._create_constraints_per_len, words,
@@ -117,11 +173,51 @@ class ConstraintManager:
     def _gen_pickle_name(self, word_len):
         return f'{self.filename}_{word_len}'
 
+    @property
+    def bitset_index(self) -> BitsetIndex:
+        """`BitsetIndex` over all words, whatever `index` is. built on first use for the other modes"""
+        if (res := self.__dict__.get('_bitset_index')) is None:
+            res = self._bitset_index = BitsetIndex(self.len_to_words_dict)
+        return res
+
+    @property
+    def csp_index(self) -> BitsetIndex | StoreBitsetIndex:
+        """what `CSPSolver` narrows its domains with
+
+        for 'mmap', the bitsets are read from the stores as needed instead of building a `BitsetIndex`"""
+        if self.index != 'mmap':
+            return self.bitset_index
+        if (res := self.__dict__.get('_store_bitsets')) is None:
+            res = self._store_bitsets = StoreBitsetIndex(self._get_store)
+        return res
+
+    def _store_stem(self, word_len) -> Path:
+        if (key := self._store_keys.get(word_len)) is None:
+            key = self._store_keys[word_len] = store_key(self.len_to_words_dict.get(word_len, set()))
+        return Path(self.store_dir) / f'{Path(self.filename).name}_{word_len}_{key}'
+
+    def _get_store(self, word_len) -> MmapStore:
+        if (res := self._stores.get(word_len)) is None:
+            stem = self._store_stem(word_len)
+            if (res := MmapStore.load(stem)) is None:
+                MmapStore.build(self.len_to_words_dict.get(word_len, set())).save(stem)
+                res = MmapStore.load(stem)
+            self._stores[word_len] = res
+        return res
+
+    def __getstate__(self):
+        """don't send mmapped stores to other processes: they map the files themselves"""
+        state = self.__dict__.copy()
+        if '_stores' in state:
+            state['_stores'] = {}
+        state.pop('_store_bitsets', None)
+        return state
+
     def __hash__(self):
-        return hash(self.filename)
+        return hash((self.filename, self.index))
 
     def __eq__(self, other):
-        return self.filename == other.filename
+        return (self.filename, self.index) == (other.filename, other.index)
 
     @cache
     @timer
@@ -131,19 +227,63 @@ class ConstraintManager:
         print('reading complete')
         return res
 
+    def _powerset_candidates(self, word_len, ci) -> set[str]:
+        """words matching `ci` before removing `seen`. shared, so don't modify"""
+        if ci:
+            return self._get_pickle(word_len)[ci]
+        return self.len_to_words_dict[word_len]
+
     def matches(self, coords, board, seen, *, do_shuffle=True):
         """get constraints based on already-placed letters in the positions we're checking"""
-        if ci := ConstraintInfo.from_coords_and_board(coords, board):
-            res = self._get_pickle(len(coords))[ci]
+        ci = ConstraintInfo.from_coords_and_board(coords, board)
+        if self.index == 'bitset':
+            res = self._bitset_index.matches(len(coords), ci, seen)
+        elif self.index == 'mmap':
+            res = self._get_store(len(coords)).matches(ci, seen)
         else:
-            res = self.len_to_words_dict[len(coords)]
+            res = self._powerset_candidates(len(coords), ci) - seen
 
-        res = res - seen
         if do_shuffle:
             res = list(res)
             shuffle(res)
         return res
 
+    def count_matches(self, coords, board, seen) -> int:
+        """len(self.matches(...)) without building the matches"""
+        ci = ConstraintInfo.from_coords_and_board(coords, board)
+        if self.index == 'bitset':
+            return self._bitset_index.count(len(coords), ci, seen)
+        if self.index == 'mmap':
+            return self._get_store(len(coords)).count(ci, seen)
+        res = self._powerset_candidates(len(coords), ci)
+        return len(res) - len(res & seen) if seen else len(res)
+
+    def has_match(self, coords, board, seen) -> bool:
+        """is there at least one match? stops as soon as it finds one"""
+        ci = ConstraintInfo.from_coords_and_board(coords, board)
+        if self.index == 'bitset':
+            return bool(self._bitset_index.match_bitset(len(coords), ci, seen))
+        if self.index == 'mmap':
+            return bool(self._get_store(len(coords)).count(ci, seen))
+        res = self._powerset_candidates(len(coords), ci)
+        # `seen` can remove at most len(seen) words
+        return len(res) > len(seen) or any(w not in seen for w in res)
+
+    def iter_matches(self, coords, board, seen) -> Iterator[str]:
+        """matches in random order, shuffled only as far as they're consumed
+
+        candidates are looked up right away, so changing `board` while iterating is fine"""
+        ci = ConstraintInfo.from_coords_and_board(coords, board)
+        word_len = len(coords)
+        if self.index == 'bitset':
+            index = self._bitset_index
+            words = index.words.get(word_len, [])
+            return _lazy_words(words, from_bitset(index.match_bitset(word_len, ci, seen), len(words)).tolist())
+        if self.index == 'mmap':
+            store = self._get_store(word_len)
+            return lazy_shuffle(store.words[store.match_ids(ci, seen)].tolist())
+        return (w for w in lazy_shuffle(list(self._powerset_candidates(word_len, ci))) if w not in seen)
+
 
 if __name__ == '__main__':
     exhaust(print, get_constraint_powerset('dig'))
@@ -1,84 +1,61 @@
 from __future__ import annotations
 import os
 
+import random
 import time
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from contextlib import suppress
-from itertools import product, cycle, count
+from itertools import cycle, count
+from multiprocessing import Manager
 from random import shuffle
-from typing import Iterable
+from typing import Callable, Iterable, Iterator, Literal, Optional, TYPE_CHECKING
 
 from rich import print
 from rich.console import Console
 from rich.table import Table
 
-from utils.core import timer, chunk
-from utils.crossword_gen.core import WordStart, BoardInfo, Grid, WordInfo, Board, gen_colors
+from utils.core import timer
+from utils.crossword_gen import csp
+from utils.crossword_gen.core import (WordStart, BoardInfo, Grid, WordInfo, Board, SearchCancelled, SearchStats,
+                                      GridUnsolvable, gen_colors)
 from utils.crossword_gen.generate_constraints import ConstraintManager
-from utils.crossword_gen.gif_recorder import GifRecorder
+from utils.crossword_gen.grid_compiler import CompiledGrid, compile_grid
+
+if TYPE_CHECKING:
+    from utils.crossword_gen.gif_recorder import GifRecorder
 
 console = Console(record=True)
 
+# backtrack: shuffle and place words, retrying from scratch when it takes too long
+# csp: constraint propagation with most-constrained-slot-first ordering. see `csp`
+Engine = Literal['backtrack', 'csp']
 
-def _order_dict_by_word_len_freq(words, word_info: WordInfo):
-    freqs = {length: len(ws) for length, ws in words.items()}
-    freqs = sorted(freqs, key=freqs.__getitem__)
-    return dict(sorted(word_info.items(), key=lambda kv: freqs.index(len(kv[1]))))
+CUSTOM_6X6: Grid = [
+    [1, 1, 1, 1, 1, 1],
+    [1, 1, 0, 0, 0, 1],
+    [1, 1, 1, 1, 0, 1],
+    [1, 1, 0, 1, 0, 1],
+    [1, 1, 1, 1, 1, 1],
+    [1, 1, 1, 0, 1, 1],
+]
 
 
-def _to_word_info(g: Grid) -> WordInfo:
-    """create a dict of WordStarts to the coords that word encompasses
+def _order_dict_by_word_len_freq(words, word_info: WordInfo):
+    compiled = CompiledGrid.from_word_info(word_info)
+    return {compiled.slots[i]: word_info[compiled.slots[i]] for i in compiled.order_by_word_len_freq(words)}
 
-    g looks something like:
-    [
-        [1, 1, 1],
-        [1, 0, 0],
-        [1, 0, 0],
-    ]
-    where 1 means you can place a letter and 0 means you can't
 
-    figures out where words can start from left to right, top to bottom
-    """
-    rights, downs = set(), set()
-    num_rows, num_cols = len(g), len(g[0])
-    WordStart.init()
-
-    def _valid(r, c):
-        return r < num_rows and c < num_cols
-
-    def _chain_right(r, c):
-        while _valid(r, c) and g[r][c]:
-            yield r, c
-            c += 1
-
-    def _chain_down(r, c):
-        while _valid(r, c) and g[r][c]:
-            yield r, c
-            r += 1
-
-    res = {}
-    for r, c in product(range(num_rows), range(num_cols)):
-        val = g[r][c]
-        if not val:
-            continue
-        if (r, c) not in rights and _valid(r, c + 1) and g[r][c + 1]:
-            word_coords = list(_chain_right(r, c))
-            res[WordStart.new_right(r, c)] = word_coords
-            rights.update(word_coords)
-
-        if (r, c) not in downs and _valid(r + 1, c) and g[r + 1][c]:
-            word_coords = list(_chain_down(r, c))
-            res[WordStart.new_down(r, c)] = word_coords
-            downs.update(word_coords)
-
-    res = dict(sorted(res.items(), key=lambda kv: len(kv[1])))
-    return res
+def _to_word_info(g: Grid) -> WordInfo:
+    """create a dict of WordStarts to the coords that word encompasses. see `grid_compiler`"""
+    return compile_grid(g).word_info
 
 
 def _gen_xword_helper(cm: ConstraintManager, word_info: WordInfo,
                       abort_after_secs=0.0,
-                      gif_recorder: GifRecorder = None) -> BoardInfo:
-    """heavy lifting of actually placing words and creating a BoardInfo
+                      gif_recorder: GifRecorder = None,
+                      cancelled: Optional[Callable[[], bool]] = None,
+                      stats: Optional[SearchStats] = None) -> Optional[BoardInfo]:
+    """heavy lifting of actually placing words and creating a BoardInfo. None if no words fit
 
     if abort_after_secs is > 0, will only try for that amount of time and then bail
     reasoning is:
@@ -88,8 +65,11 @@ def _gen_xword_helper(cm: ConstraintManager, word_info: WordInfo,
         better to bail if it's taking to long, re-shuffle, and try again than to
         go down the cursed path you accidentally chose with your bad
         random starting word
+
+    if `cancelled` returns True, raises SearchCancelled
     """
     abort_after_secs = max(0.0, abort_after_secs)
+    stats = stats if stats is not None else SearchStats()
     pc = time.perf_counter
     start = pc()
     clues = {}
@@ -98,7 +78,8 @@ def _gen_xword_helper(cm: ConstraintManager, word_info: WordInfo,
                                  board: Board,
                                  seen):
         for ws in remaining:
-            if not cm.matches(word_info[ws], board, seen, do_shuffle=False):
+            stats.matches_calls += 1
+            if not cm.has_match(word_info[ws], board, seen):
                 return False
         return True
 
@@ -111,6 +92,8 @@ def _gen_xword_helper(cm: ConstraintManager, word_info: WordInfo,
 
         if abort_after_secs and (pc() - start) > abort_after_secs:
             raise TimeoutError
+        if cancelled and cancelled():
+            raise SearchCancelled
 
         if board and not _check_board_still_valid(remaining, board, seen):
             return False
@@ -120,7 +103,8 @@ def _gen_xword_helper(cm: ConstraintManager, word_info: WordInfo,
         coords = word_info[word_start]
 
         board = board.copy()
-        for w in cm.matches(coords, board, seen):
+        stats.matches_calls += 1
+        for w in cm.iter_matches(coords, board, seen):
             for coord, char in zip(coords, w):
                 board[coord] = char
             if gif_recorder:
@@ -128,21 +112,41 @@ def _gen_xword_helper(cm: ConstraintManager, word_info: WordInfo,
             if res := place(remaining, board, seen | {w}):
                 clues[word_start] = w
                 return res
+            stats.backtracks += 1
         return False
 
-    board = place(list(word_info), {})
+    if (board := place(list(word_info), {})) is False:
+        return None
     return BoardInfo.from_board_clues(board, clues)
 
 
 @timer
-def generate_crossword(cm: ConstraintManager, word_info: WordInfo,
+def generate_crossword(cm: ConstraintManager, word_info: WordInfo | CompiledGrid,
                        retry_after_secs=0.0,
-                       gif_recorder: GifRecorder = None) -> BoardInfo:
-    """runs the function that actually generates the crossword"""
+                       gif_recorder: GifRecorder = None,
+                       engine: Engine = 'backtrack',
+                       cancelled: Optional[Callable[[], bool]] = None,
+                       stats: Optional[SearchStats] = None) -> BoardInfo:
+    """runs the function that actually generates the crossword
+
+    the csp engine rarely needs `retry_after_secs`, but honors it the same way.
+    pass `stats` to find out how much work that took.
+    raises GridUnsolvable if the search runs out of words to try"""
+    if engine not in ('backtrack', 'csp'):
+        raise ValueError(f'invalid engine: {engine!r}')
+    helper = csp.solve
+    if engine == 'backtrack':
+        helper = _gen_xword_helper
+        if isinstance(word_info, CompiledGrid):
+            word_info = word_info.word_info
+    stats = stats if stats is not None else SearchStats()
     for i in count():
         with suppress(TimeoutError):
-            return _gen_xword_helper(cm, word_info, abort_after_secs=retry_after_secs,
-                                     gif_recorder=gif_recorder)
+            if (res := helper(cm, word_info, abort_after_secs=retry_after_secs,
+                              gif_recorder=gif_recorder, cancelled=cancelled, stats=stats)) is None:
+                raise GridUnsolvable('no way to fill this grid with these words')
+            return res
+        stats.restarts += 1
 
 
 def _words_and_freqs(words):
@@ -174,48 +178,172 @@ def _create_waffle_grid(size):
     return [r for r, _ in zip(cycle((row1, row2)), range(size))]
 
 
-def run_parallel(g: Grid, cm: ConstraintManager, num_puzzles, retry_after_secs=0):
-    pool = ProcessPoolExecutor(8)
-    wi = _to_word_info(g)
-    futures = [pool.submit(generate_crossword, cm, wi, retry_after_secs)
-               for _ in range(num_puzzles)]
-    return (f.result() for f in as_completed(futures))
+# ======================================================================================================================
+# parallel
+# ======================================================================================================================
+
+_worker_cm: Optional[ConstraintManager] = None
 
 
-def create_waffles(num_puzzles, size, filename, out_filename='/tmp/xwords.html'):
+def _init_worker(cm: ConstraintManager, engine: Engine):
+    """send the caller's manager once per worker instead of once per puzzle
+
+    the manager itself, not its filename: workers need the same `num_words`, `store_dir`, etc.
+    and under the spawn start method they don't inherit `ConstraintManager`'s cache"""
+    global _worker_cm
+    _worker_cm = cm
+    if engine == 'csp':
+        _worker_cm.csp_index  # built on first access
+
+
+def _poll(event, every_secs=.05) -> Callable[[], bool]:
+    """check a manager event at most every `every_secs`: each check is a round trip to the manager"""
+    next_check = 0.0
+
+    def cancelled():
+        nonlocal next_check
+        if (now := time.perf_counter()) < next_check:
+            return False
+        next_check = now + every_secs
+        return event.is_set()
+
+    return cancelled
+
+
+def _solve_in_worker(word_info: WordInfo | CompiledGrid, retry_after_secs, engine: Engine,
+                     seed: Optional[int] = None, event=None) -> Optional[BoardInfo]:
+    """None if `event` was set before this search finished"""
+    if seed is not None:
+        random.seed(seed)
+    try:
+        return generate_crossword(_worker_cm, word_info, retry_after_secs, engine=engine,
+                                  cancelled=event and _poll(event))
+    except SearchCancelled:
+        return None
+
+
+class Portfolio:
+    """a pool of warm workers, each with the constraint index already loaded
+
+    `solve` races `num_racers` differently seeded searches for the same puzzle. the first to finish
+    wins and the rest are told to stop through a shared event. one bad starting word then only costs
+    one racer instead of a full restart
+
+    the workers (and the manager process behind the events) live until `close`,
+    so use it as a context manager or close it when done"""
+
+    def __init__(self, cm: ConstraintManager, num_workers=8, engine: Engine = 'csp', *, mp_context=None):
+        self.cm = cm
+        self.num_workers = num_workers
+        self.engine = engine
+        self.pool = ProcessPoolExecutor(num_workers, mp_context, initializer=_init_worker, initargs=(cm, engine))
+        self._manager = None
+
+    def _new_event(self):
+        if self._manager is None:
+            self._manager = Manager()
+        return self._manager.Event()
+
+    def submit(self, word_info: WordInfo | CompiledGrid, retry_after_secs=0.0, seed: Optional[int] = None, event=None):
+        return self.pool.submit(_solve_in_worker, word_info, retry_after_secs, self.engine, seed, event)
+
+    def solve(self, word_info: WordInfo | CompiledGrid, num_racers: Optional[int] = None,
+              retry_after_secs=0.0) -> BoardInfo:
+        """first board any racer finds. raises GridUnsolvable as soon as one racer proves there isn't one"""
+        event = self._new_event()
+        futures = [self.submit(word_info, retry_after_secs, random.getrandbits(32), event)
+                   for _ in range(num_racers or self.num_workers)]
+        try:
+            for f in as_completed(futures):
+                if (res := f.result()) is not None:
+                    return res
+            raise SearchCancelled
+        finally:
+            event.set()
+            for f in futures:
+                f.cancel()
+
+    def generate(self, g: Grid, num_puzzles, num_racers: Optional[int] = None,
+                 retry_after_secs=0.0) -> Iterator[BoardInfo]:
+        """race each puzzle in turn, yielding boards as soon as they're found"""
+        wi = compile_grid(g)
+        for _ in range(num_puzzles):
+            yield self.solve(wi, num_racers, retry_after_secs)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def run_parallel(g: Grid, cm: ConstraintManager, num_puzzles, retry_after_secs=0, engine: Engine = 'backtrack',
+                 num_workers=8):
+    """one independent search per puzzle on a warm pool, yielding boards in the order they finish
+
+    the pool is shut down once every board is yielded or the generator is closed"""
+    with Portfolio(cm, num_workers, engine) as portfolio:
+        wi = compile_grid(g)
+        futures = [portfolio.submit(wi, retry_after_secs) for _ in range(num_puzzles)]
+        for f in as_completed(futures):
+            yield f.result()
+
+
+def create_waffles(num_puzzles, size, filename, out_filename='/tmp/xwords.html', engine: Engine = 'backtrack'):
     """create waffles sequentially"""
     g = _create_waffle_grid(size)
     cm = ConstraintManager(filename)
-    wi = _to_word_info(g)
+    wi = compile_grid(g)
 
-    bis = (generate_crossword(cm, wi, retry_after_secs=2) for _ in range(num_puzzles))
+    bis = (generate_crossword(cm, wi, retry_after_secs=2, engine=engine) for _ in range(num_puzzles))
     _to_html(g, bis, out_filename)
 
 
 def create_waffles_parallel(num_puzzles, size, filename, out_filename='/tmp/xwords.html',
-                            chunk_size=8):
-    """create waffles in parallel"""
+                            engine: Engine = 'backtrack', num_racers=0):
+    """create waffles in parallel, writing each to `out_filename` as soon as it's done
+
+    if `num_racers`, race that many searches per puzzle instead of one search per puzzle"""
     g = _create_waffle_grid(size)
     cm = ConstraintManager(filename)
-    for bis in chunk(run_parallel(g, cm, num_puzzles, retry_after_secs=30), chunk_size):
-        _to_html(g, bis, out_filename, clear_html_buffer=False)
+    if num_racers:
+        with Portfolio(cm, engine=engine) as portfolio:
+            _to_html(g, portfolio.generate(g, num_puzzles, num_racers), out_filename, incremental=True)
+    else:
+        bis = run_parallel(g, cm, num_puzzles, retry_after_secs=30, engine=engine)
+        _to_html(g, bis, out_filename, incremental=True)
 
 
-def _to_html(g: Grid, bis: Iterable[BoardInfo], out_filename, *, clear_html_buffer=True):
+def _to_html(g: Grid, bis: Iterable[BoardInfo], out_filename, *, clear_html_buffer=True, incremental=False):
+    """if `incremental`, rewrite `out_filename` after each board instead of once at the end"""
     tables = (bi.as_table(g, c)
               for c, bi in zip(gen_colors(), bis))
-    console.print(*tables)
+    if incremental:
+        for t in tables:
+            console.print(t)
+            console.save_html(out_filename, clear=False)
+    else:
+        console.print(*tables)
     console.save_html(out_filename, clear=clear_html_buffer)
 
 
-def _run_one(*, size_or_grid: int | Grid = 5, to_gif=False, retry_after_secs=0.0):
+def _run_one(*, size_or_grid: int | Grid = 5, to_gif=False, retry_after_secs=0.0, engine: Engine = 'backtrack'):
     g = size_or_grid
     if isinstance(size_or_grid, int):
         g = _create_waffle_grid(size_or_grid)
     cm = ConstraintManager('words_in_order.txt')
-    wi = _to_word_info(g)
-    gif_recorder = GifRecorder(g) if to_gif else None
-    bi = generate_crossword(cm, wi, gif_recorder=gif_recorder, retry_after_secs=retry_after_secs)
+    wi = compile_grid(g)
+    gif_recorder = None
+    if to_gif:
+        from utils.crossword_gen.gif_recorder import GifRecorder
+        gif_recorder = GifRecorder(g)
+    bi = generate_crossword(cm, wi, gif_recorder=gif_recorder, retry_after_secs=retry_after_secs, engine=engine)
     print(bi.as_table(g))
     if to_gif:
         gif_recorder.to_gif()
@@ -228,11 +356,11 @@ def generate_constraints(filename, num_words=float('inf')):
 
 
 def gen_nines():
-    return create_waffles_parallel(16, 9, 'qtyp.txt', out_filename='the_nines.html', chunk_size=1)
+    return create_waffles_parallel(16, 9, 'qtyp.txt', out_filename='the_nines.html', engine='csp', num_racers=8)
 
 
 def gen_elevens():
-    return create_waffles_parallel(4, 11, 'qtyp.txt', out_filename='the_elevens.html', chunk_size=1)
+    return create_waffles_parallel(4, 11, 'qtyp.txt', out_filename='the_elevens.html', engine='csp', num_racers=8)
 
 
 @timer
@@ -243,14 +371,7 @@ def __main():
     _to_html(_create_waffle_grid(7), bis, '/tmp/matt.html')
 
     # return
-    g = [
-        [1, 1, 1, 1, 1, 1],
-        [1, 1, 0, 0, 0, 1],
-        [1, 1, 1, 1, 0, 1],
-        [1, 1, 0, 1, 0, 1],
-        [1, 1, 1, 1, 1, 1],
-        [1, 1, 1, 0, 1, 1],
-    ]
+    g = CUSTOM_6X6
     # g = [
     #     [1] * 6,
     #     [1] * 6,
@@ -1,91 +1,152 @@
-import os
-from concurrent.futures import ProcessPoolExecutor
-from itertools import count
-from random import randint
+"""
+record a crossword search as an animated gif
 
-import imgkit
-from PIL import Image
-from rich.console import Console
-from rich.table import Table
+boards are drawn straight into palette ('P') frames with numpy: every cell is a tile from a
+small atlas (an open cell, a blocked cell and one tile per letter, rendered once with PIL),
+so a frame is just the previous frame with the changed cells' tiles copied in.
 
-from utils.crossword_gen.core import BoardInfo, Grid, Board, random_color
+`record` only keeps which cells changed; identical consecutive boards extend the previous
+frame's duration instead of adding a frame. `to_gif` rebuilds the frames one at a time
+while PIL's gif encoder consumes them
+"""
+from __future__ import annotations
 
-console = Console(width=60, force_terminal=True, file=open('/dev/null', 'w'),
-                  record=True)
+from functools import lru_cache
+from typing import Iterator, Optional
 
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from rich.color import Color
 
-def _save(table: Table, html_name, img_name):
-    console.print(table, width=60)
-    console.save_html(html_name)
-    return _write_img(html_name, img_name)
+from utils.crossword_gen.core import Board, Grid, random_color
 
+__author__ = 'acushner'
 
-def _write_img(html_file, out_file):
-    imgkit.from_file(html_file, out_file)
-    return out_file
+# palette indexes. open cells are `_ink` (white). letters are anti-aliased up to `_ink + _num_ink_levels - 1` (black)
+_line = 0
+_blocked = 1
+_ink = 2
+_num_ink_levels = 8
 
 
-class GifRecorder:
+def _palette(color: str) -> list[int]:
+    rgb = list(Color.parse(color).get_truecolor())
+    ink = [[round(255 * (1 - i / (_num_ink_levels - 1)))] * 3 for i in range(_num_ink_levels)]
+    return rgb + rgb + [v for level in ink for v in level]
 
-    def __init__(self, grid: Grid, record_every=1):
-        self._images = []
-        self._id = randint(1, 100000)
-        self._file_count = count()
-        self._num_record_calls = count()
-        self._record_every = record_every
-        self._grid = grid
-        self._futures = []
-        self._pool = ProcessPoolExecutor(12)
-        self._color = random_color()
 
-    def record(self, board: Board):
-        if next(self._num_record_calls) % self._record_every:
-            return
-        table = BoardInfo(board, None).board_to_table(self._grid, self._color)
-        num = next(self._file_count)
-        html_name = self._filename('html', num)
-        img_name = self._filename('jpg', num)
-        self._futures.append(
-            self._pool.submit(_save, table, html_name, img_name)
-        )
+@lru_cache()
+def _font(size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # pillow < 10.1 only has the fixed size bitmap font
+        return ImageFont.load_default()
 
-    def _write_img(self, html_file: str, num: int):
-        out = self._filename('jpg', num)
-        imgkit.from_file(html_file, out)
-        self._images.append(out)
 
-    def _filename(self, typ, num: int) -> str:
-        return f'/tmp/gif_recorder_{self._id}_{typ}_{num:05d}.{typ}'
+class TileAtlas:
+    """`cell_px` square tiles of palette indexes, one per cell state"""
 
-    @property
-    def _tmp_files(self):
-        for filename in sorted(os.listdir('/tmp')):
-            if f'gif_recorder_{self._id}_jpg' in filename:
-                yield filename
+    def __init__(self, cell_px=32):
+        self.cell_px = cell_px
+        self.open = self._bordered(_ink)
+        self.blocked = self._bordered(_blocked)
+        self._letters: dict[str, np.ndarray] = {}
 
-    def to_gif(self):
-        self.to_gif_static(f.result() for f in self._futures)
+    def _bordered(self, fill: int) -> np.ndarray:
+        res = np.full((self.cell_px, self.cell_px), _line, dtype=np.uint8)
+        res[1:-1, 1:-1] = fill
+        return res
 
-    @staticmethod
-    def to_gif_static(filenames):
-        first, *rest = map(Image.open, filenames)
-        first.save('/tmp/out.gif', save_all=True, append_images=rest,
-                   duration=240, optimize=True, loop=64)
+    def letter(self, char: Optional[str]) -> np.ndarray:
+        if not char:
+            return self.open
+        if (res := self._letters.get(char)) is None:
+            im = Image.new('L', (self.cell_px, self.cell_px))
+            center = self.cell_px / 2
+            ImageDraw.Draw(im).text((center, center), char, fill=255, font=_font(self.cell_px * 5 // 8), anchor='mm')
+            levels = np.asarray(im, dtype=np.uint16) * (_num_ink_levels - 1) // 255
+            res = self.open.copy()
+            res[1:-1, 1:-1] = _ink + levels[1:-1, 1:-1]
+            self._letters[char] = res
+        return res
 
 
-def from_tmp(gr_id: int):
-    names = sorted(os.listdir('/tmp'))
-    images = []
-    for fname in names:
-        if f'gif_recorder_{gr_id}_jpg_' in fname:
-            images.append(f'/tmp/{fname}')
-    GifRecorder.to_gif_static(images)
+class GifRecorder:
+    """see module docstring"""
 
-    pass
+    def __init__(self, grid: Grid, record_every=1, *, cell_px=32, duration=240,
+                 color: Optional[str] = None, filename='/tmp/out.gif'):
+        self._grid = grid
+        self._record_every = record_every
+        self._num_record_calls = 0
+        self._duration = duration
+        self._filename = filename
+        self._palette = _palette(color or random_color())
+        self._atlas = TileAtlas(cell_px)
+        self._open_cells = [(r, c) for r, row in enumerate(grid) for c, v in enumerate(row) if v]
+
+        self._last: Board = {}
+        self._deltas: list[dict] = []  # per frame: {coord: char or None}
+        self._durations: list[int] = []
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def record(self, board: Board):
+        self._num_record_calls += 1
+        if (self._num_record_calls - 1) % self._record_every:
+            return
+
+        delta = {coord: v for coord in self._open_cells if (v := board.get(coord)) != self._last.get(coord)}
+        if self._deltas and not delta:
+            self._durations[-1] += self._duration
+            return
+        self._deltas.append(delta)
+        self._durations.append(self._duration)
+        self._last = {coord: board[coord] for coord in self._open_cells if coord in board}
+
+    # ==================================================================================================================
+    # rendering
+    # ==================================================================================================================
+
+    def _blit(self, frame: np.ndarray, coord, tile: np.ndarray):
+        px = self._atlas.cell_px
+        r, c = coord
+        frame[r * px:(r + 1) * px, c * px:(c + 1) * px] = tile
+
+    def _base_frame(self) -> np.ndarray:
+        px = self._atlas.cell_px
+        res = np.empty((len(self._grid) * px, len(self._grid[0]) * px), dtype=np.uint8)
+        for r, row in enumerate(self._grid):
+            for c, v in enumerate(row):
+                self._blit(res, (r, c), self._atlas.open if v else self._atlas.blocked)
+        return res
+
+    def _to_image(self, frame: np.ndarray) -> Image.Image:
+        # copies `frame`: the encoder holds on to earlier frames while we keep drawing on it
+        res = Image.frombytes('P', frame.shape[::-1], frame.tobytes())
+        res.putpalette(self._palette)
+        return res
+
+    def frames(self) -> Iterator[Image.Image]:
+        """one image per recorded frame, built as they're consumed"""
+        frame = self._base_frame()
+        for delta in self._deltas or [{}]:
+            for coord, char in delta.items():
+                self._blit(frame, coord, self._atlas.letter(char))
+            yield self._to_image(frame)
+
+    def to_gif(self, filename: Optional[str] = None) -> str:
+        filename = filename or self._filename
+        frames = self.frames()
+        first = next(frames)
+        first.save(filename, save_all=True, append_images=frames,
+                   duration=self._durations or [self._duration], loop=64)
+        return filename
 
 
 def __main():
-    return from_tmp(19587)
     g = [
         [1, 1, 1],
         [1, 0, 1],
@@ -93,6 +154,9 @@ def __main():
     ]
     gr = GifRecorder(g)
     gr.record({(0, 0): 'a'})
+    gr.record({(0, 0): 'a', (0, 1): 'b', (0, 2): 'c'})
+    gr.record({(0, 0): 'a', (0, 1): 'b', (0, 2): 'c'})
+    print(gr.to_gif())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,127 @@
+"""
+turn a `Grid` into everything the solvers need to know about its shape, once
+
+a `CompiledGrid` is immutable and made of tuples, so it's cheap to pickle to worker processes.
+slots are referred to by their index in `slots`:
+    - `coords[i]`: the cells slot i covers
+    - `lengths[i]`: len(coords[i])
+    - `crossings[i]`: (pos in slot i, other slot, pos in other slot) for every cell slot i shares
+
+`compile_grid` caches by the grid's contents, so repeatedly generating puzzles for the same
+grid only parses it once
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from functools import lru_cache
+from itertools import product
+from typing import NamedTuple, Optional, Sized
+
+from utils.crossword_gen.core import Coord, Grid, WordInfo, WordStart
+
+__author__ = 'acushner'
+
+# (position in this slot, crossing slot, position in crossing slot)
+Crossing = tuple[int, int, int]
+GridKey = tuple[tuple[int, ...], ...]
+
+
+def _parse(g: GridKey) -> WordInfo:
+    """create a dict of WordStarts to the coords that word encompasses
+
+    g looks something like:
+    [
+        [1, 1, 1],
+        [1, 0, 0],
+        [1, 0, 0],
+    ]
+    where 1 means you can place a letter and 0 means you can't
+
+    figures out where words can start from left to right, top to bottom
+    """
+    rights, downs = set(), set()
+    num_rows, num_cols = len(g), len(g[0])
+    WordStart.init()
+
+    def _valid(r, c):
+        return r < num_rows and c < num_cols
+
+    def _chain_right(r, c):
+        while _valid(r, c) and g[r][c]:
+            yield r, c
+            c += 1
+
+    def _chain_down(r, c):
+        while _valid(r, c) and g[r][c]:
+            yield r, c
+            r += 1
+
+    res = {}
+    for r, c in product(range(num_rows), range(num_cols)):
+        val = g[r][c]
+        if not val:
+            continue
+        if (r, c) not in rights and _valid(r, c + 1) and g[r][c + 1]:
+            word_coords = list(_chain_right(r, c))
+            res[WordStart.new_right(r, c)] = word_coords
+            rights.update(word_coords)
+
+        if (r, c) not in downs and _valid(r + 1, c) and g[r + 1][c]:
+            word_coords = list(_chain_down(r, c))
+            res[WordStart.new_down(r, c)] = word_coords
+            downs.update(word_coords)
+
+    return dict(sorted(res.items(), key=lambda kv: len(kv[1])))
+
+
+class CompiledGrid(NamedTuple):
+    """see module docstring"""
+    slots: tuple[WordStart, ...]
+    coords: tuple[tuple[Coord, ...], ...]
+    lengths: tuple[int, ...]
+    crossings: tuple[tuple[Crossing, ...], ...]
+    grid: Optional[GridKey] = None
+
+    @classmethod
+    def from_word_info(cls, word_info: WordInfo, grid: Optional[GridKey] = None) -> CompiledGrid:
+        slots = tuple(word_info)
+        coords = tuple(tuple(word_info[ws]) for ws in slots)
+
+        by_coord = defaultdict(list)
+        for i, cs in enumerate(coords):
+            for pos, coord in enumerate(cs):
+                by_coord[coord].append((i, pos))
+
+        crossings = [[] for _ in slots]
+        for shared in by_coord.values():
+            for i, pos in shared:
+                crossings[i].extend((pos, j, other_pos) for j, other_pos in shared if j != i)
+
+        return cls(slots, coords, tuple(map(len, coords)), tuple(map(tuple, crossings)), grid)
+
+    def __len__(self):
+        return len(self.slots)
+
+    @property
+    def word_info(self) -> WordInfo:
+        """a fresh WordInfo dict, for code that wants one"""
+        return {ws: list(cs) for ws, cs in zip(self.slots, self.coords)}
+
+    def order_by_word_len_freq(self, len_to_words: dict[int, Sized]) -> tuple[int, ...]:
+        """slot indexes, those whose length has the fewest words first"""
+        rank = {l: i for i, l in enumerate(sorted(len_to_words, key=lambda l: len(len_to_words[l])))}
+        return tuple(sorted(range(len(self)), key=lambda i: rank.get(self.lengths[i], -1)))
+
+
+def grid_key(g: Grid) -> GridKey:
+    """hashable version of `g`"""
+    return tuple(tuple(int(bool(v)) for v in row) for row in g)
+
+
+@lru_cache(64)
+def _compile(key: GridKey) -> CompiledGrid:
+    return CompiledGrid.from_word_info(_parse(key), key)
+
+
+def compile_grid(g: Grid) -> CompiledGrid:
+    return _compile(grid_key(g))
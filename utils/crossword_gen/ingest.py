@@ -0,0 +1,201 @@
+"""
+turn a raw word list into constraint stores, one word length (shard) at a time
+
+    python -m utils.crossword_gen.ingest words.txt [out_dir]
+
+1. stream the list line by line: normalize each word (see `normalize`), drop junk and dedupe,
+   keeping each word's best score. lines are `word` or `word score` (space, tab or comma separated).
+   lists without scores are assumed to be in frequency order, so a word scores 1 / (1 + line number)
+2. write the clean words, best first, to `out_dir / <list name>`. that's the file to hand to
+   `ConstraintManager(..., index='mmap', store_dir=out_dir)`. `out_dir` can't be the raw
+   list's own directory: that would overwrite it
+3. build each length's `MmapStore`, plus its scores, in parallel, at the paths that
+   `ConstraintManager` looks for them
+4. record each shard's content hash in a manifest. on the next run only the lengths
+   whose words or scores changed get rebuilt
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from utils.crossword_gen.mmap_store import MmapStore, default_store_dir, store_key
+
+__author__ = 'acushner'
+
+_version = 1
+_word_re = re.compile('[a-z]+')
+
+
+class WordEntry(NamedTuple):
+    word: str
+    score: float
+
+
+class IngestResult(NamedTuple):
+    words_path: Path
+    manifest_path: Path
+    rebuilt: tuple[int, ...]  # word lengths whose shards were (re)built
+
+
+# ======================================================================================================================
+# streaming
+# ======================================================================================================================
+
+def normalize(word: str) -> Optional[str]:
+    """lowercase and strip accents. None unless all that's left is a-z"""
+    word = unicodedata.normalize('NFKD', word.strip().lower())
+    word = ''.join(c for c in word if not unicodedata.combining(c))
+    return word if _word_re.fullmatch(word) else None
+
+
+def iter_entries(filename, num_words=float('inf')) -> Iterator[WordEntry]:
+    """normalized words from the first `num_words` lines of `filename`"""
+    with open(filename, encoding='utf-8', errors='replace') as f:
+        for rank, line in enumerate(f):
+            if rank >= num_words:
+                break
+            word, *rest = line.replace(',', ' ').split() or ['']
+            if not (word := normalize(word)):
+                continue
+            try:
+                score = float(rest[0])
+            except (IndexError, ValueError):
+                score = 1 / (1 + rank)
+            yield WordEntry(word, score)
+
+
+def collect(entries: Iterable[WordEntry], min_len=2, max_len: Optional[int] = None) -> dict[int, dict[str, float]]:
+    """group by length and dedupe, keeping each word's best score"""
+    res = defaultdict(dict)
+    for word, score in entries:
+        if len(word) < min_len or (max_len and len(word) > max_len):
+            continue
+        by_word = res[len(word)]
+        if score > by_word.get(word, float('-inf')):
+            by_word[word] = score
+    return dict(res)
+
+
+# ======================================================================================================================
+# shards
+# ======================================================================================================================
+
+def _atomic_write(path: Path, write):
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.', delete=False) as f:
+        try:
+            write(f)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+def shard_hash(scores: dict[str, float]) -> str:
+    """changes if any word or score does"""
+    return hashlib.sha1(''.join(f'{w}\t{s!r}\n' for w, s in sorted(scores.items())).encode()).hexdigest()[:16]
+
+
+def shard_stem(out_dir: Path, list_name: str, words: Iterable[str]) -> Path:
+    """where `ConstraintManager` looks for the store of these words"""
+    words = list(words)
+    return Path(out_dir) / f'{list_name}_{len(next(iter(words), ""))}_{store_key(words)}'
+
+
+def _scores_path(stem: Path) -> Path:
+    return stem.with_name(f'{stem.name}.scores.npy')
+
+
+def build_shard(stem: Path, scores: dict[str, float]) -> int:
+    """build and save the store for one length. scores go first: the store's last file marks it complete"""
+    words = sorted(scores)
+    stem.parent.mkdir(parents=True, exist_ok=True)
+    _atomic_write(_scores_path(stem), lambda f: np.save(f, np.array([scores[w] for w in words], dtype=np.float32)))
+    MmapStore.build(words).save(stem)
+    return len(words)
+
+
+def build_shards(shards: dict[Path, dict[str, float]], num_cores=4) -> dict[Path, int]:
+    """build several shards in parallel. returns number of words per shard"""
+    if len(shards) <= 1 or num_cores <= 1:
+        return {stem: build_shard(stem, scores) for stem, scores in shards.items()}
+    with ProcessPoolExecutor(min(num_cores, len(shards))) as pool:
+        return dict(zip(shards, pool.map(build_shard, shards, shards.values())))
+
+
+def remove_shard(stem: Path):
+    for path in stem.parent.glob(f'{stem.name}.*.npy'):
+        path.unlink(missing_ok=True)
+
+
+def load_scores(stem: Path) -> Optional[np.ndarray]:
+    """scores aligned with the store's words"""
+    if not (path := _scores_path(stem)).exists():
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+# ======================================================================================================================
+# ingest
+# ======================================================================================================================
+
+def _read_manifest(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            res = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return res.get('shards', {}) if res.get('version') == _version else {}
+
+
+def ingest(filename, out_dir: Path = default_store_dir, *, num_words=float('inf'), min_len=2,
+           max_len: Optional[int] = None, num_cores=4, force=False) -> IngestResult:
+    """see module docstring"""
+    out_dir = Path(out_dir)
+    words_path = out_dir / Path(filename).name
+    if words_path.resolve() == Path(filename).resolve():
+        raise ValueError(f'writing the clean list to {words_path} would overwrite {filename}: use another `out_dir`')
+    out_dir.mkdir(parents=True, exist_ok=True)
+    by_len = collect(iter_entries(filename, num_words), min_len, max_len)
+
+    best_first = sorted((-s, w) for scores in by_len.values() for w, s in scores.items())
+    _atomic_write(words_path, lambda f: f.write(''.join(f'{w}\n' for _, w in best_first).encode()))
+
+    manifest_path = words_path.with_name(f'{words_path.name}.manifest.json')
+    old = _read_manifest(manifest_path)
+    shards, todo = {}, {}
+    for word_len, scores in sorted(by_len.items()):
+        stem = shard_stem(out_dir, words_path.name, scores)
+        shards[str(word_len)] = dict(hash=shard_hash(scores), stem=stem.name, num_words=len(scores))
+        if force or old.get(str(word_len)) != shards[str(word_len)] or MmapStore.load(stem) is None:
+            todo[stem] = scores
+
+    build_shards(todo, num_cores)
+    for word_len, info in old.items():
+        if info.get('stem') and shards.get(word_len, {}).get('stem') != info['stem']:
+            remove_shard(out_dir / info['stem'])
+    manifest = dict(version=_version, source=str(Path(filename).resolve()), shards=shards)
+    _atomic_write(manifest_path, lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+    rebuilt = tuple(sorted(len(next(iter(scores))) for scores in todo.values()))
+    return IngestResult(words_path, manifest_path, rebuilt)
+
+
+def __main():
+    filename, *rest = sys.argv[1:]
+    res = ingest(filename, *map(Path, rest))
+    print(f'words: {res.words_path}\nmanifest: {res.manifest_path}\nrebuilt lengths: {list(res.rebuilt)}')
+
+
+if __name__ == '__main__':
+    __main()
@@ -0,0 +1,175 @@
+"""
+constraint index stored as flat arrays that every process can mmap read-only
+
+per word length there are three .npy files:
+    - `words`: sorted fixed-width unicode array. a word's id is its index
+    - `letters`: sorted array of every letter that appears in those words
+    - `bits`: (word_len, num_letters, ceil(num_words / 8)) uint8 array. bits[pos, letter]
+      is the packed bitset of ids of words with that letter at that position
+
+loading is `np.load(mmap_mode='r')`: no deserialization, and processes reading the same
+files share the same pages. a constraint only reads the bitset rows it ANDs together
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Iterable, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from utils.crossword_gen.generate_constraints import ConstraintInfo
+
+__author__ = 'acushner'
+
+default_store_dir = Path('/tmp/.pydata/constraint_store')
+_parts = 'words', 'letters', 'bits'
+
+
+def store_key(words: Iterable[str]) -> str:
+    """content hash of a set of words, so stale stores are never picked up"""
+    return hashlib.sha1('\n'.join(sorted(words)).encode()).hexdigest()[:16]
+
+
+class MmapStore:
+    """words of a single length plus their (position, letter) bitsets. see module docstring"""
+
+    def __init__(self, words: np.ndarray, letters: np.ndarray, bits: np.ndarray):
+        self.words = words
+        self.letters = letters
+        self.bits = bits
+
+    @classmethod
+    def build(cls, words: Iterable[str]) -> MmapStore:
+        words = sorted(words)
+        word_len = len(words[0]) if words else 0
+        arr = np.array(words, dtype=f'<U{max(word_len, 1)}')
+        by_pos = arr.view('<U1').reshape(len(words), word_len)
+        letters = np.unique(by_pos)
+        bits = np.zeros((word_len, len(letters), (len(words) + 7) // 8), dtype=np.uint8)
+        for pos in range(word_len):
+            bits[pos] = np.packbits(by_pos[:, pos] == letters[:, None], axis=1, bitorder='little')
+        return cls(arr, letters, bits)
+
+    def __len__(self):
+        return len(self.words)
+
+    # ==================================================================================================================
+    # persistence
+    # ==================================================================================================================
+
+    @staticmethod
+    def _path(stem: Path, part: str) -> Path:
+        return stem.with_name(f'{stem.name}.{part}.npy')
+
+    def save(self, stem: Path):
+        """write each part atomically. `bits` goes last, so `load` only sees complete stores"""
+        stem.parent.mkdir(parents=True, exist_ok=True)
+        for part in _parts:
+            path = self._path(stem, part)
+            with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.', delete=False) as f:
+                np.save(f, getattr(self, part))
+            os.replace(f.name, path)
+
+    @classmethod
+    def load(cls, stem: Path) -> Optional[MmapStore]:
+        if not cls._path(stem, _parts[-1]).exists():
+            return None
+        return cls(*(np.load(cls._path(stem, part), mmap_mode='r') for part in _parts))
+
+    # ==================================================================================================================
+    # lookups
+    # ==================================================================================================================
+
+    def _ids_of(self, words: Iterable[str]) -> np.ndarray:
+        word_len = self.bits.shape[0]
+        words = np.array([w for w in words if len(w) == word_len], dtype=self.words.dtype)
+        if not len(words) or not len(self):
+            return np.zeros(0, dtype=int)
+        idxs = np.minimum(np.searchsorted(self.words, words), len(self) - 1)
+        return idxs[self.words[idxs] == words]
+
+    def ids(self, ci: Optional[ConstraintInfo] = None) -> np.ndarray:
+        """ids of words matching `ci` (all of them if there's no `ci`)"""
+        if not ci:
+            return np.arange(len(self))
+
+        letters = np.array(list(ci.chars), dtype=self.letters.dtype)
+        letter_idxs = np.minimum(np.searchsorted(self.letters, letters), len(self.letters) - 1)
+        if not len(self.letters) or (self.letters[letter_idxs] != letters).any():
+            return np.zeros(0, dtype=int)
+
+        packed = np.bitwise_and.reduce(self.bits[list(ci.idxs), letter_idxs], axis=0)
+        return np.flatnonzero(np.unpackbits(packed, bitorder='little', count=len(self)))
+
+    def match_ids(self, ci: Optional[ConstraintInfo] = None, exclude: Iterable[str] = ()) -> np.ndarray:
+        """ids of words matching `ci`, minus `exclude`"""
+        ids = self.ids(ci)
+        if len(ids) and exclude:
+            ids = np.setdiff1d(ids, self._ids_of(exclude), assume_unique=True)
+        return ids
+
+    def count(self, ci: Optional[ConstraintInfo] = None, exclude: Iterable[str] = ()) -> int:
+        return len(self.match_ids(ci, exclude))
+
+    def matches(self, ci: Optional[ConstraintInfo] = None, exclude: Iterable[str] = ()) -> set[str]:
+        """words matching `ci`, minus `exclude`"""
+        return set(self.words[self.match_ids(ci, exclude)].tolist())
+
+
+class _StoreWords:
+    """`BitsetIndex.words` for stores: word_len -> words by id"""
+
+    def __init__(self, get_store: Callable[[int], MmapStore]):
+        self._get_store = get_store
+
+    def __getitem__(self, word_len: int) -> np.ndarray:
+        return self._get_store(word_len).words
+
+
+class StoreBitsetIndex:
+    """the parts of `BitsetIndex` that `CSPSolver` uses, read from memory mapped stores
+
+    a (length, position, letter) row is only turned into an int the first time it's needed,
+    so a process holds just the bitsets its searches touch instead of a whole `BitsetIndex`"""
+
+    def __init__(self, get_store: Callable[[int], MmapStore]):
+        self._get_store = get_store
+        self.words = _StoreWords(get_store)
+        self._bitsets: dict[tuple[int, int, str], int] = {}
+
+    def bitset(self, word_len: int, ci: Optional[ConstraintInfo] = None) -> int:
+        """ids of words of `word_len` matching `ci` (all of them if there's no `ci`)"""
+        res = (1 << len(self._get_store(word_len))) - 1
+        if ci:
+            for pos, letter in zip(*ci):
+                if not (res := res & self.letter_bitset(word_len, pos, letter)):
+                    break
+        return res
+
+    def letter_bitset(self, word_len: int, pos: int, letter: str) -> int:
+        """ids of words of `word_len` with `letter` at `pos`"""
+        key = word_len, pos, letter
+        if (res := self._bitsets.get(key)) is None:
+            store = self._get_store(word_len)
+            i = int(np.searchsorted(store.letters, letter))
+            res = 0
+            if i < len(store.letters) and store.letters[i] == letter and pos < store.bits.shape[0]:
+                res = int.from_bytes(store.bits[pos, i].tobytes(), 'little')
+            self._bitsets[key] = res
+        return res
+
+    def letters(self, word_len: int, pos: int, bits: int) -> list[str]:
+        """letters at `pos` among the words in `bits`"""
+        return [letter for letter in self._get_store(word_len).letters.tolist()
+                if self.letter_bitset(word_len, pos, letter) & bits]
+
+    def supported(self, word_len: int, pos: int, letters: Iterable[str]) -> int:
+        """ids of words of `word_len` with any of `letters` at `pos`"""
+        res = 0
+        for letter in letters:
+            res |= self.letter_bitset(word_len, pos, letter)
+        return res
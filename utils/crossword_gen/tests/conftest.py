@@ -0,0 +1,43 @@
+import random
+from collections import defaultdict
+from typing import Iterable
+
+import pytest
+
+__author__ = 'acushner'
+
+
+def random_words(seed=0, alphabet='aeilnorst', lens: Iterable[int] = (3, 5), num_per_len=2000) -> list[str]:
+    """sorted, deduped words of random letters: `num_per_len` draws for each length in `lens`"""
+    rng = random.Random(seed)
+    return sorted({''.join(rng.choices(alphabet, k=k)) for k in lens for _ in range(num_per_len)})
+
+
+def by_len(words: Iterable[str]) -> dict[int, set[str]]:
+    """words by length, like `read_words`"""
+    res = defaultdict(set)
+    for w in words:
+        res[len(w)].add(w)
+    return res
+
+
+def write_words(path, words: Iterable[str]) -> str:
+    """one word per line, like the real word lists"""
+    path.write_text('\n'.join(words) + '\n')
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def word_spec() -> dict:
+    """kwargs for `random_words`. override in a test module to get different words"""
+    return {}
+
+
+@pytest.fixture(scope='module')
+def words(word_spec) -> list[str]:
+    return random_words(**word_spec)
+
+
+@pytest.fixture(scope='module')
+def word_file(tmp_path_factory, words) -> str:
+    return write_words(tmp_path_factory.mktemp('words') / 'words.txt', words)
@@ -0,0 +1,51 @@
+import pytest
+from rich.console import Console
+
+from utils.crossword_gen.benchmark import load_baseline, report, run_batch, save_baseline, summarize
+from utils.crossword_gen.generate_constraints import ConstraintManager
+from utils.crossword_gen.generate_crosswords import _create_waffle_grid
+
+__author__ = 'acushner'
+
+
+@pytest.fixture(scope='module')
+def word_spec():
+    return dict(seed=4)
+
+
+@pytest.fixture(scope='module')
+def cm(word_file):
+    return ConstraintManager(word_file, index='bitset')
+
+
+@pytest.mark.parametrize('engine', ['backtrack', 'csp'])
+def test_run_batch(cm, engine):
+    grids = dict(waffle_3=_create_waffle_grid(3), waffle_5=_create_waffle_grid(5))
+    runs = run_batch(cm, grids, 3, engine=engine)
+    assert len(runs) == 6
+    assert all(r.solved and r.matches_calls for r in runs)
+    assert [r.seed for r in runs] == [0, 1, 2] * 2
+
+    again = run_batch(cm, grids, 3, engine=engine)
+    assert [(r.backtracks, r.matches_calls) for r in runs] == [(r.backtracks, r.matches_calls) for r in again]
+
+
+def test_unsolved(cm):
+    runs = run_batch(cm, dict(waffle_5=_create_waffle_grid(5)), 1, max_secs=0)
+    assert not runs[0].solved
+
+
+def test_summary_and_baseline(cm, tmp_path):
+    summary = summarize(run_batch(cm, dict(waffle_5=_create_waffle_grid(5)), 4, engine='csp'))
+    s = summary['waffle_5']
+    assert s['runs'] == s['solved'] == 4
+    assert s['secs']['p50'] <= s['secs']['p90'] <= s['secs']['p99']
+
+    path = tmp_path / 'baseline.json'
+    save_baseline(path, summary, engine='csp')
+    assert load_baseline(path) == summary
+    assert load_baseline(tmp_path / 'missing.json') is None
+
+    console = Console(record=True, width=300)
+    console.print(report(summary, load_baseline(path)))
+    assert '1.00x' in console.export_text()
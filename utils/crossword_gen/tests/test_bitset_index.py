@@ -0,0 +1,52 @@
+from collections import defaultdict
+
+import pytest
+
+from utils.crossword_gen.bitset_index import BitsetIndex, from_bitset, to_bitset
+from utils.crossword_gen.generate_constraints import ConstraintInfo, ConstraintManager, get_constraint_powerset
+from utils.crossword_gen.tests.conftest import by_len
+
+__author__ = 'acushner'
+
+
+@pytest.fixture(scope='module')
+def word_spec():
+    return dict(alphabet='abcdeilnorst', lens=range(2, 8), num_per_len=500)
+
+
+def test_to_from_bitset():
+    idxs = [0, 3, 7, 8, 63, 64, 100]
+    mask = [i in idxs for i in range(101)]
+    assert to_bitset(mask) == sum(1 << i for i in idxs)
+    assert from_bitset(to_bitset(mask), 101).tolist() == idxs
+
+
+def test_matches_powerset(words):
+    """same results as the powerset index for every constraint any word can produce"""
+    powerset = defaultdict(set)
+    for w in words:
+        for ci in get_constraint_powerset(w):
+            powerset[len(w), ci].add(w)
+
+    index = BitsetIndex(by_len(words))
+    for (word_len, ci), expected in powerset.items():
+        assert index.matches(word_len, ci) == expected
+
+    assert index.matches(5, ConstraintInfo((0, 1), 'zz')) == set()
+    assert index.matches(12) == set()
+
+
+def test_constraint_manager(word_file, words):
+    cm = ConstraintManager(word_file, index='bitset')
+    assert ConstraintManager(word_file, index='bitset').__dict__ is cm.__dict__
+    assert cm != ConstraintManager(word_file)
+
+    coords = [(0, c) for c in range(5)]
+    board = {(0, 1): 'a', (0, 4): 'e'}
+    seen = {w for w in words if w.startswith('b')}
+    expected = {w for w in words if len(w) == 5 and w[1] == 'a' and w[4] == 'e'} - seen
+    assert set(cm.matches(coords, board, seen)) == expected
+    assert cm.matches(coords, {}, frozenset(), do_shuffle=False) == {w for w in words if len(w) == 5}
+
+    with pytest.raises(ValueError):
+        ConstraintManager(word_file, index='nope')
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from utils.crossword_gen.bitset_index import BitsetIndex
+from utils.crossword_gen.core import WordInfo
+from utils.crossword_gen.csp import CSPSolver
+from utils.crossword_gen.generate_constraints import ConstraintManager
+from utils.crossword_gen.generate_crosswords import _create_waffle_grid, _to_word_info
+from utils.crossword_gen.tests.conftest import by_len
+
+__author__ = 'acushner'
+
+
+def _waffle(size) -> WordInfo:
+    return _to_word_info(_create_waffle_grid(size))
+
+
+@pytest.fixture(scope='module')
+def word_spec():
+    return dict(seed=1)
+
+
+def _check(bi, word_info, words):
+    used = [w for by_num in bi.clues.values() for w in by_num.values()]
+    assert len(used) == len(word_info)
+    assert len(set(used)) == len(used)
+    assert set(used) <= set(words)
+    for ws, coords in word_info.items():
+        assert ''.join(bi.board[c] for c in coords) == bi.clues[ws.dir.value][ws.clue_num]
+
+
+@pytest.mark.parametrize('size', [3, 5])
+@pytest.mark.parametrize('propagate', [True, False])
+def test_solve(words, size, propagate):
+    wi = _waffle(size)
+    solver = CSPSolver(BitsetIndex(by_len(words)), wi, propagate=propagate, rng=random.Random(size))
+    _check(solver.solve(), wi, words)
+    assert len(solver.assigned) == len(wi)
+
+
+def test_unsolvable():
+    # four slots but only three words, then no words of the right length
+    wi = _waffle(3)
+    assert CSPSolver(BitsetIndex(by_len({'abc', 'bcd', 'cde'})), wi).solve() is None
+    assert CSPSolver(BitsetIndex(by_len({'abcd'})), wi).solve() is None
+
+
+def test_from_constraint_manager(word_file, words):
+    cm = ConstraintManager(word_file)
+    wi = _waffle(5)
+    _check(CSPSolver.from_constraint_manager(cm, wi).solve(), wi, words)
+
+
+def test_mmap_index(tmp_path, word_file, words):
+    """csp on an mmap manager reads the stores instead of building a `BitsetIndex`"""
+    cm = ConstraintManager(word_file, index='mmap', store_dir=tmp_path / 'store')
+    wi = _waffle(5)
+    _check(CSPSolver.from_constraint_manager(cm, wi).solve(), wi, words)
+    assert '_bitset_index' not in cm.__dict__
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from itertools import islice
+
+import pytest
+
+from utils.crossword_gen.generate_constraints import ConstraintManager, get_constraint_powerset, lazy_shuffle
+
+__author__ = 'acushner'
+
+
+@pytest.fixture(scope='module')
+def word_spec():
+    return dict(seed=2, alphabet='abcdeilnorst', lens=(4, 5), num_per_len=1500)
+
+
+@pytest.fixture(params=['powerset', 'bitset', 'mmap'])
+def cm(request, tmp_path, word_file, words):
+    res = ConstraintManager(word_file, index=request.param, store_dir=tmp_path / 'store')
+    if request.param == 'powerset':
+        pickles = defaultdict(lambda: defaultdict(set))
+        for w in words:
+            for ci in get_constraint_powerset(w):
+                pickles[len(w)][ci].add(w)
+        res._get_pickle = pickles.__getitem__
+    return res
+
+
+def test_lazy_shuffle():
+    items = list(range(100))
+    assert sorted(lazy_shuffle(items.copy())) == items
+    assert len(set(islice(lazy_shuffle(items.copy()), 10))) == 10
+    assert list(lazy_shuffle([])) == []
+
+
+def test_count_has_iter(cm, words):
+    coords = [(0, c) for c in range(5)]
+    seen = frozenset(words[::3])
+    for board in [{}, {(0, 0): 'a'}, {(0, 1): 'e', (0, 4): 's'}, {(0, 0): 'z'}]:
+        expected = set(cm.matches(coords, board, seen))
+        assert cm.count_matches(coords, board, seen) == len(expected)
+        assert cm.has_match(coords, board, seen) == bool(expected)
+        assert cm.count_matches(coords, board, frozenset()) == len(cm.matches(coords, board, frozenset()))
+
+        it = cm.iter_matches(coords, board, seen)
+        board[0, 2] = 'q'  # candidates were already looked up
+        res = list(it)
+        assert len(res) == len(expected) and set(res) == expected
+
+
+def test_has_match_all_seen(cm):
+    coords = [(0, c) for c in range(5)]
+    board = {(0, 0): 'a', (0, 1): 'b'}
+    matches = frozenset(cm.matches(coords, board, frozenset()))
+    assert matches and cm.has_match(coords, board, frozenset(list(matches)[1:]))
+    assert not cm.has_match(coords, board, matches)
+    assert list(cm.iter_matches(coords, board, matches)) == []
@@ -0,0 +1,101 @@
+import random
+import threading
+from multiprocessing import get_context
+
+import pytest
+
+from utils.crossword_gen.core import GridUnsolvable, SearchCancelled
+from utils.crossword_gen.generate_constraints import ConstraintManager
+from utils.crossword_gen.generate_crosswords import (Portfolio, _create_waffle_grid, _poll, _to_word_info,
+                                                     generate_crossword, run_parallel)
+
+__author__ = 'acushner'
+
+
+@pytest.fixture(scope='module')
+def word_spec():
+    return dict(seed=3)
+
+
+def _check(bi, g):
+    wi = _to_word_info(g)
+    used = [w for by_num in bi.clues.values() for w in by_num.values()]
+    assert len(used) == len(set(used)) == len(wi)
+    assert len(bi.board) == sum(map(sum, g))
+
+
+def test_to_word_info():
+    wi = _to_word_info(_create_waffle_grid(5))
+    assert len(wi) == 6
+    assert all(len(coords) == 5 for coords in wi.values())
+
+
+@pytest.mark.parametrize('engine', ['backtrack', 'csp'])
+def test_generate_crossword(word_file, engine):
+    cm = ConstraintManager(word_file, index='bitset')
+    g = _create_waffle_grid(5)
+    _check(generate_crossword(cm, _to_word_info(g), engine=engine), g)
+
+    with pytest.raises(SearchCancelled):
+        generate_crossword(cm, _to_word_info(g), engine=engine, cancelled=lambda: True)
+    with pytest.raises(ValueError):
+        generate_crossword(cm, _to_word_info(g), engine='nope')
+
+
+@pytest.mark.parametrize('engine', ['backtrack', 'csp'])
+def test_unsolvable(tmp_path, engine):
+    fn = tmp_path / 'words.txt'
+    fn.write_text('abc\nbcd\ncde\n')
+    cm = ConstraintManager(str(fn), index='bitset')
+    g = _create_waffle_grid(3)
+    with pytest.raises(GridUnsolvable):
+        generate_crossword(cm, _to_word_info(g), engine=engine)
+    with Portfolio(cm, num_workers=2, engine=engine) as portfolio, pytest.raises(GridUnsolvable):
+        list(portfolio.generate(g, 1, num_racers=2))
+
+
+def test_poll():
+    event = threading.Event()
+    cancelled = _poll(event, every_secs=0)
+    assert not cancelled()
+    event.set()
+    assert cancelled()
+    throttled = _poll(event, every_secs=60)
+    assert throttled() and not throttled()
+
+
+def test_portfolio(word_file):
+    cm = ConstraintManager(word_file, index='bitset')
+    g = _create_waffle_grid(5)
+    with Portfolio(cm, num_workers=2) as portfolio:
+        bis = list(portfolio.generate(g, 2, num_racers=3))
+        assert len(bis) == 2
+        for bi in bis:
+            _check(bi, g)
+
+
+def test_run_parallel(word_file):
+    cm = ConstraintManager(word_file, index='bitset')
+    g = _create_waffle_grid(3)
+    bis = list(run_parallel(g, cm, 3, engine='csp', num_workers=2))
+    assert len(bis) == 3
+    for bi in bis:
+        _check(bi, g)
+
+
+def test_portfolio_spawn(tmp_path):
+    """workers get the caller's manager, not a fresh one read from the same file"""
+    fn = tmp_path / 'words.txt'
+    rng = random.Random(5)
+    num_words = 300
+    # words past `num_words` share no letters with the ones before it
+    words = [''.join(rng.choices('aeilnorst' if i < num_words else 'bcdfghkmp', k=3)) for i in range(3000)]
+    fn.write_text('\n'.join(words) + '\n')
+    cm = ConstraintManager(str(fn), num_words=num_words, index='bitset')
+    g = _create_waffle_grid(3)
+    with Portfolio(cm, num_workers=2, mp_context=get_context('spawn')) as portfolio:
+        bis = list(portfolio.generate(g, 3, num_racers=2))
+    allowed = set(words[:num_words])
+    for bi in bis:
+        _check(bi, g)
+        assert {w for by_num in bi.clues.values() for w in by_num.values()} <= allowed
@@ -0,0 +1,53 @@
+import numpy as np
+from PIL import Image
+
+from utils.crossword_gen.gif_recorder import GifRecorder, TileAtlas
+
+__author__ = 'acushner'
+
+grid = [
+    [1, 1, 1],
+    [1, 0, 1],
+    [1, 1, 1],
+]
+
+
+def test_tile_atlas():
+    atlas = TileAtlas(16)
+    a = atlas.letter('a')
+    assert a.shape == (16, 16)
+    assert atlas.letter('a') is a
+    assert (a != atlas.open).any()
+    assert (a != atlas.letter('b')).any()
+    assert atlas.letter(None) is atlas.open
+
+
+def test_record_dedupes():
+    gr = GifRecorder(grid, color='red', duration=100)
+    gr.record({})
+    gr.record({(0, 0): 'a'})
+    gr.record({(0, 0): 'a'})
+    gr.record({(0, 0): 'a', (1, 1): 'z'})  # not an open cell
+    gr.record({(0, 0): 'a', (0, 1): 'b'})
+    gr.record({})
+    assert len(gr) == 4
+    assert gr._durations == [100, 300, 100, 100]
+
+
+def test_frames_and_gif(tmp_path):
+    gr = GifRecorder(grid, record_every=2, cell_px=16, color='blue')
+    boards = [{(0, 0): 'a'}, {(0, 0): 'a', (0, 1): 'b'}, {(0, 0): 'c'}, {}]
+    for b in boards:
+        gr.record(b)
+    frames = [np.asarray(im) for im in gr.frames()]
+    assert len(frames) == 2
+    first, second = frames
+    assert first.shape == (48, 48)
+    assert (first[:16, :16] == gr._atlas.letter('a')).all()
+    assert (second[:16, :16] == gr._atlas.letter('c')).all()
+    assert (second[16:32, 16:32] == gr._atlas.blocked).all()
+
+    fn = gr.to_gif(str(tmp_path / 'out.gif'))
+    with Image.open(fn) as im:
+        assert im.size == (48, 48)
+        assert im.n_frames == 2
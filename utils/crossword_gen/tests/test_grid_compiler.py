@@ -0,0 +1,52 @@
+import pickle
+
+from utils.crossword_gen.core import Dir
+from utils.crossword_gen.grid_compiler import CompiledGrid, compile_grid, grid_key
+
+__author__ = 'acushner'
+
+waffle = [
+    [1, 1, 1],
+    [1, 0, 1],
+    [1, 1, 1],
+]
+
+
+def test_compile_grid():
+    cg = compile_grid(waffle)
+    assert len(cg) == 4
+    assert cg.lengths == (3, 3, 3, 3)
+    assert cg.grid == grid_key(waffle)
+
+    top = next(i for i, ws in enumerate(cg.slots) if ws.rc == (0, 0) and ws.dir is Dir.right)
+    assert cg.coords[top] == ((0, 0), (0, 1), (0, 2))
+    assert sorted((pos, other_pos) for pos, _, other_pos in cg.crossings[top]) == [(0, 0), (2, 0)]
+    for i, crossings in enumerate(cg.crossings):
+        for pos, j, other_pos in crossings:
+            assert cg.coords[i][pos] == cg.coords[j][other_pos]
+            assert (other_pos, i, pos) in cg.crossings[j]
+
+
+def test_cached_and_picklable():
+    cg = compile_grid(waffle)
+    assert compile_grid([list(row) for row in waffle]) is cg
+    assert compile_grid([[True, True, True], [True, False, True], [True, True, True]]) is cg
+    assert pickle.loads(pickle.dumps(cg)) == cg
+
+    wi = cg.word_info
+    assert list(wi) == list(cg.slots)
+    assert CompiledGrid.from_word_info(wi, cg.grid) == cg
+
+
+def test_order_by_word_len_freq():
+    g = [
+        [1, 1, 1, 1],
+        [1, 0, 0, 0],
+        [1, 0, 0, 0],
+    ]
+    cg = compile_grid(g)
+    assert sorted(cg.lengths) == [3, 4]
+    order = cg.order_by_word_len_freq({3: ['abc'] * 10, 4: ['abcd']})
+    assert [cg.lengths[i] for i in order] == [4, 3]
+    order = cg.order_by_word_len_freq({3: ['abc'], 4: ['abcd'] * 10})
+    assert [cg.lengths[i] for i in order] == [3, 4]
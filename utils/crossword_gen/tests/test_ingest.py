@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from utils.crossword_gen.generate_constraints import ConstraintManager, read_words
+from utils.crossword_gen.ingest import collect, ingest, iter_entries, load_scores, normalize
+from utils.crossword_gen.mmap_store import MmapStore
+
+__author__ = 'acushner'
+
+raw = """\
+The
+cat
+Café
+don't
+cat
+dog 0.5
+ox
+bird,2.5
+
+a
+horse
+"""
+
+
+@pytest.fixture
+def word_file(tmp_path):
+    fn = tmp_path / 'raw' / 'words.txt'
+    fn.parent.mkdir()
+    fn.write_text(raw)
+    return fn
+
+
+def test_normalize():
+    assert normalize('  Café\n') == 'cafe'
+    assert normalize("don't") is None
+    assert normalize('') is None
+
+
+def test_collect(word_file):
+    by_len = collect(iter_entries(word_file))
+    assert by_len[3] == dict(the=1.0, cat=1 / 2, dog=0.5)
+    assert by_len[4] == dict(cafe=1 / 3, bird=2.5)
+    assert 1 not in by_len and 'ox' in by_len[2]
+    assert set(collect(iter_entries(word_file, num_words=2))) == {3}
+    assert set(collect(iter_entries(word_file), min_len=4, max_len=4)) == {4}
+
+
+def test_read_words_num_words(word_file):
+    assert sum(map(len, read_words(word_file, num_words=3).values())) == 3
+    assert 0 not in read_words(word_file)
+
+
+def test_ingest(tmp_path, word_file, monkeypatch):
+    out_dir = tmp_path / 'out'
+    res = ingest(word_file, out_dir, num_cores=2)
+    assert res.rebuilt == (2, 3, 4, 5)
+    assert res.words_path.read_text().splitlines()[:2] == ['bird', 'the']
+    shards = json.loads(res.manifest_path.read_text())['shards']
+    assert shards['3']['num_words'] == 3
+
+    stem = out_dir / shards['4']['stem']
+    assert MmapStore.load(stem).words.tolist() == ['bird', 'cafe']
+    assert load_scores(stem).tolist() == pytest.approx([2.5, 1 / 3])
+
+    assert ingest(word_file, out_dir).rebuilt == ()
+
+    # the manager finds the ingested stores instead of building its own
+    monkeypatch.setattr(MmapStore, 'build', None)
+    cm = ConstraintManager(str(res.words_path), index='mmap', store_dir=out_dir)
+    assert set(cm.matches([(0, 0), (0, 1), (0, 2)], {(0, 1): 'o'}, frozenset())) == {'dog'}
+    monkeypatch.undo()
+
+    word_file.write_text(raw + 'hen\n')
+    res = ingest(word_file, out_dir)
+    assert res.rebuilt == (3,)
+    assert not list(out_dir.glob(f"{shards['3']['stem']}.*"))
+    assert list(out_dir.glob(f"{shards['4']['stem']}.*"))
+
+
+def test_ingest_keeps_source(word_file):
+    with pytest.raises(ValueError):
+        ingest(word_file, word_file.parent)
+    assert word_file.read_text() == raw
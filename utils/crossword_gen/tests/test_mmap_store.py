@@ -0,0 +1,65 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from utils.crossword_gen.bitset_index import BitsetIndex
+from utils.crossword_gen.generate_constraints import ConstraintInfo, ConstraintManager, get_constraint_powerset
+from utils.crossword_gen.mmap_store import MmapStore, StoreBitsetIndex
+from utils.crossword_gen.tests.conftest import write_words
+
+__author__ = 'acushner'
+
+
+@pytest.fixture(scope='module')
+def word_spec():
+    return dict(seed=1, alphabet='abcdeéilnorst', lens=(6,))
+
+
+def test_matches_bitset_index(tmp_path, words):
+    MmapStore.build(words).save(tmp_path / 'sixes')
+    store = MmapStore.load(tmp_path / 'sixes')
+    assert isinstance(store.bits, np.memmap)
+
+    index = BitsetIndex({6: words})
+    exclude = set(words[::7]) | {'nope', 'zzzzzz'}
+    for w in words[:40]:
+        for ci in get_constraint_powerset(w):
+            assert store.matches(ci) == index.matches(6, ci)
+            assert store.matches(ci, exclude) == index.matches(6, ci, exclude)
+
+    assert store.matches(ConstraintInfo((0,), 'z')) == set()
+    assert store.matches() == set(words)
+    assert MmapStore.load(tmp_path / 'missing') is None
+
+
+def test_store_bitset_index(tmp_path, words):
+    MmapStore.build(words).save(tmp_path / 'sixes')
+    lazy = StoreBitsetIndex(lambda word_len: MmapStore.load(tmp_path / 'sixes'))
+    index = BitsetIndex({6: words})
+    assert lazy.bitset(6) == index.bitset(6)
+    for w in words[:20]:
+        for ci in get_constraint_powerset(w)[:10]:
+            assert lazy.bitset(6, ci) == index.bitset(6, ci)
+    for pos in range(6):
+        bits = index.bitset(6, ConstraintInfo((0,), words[0][0]))
+        assert lazy.letters(6, pos, bits) == index.letters(6, pos, bits)
+        assert lazy.supported(6, pos, 'abé') == index.supported(6, pos, 'abé')
+    assert lazy.letter_bitset(6, 0, 'z') == lazy.letter_bitset(6, 9, 'a') == 0
+    assert lazy.words[6][3] == index.words[6][3]
+
+
+def test_constraint_manager(tmp_path, words):
+    fn = write_words(tmp_path / 'words.txt', words + ['abc', 'bcd'])
+    cm = ConstraintManager(fn, index='mmap', store_dir=tmp_path / 'store')
+
+    coords = [(0, c) for c in range(6)]
+    board = {(0, 0): 'a', (0, 5): 's'}
+    expected = {w for w in words if w[0] == 'a' and w[5] == 's'}
+    assert set(cm.matches(coords, board, frozenset())) == expected
+    assert cm.matches([(0, 0), (0, 1), (0, 2)], {(0, 1): 'b'}, {'abc'}, do_shuffle=False) == set()
+
+    clone = pickle.loads(pickle.dumps(cm))
+    assert clone._stores == {}
+    assert set(clone.matches(coords, board, frozenset())) == expected
+    assert len(list((tmp_path / 'store').iterdir())) == 6
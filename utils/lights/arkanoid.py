@@ -5,12 +5,14 @@ from operator import attrgetter
 import random
 import time
 from dataclasses import dataclass
-from typing import FrozenSet, Set, Dict, Union, Tuple
+from typing import FrozenSet, Set, Dict, Union, Tuple, Optional
 
 from lifxlan3 import Color, Colors
 from lifxlan3.routines.tile.core import set_cm
 from lifxlan3.routines.tile.tile_utils import ColorMatrix, RC, default_color
 
+from utils.lights.frame_diff import FrameDiffTransport
+
 __author__ = 'acushner'
 
 _colors = Colors.GREEN, Colors.PINK, Colors.BLUE, Colors.ORANGE, Colors.RED
@@ -191,8 +193,12 @@ class Arkanoid:
         self._update_paddle()
         self._handle_collisions()
 
-    def display(self, in_terminal=True):
-        set_cm(self.cm, in_terminal=in_terminal, verbose=False, strip=False)
+    def display(self, in_terminal=True, transport: Optional[FrameDiffTransport] = None):
+        """if `transport` is provided, send frames through it instead of `set_cm`"""
+        if transport:
+            transport.send(self.cm)
+        else:
+            set_cm(self.cm, in_terminal=in_terminal, verbose=False, strip=False)
 
 
 class ArkanoidSmartish(Arkanoid):
@@ -1,8 +1,10 @@
 import random
 from abc import ABC, abstractmethod
-from collections import deque
+from functools import lru_cache
 from itertools import cycle
-from typing import Callable
+from typing import Callable, Dict, Iterable
+
+import numpy as np
 
 from lifxlan3 import Color, Themes, Theme, Colors
 from lifxlan3.routines.tile.tile_utils import RC, default_color
@@ -11,6 +13,11 @@ __author__ = 'acushner'
 
 ColorFunc = Callable[[RC, bool, int], Color]
 
+# vectorized version of `ColorFunc`: takes an (H, W) bool mask of which cells are alive,
+# (H, W) row and col coordinate grids (see `np.indices`), and the iteration.
+# returns an (H, W) object array of colors
+FrameFunc = Callable[[np.ndarray, np.ndarray, np.ndarray, int], np.ndarray]
+
 
 # default_color = Colors.SNES_DARK_GREY
 
@@ -19,13 +26,53 @@ def _choose_from(c_or_t):
     return random.choice(list(c_or_t))[1]
 
 
+def _palette(colors: Iterable[Color]) -> np.ndarray:
+    """object array of `colors` with `default_color` appended
+
+    index it with `np.where(alive, idxs, -1)` to get a frame"""
+    colors = list(colors)
+    res = np.empty(len(colors) + 1, dtype=object)
+    for i, c in enumerate(colors + [default_color]):
+        res[i] = c
+    return res
+
+
+@lru_cache(1)
+def _rainbow_2() -> np.ndarray:
+    return _palette(Themes.rainbow_2)
+
+
 def default_color_func(rc: RC, alive: bool, iteration: int) -> Color:
-    t = list(Themes.rainbow_2)
     if alive:
-        return t[sum(map(abs, rc)) % len(t)]
+        t = _rainbow_2()
+        return t[sum(map(abs, rc)) % (len(t) - 1)]
     return default_color
 
 
+def _default_frame(alive: np.ndarray, rows: np.ndarray, cols: np.ndarray, iteration: int) -> np.ndarray:
+    t = _rainbow_2()
+    return t[np.where(alive, (np.abs(rows) + np.abs(cols)) % (len(t) - 1), -1)]
+
+
+default_color_func.frame = _default_frame
+
+
+def _frame_from_cells(color_func: ColorFunc, alive: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+                      iteration: int) -> np.ndarray:
+    """call `color_func` once per cell, in row-major order"""
+    res = np.empty(alive.shape, dtype=object)
+    for idx in np.ndindex(alive.shape):
+        res[idx] = color_func(RC(int(rows[idx]), int(cols[idx])), bool(alive[idx]), iteration)
+    return res
+
+
+def to_frame_func(color_func: ColorFunc) -> FrameFunc:
+    """return `color_func`'s vectorized `frame` if it has one, otherwise fall back to calling it per cell"""
+    if (res := getattr(color_func, 'frame', None)) is not None:
+        return res
+    return lambda alive, rows, cols, iteration: _frame_from_cells(color_func, alive, rows, cols, iteration)
+
+
 class BaseColorFunc(ABC):
     _registered = set()
 
@@ -36,6 +83,12 @@ class BaseColorFunc(ABC):
     def __call__(self, rc: RC, alive: bool, iteration: int) -> Color:
         """return color based on position, whether it's alive, and iteration"""
 
+    def frame(self, alive: np.ndarray, rows: np.ndarray, cols: np.ndarray, iteration: int) -> np.ndarray:
+        """return colors for a whole board at once. see `FrameFunc`
+
+        subclasses should override this with something faster than calling `self` per cell"""
+        return _frame_from_cells(self, alive, rows, cols, iteration)
+
     @classmethod
     @abstractmethod
     def from_random(cls):
@@ -47,19 +100,40 @@ class DefaultColorFunc(BaseColorFunc):
     """wend way through theme of colors"""
 
     def __init__(self, theme: Theme = Themes.rainbow):
-        self._colors = deque(256 * list(theme))
-        self._color_iter = iter(self._colors)
+        self._palette = _palette(theme)
+        self._num_colors = len(self._palette) - 1
+        self._offset = 0  # where in the theme the current iteration starts
+        self._num_used = 0  # colors handed out so far this iteration
         self._cur_iteration = None
+        self._rotated: Dict[int, np.ndarray] = {}
 
-    def __call__(self, rc: RC, alive: bool, iteration: int):
+    def _set_iteration(self, iteration: int):
         if self._cur_iteration != iteration:
             self._cur_iteration = iteration
-            self._colors.rotate(-2)
-            self._color_iter = iter(self._colors)
+            self._offset = (self._offset + 2) % self._num_colors
+            self._num_used = 0
+
+    def __call__(self, rc: RC, alive: bool, iteration: int):
+        self._set_iteration(iteration)
         if alive:
-            return next(self._color_iter)
+            self._num_used += 1
+            return self._palette[(self._offset + self._num_used - 1) % self._num_colors]
         return default_color
 
+    def _rotated_palette(self) -> np.ndarray:
+        """palette starting at the current offset, cached per offset"""
+        if (res := self._rotated.get(self._offset)) is None:
+            res = self._rotated[self._offset] = np.append(np.roll(self._palette[:-1], -self._offset),
+                                                          self._palette[-1:])
+        return res
+
+    def frame(self, alive: np.ndarray, rows: np.ndarray, cols: np.ndarray, iteration: int) -> np.ndarray:
+        self._set_iteration(iteration)
+        # each living cell gets the next color, in row-major order
+        idxs = (self._num_used + np.cumsum(alive, axis=None).reshape(alive.shape) - 1) % self._num_colors
+        self._num_used += int(np.count_nonzero(alive))
+        return self._rotated_palette()[np.where(alive, idxs, -1)]
+
     @classmethod
     def from_random(cls):
         return cls(_choose_from(Themes))
@@ -71,16 +145,25 @@ class PhaseColorFunc(BaseColorFunc):
     def __init__(self, color: Color, step_degrees: int):
         self._colors = cycle(color.get_complements(step_degrees))
         self._cur_color = next(self._colors)
+        self._cur_palette = _palette([self._cur_color])
         self._cur_iteration = 0
 
-    def __call__(self, rc: RC, alive: bool, iteration: int):
+    def _set_iteration(self, iteration: int):
         if self._cur_iteration != iteration:
             self._cur_iteration = iteration
             self._cur_color = next(self._colors)
+            self._cur_palette = _palette([self._cur_color])
+
+    def __call__(self, rc: RC, alive: bool, iteration: int):
+        self._set_iteration(iteration)
         if alive:
             return self._cur_color
         return default_color
 
+    def frame(self, alive: np.ndarray, rows: np.ndarray, cols: np.ndarray, iteration: int) -> np.ndarray:
+        self._set_iteration(iteration)
+        return self._cur_palette[np.where(alive, 0, -1)]
+
     @classmethod
     def from_random(cls):
         return cls(_choose_from(Colors), random.randrange(13, 44))
@@ -92,17 +175,24 @@ class DistColorFunc(BaseColorFunc):
     def __init__(self, theme: Theme, dist_func: Callable[[RC, int], int]) -> None:
         self._dist_func = dist_func
         self._colors = list(_choose_from(theme))
+        self._palette = _palette(self._colors)
 
     def __call__(self, rc: RC, alive: bool, iteration: int) -> Color:
         if alive:
             return self._colors[(self._dist_func(rc, iteration)) % len(self._colors)]
         return default_color
 
+    def frame(self, alive: np.ndarray, rows: np.ndarray, cols: np.ndarray, iteration: int) -> np.ndarray:
+        """NOTE: `dist_func` gets called once with arrays of rows/cols, so it must work elementwise"""
+        dists = self._dist_func(RC(rows, cols), iteration) % len(self._colors)
+        return self._palette[np.where(alive, dists, -1)]
+
     @classmethod
     def from_random(cls):
         return cls(_choose_from(Themes), random.choice(list(_dist_func_reg)))
 
 
+# dist funcs must also work when `rc` holds arrays of rows/cols. see `DistColorFunc.frame`
 _dist_func_reg = set()
 
 
@@ -118,16 +208,9 @@ def manhattan(rc: RC, iteration: int):
 
 @reg_dist_func
 def quadrant(rc: RC, iteration: int):
-    res = 0
-    if rc < RC(8, 8):
-        res = 0
-    elif rc < RC(16, 8):
-        res = 1
-    elif rc < RC(8, 16):
-        res = 2
-    elif rc < RC(16, 16):
-        res = 3
-    return res + iteration
+    """0-3 for the 8x8 quadrants of a 16x16 board, 0 outside of it"""
+    in_board = (rc.r < 16) & (rc.c < 16)
+    return ((rc.r >= 8) + 2 * (rc.c >= 8)) * in_board + iteration
 
 
 # TODO: make inverted versions
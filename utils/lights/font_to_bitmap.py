@@ -27,21 +27,26 @@ from __future__ import annotations
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
+import ctypes
 import string
+import time
 from enum import Enum
 from functools import lru_cache
 from pathlib import Path
-from typing import List, NamedTuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import freetype
+import numpy as np
 from PIL import Image
 from lifxlan3 import Color, Colors, timer
 from lifxlan3.routines.tile.core import set_cm
 from lifxlan3.routines.tile.tile_utils import ColorMatrix, RC
-from more_itertools import collapse
 from utils.assets_path import ASSETS_PATH
 
 from utils.core import chunk
+from utils.lights.glyph_atlas import GlyphAtlas, atlas_chars, default_atlas_dir, load_or_build
+
+layout_cache_size = 256
 
 ON = '\u2588'
 ON = '#'
@@ -53,6 +58,9 @@ class Bitmap:
     A 2D bitmap image represented as a list of byte values. Each byte indicates the state
     of a single pixel in the bitmap. A value of 0 indicates that the pixel is `off`
     and any other value indicates that it is `on`.
+
+    `array` is a (height, width) numpy view onto the same bytes, so bitmaps can be
+    manipulated a row/slice at a time instead of pixel by pixel.
     """
 
     def __init__(self, width, height, pixels=None):
@@ -60,49 +68,91 @@ class Bitmap:
         self.height = height
         self.pixels = pixels or bytearray(width * height)
 
+    @classmethod
+    def from_array(cls, arr: np.ndarray) -> Bitmap:
+        height, width = arr.shape
+        return cls(width, height, bytearray(np.ascontiguousarray(arr, dtype=np.uint8).tobytes()))
+
+    @property
+    def array(self) -> np.ndarray:
+        """(height, width) uint8 view onto `pixels`. writing to it writes to the bitmap"""
+        return np.frombuffer(self.pixels, dtype=np.uint8).reshape(self.height, self.width)
+
     @property
     def bits(self) -> List[List[int]]:
         return list(chunk(self.pixels, self.width))
 
     def __repr__(self):
         """Return a string representation of the bitmap's pixels."""
-        rows = ''
-        for y in range(self.height):
-            for x in range(self.width):
-                rows += ON if self.pixels[y * self.width + x] else OFF
-            rows += '\n'
-        return rows
+        return ''.join(''.join(ON if px else OFF for px in row) + '\n' for row in self.array)
 
     def add_border(self, height_pct=10.) -> 'Bitmap':
-        n_pixels = int(self.height * height_pct // 100) + 1
-        bits = self.bits
-        width = self.width + 2 * n_pixels
-        height = self.height + 2 * n_pixels
-        lr_zeros = n_pixels * [0]
-        for r in bits:
-            r[:0] = lr_zeros
-            r.extend(lr_zeros)
-        extra_zero_rows = n_pixels * [width * [0]]
-        bits[:0] = extra_zero_rows
-        bits.extend(extra_zero_rows)
-        return Bitmap(width, height, bytearray(collapse(bits)))
-
-    def bitblt(self, src, x, y):
-        """Copy all pixels from `src` into this bitmap"""
-        srcpixel = 0
-        dstpixel = y * self.width + x
-        row_offset = self.width - src.width
-
-        for sy in range(src.height):
-            for sx in range(src.width):
-                # Perform an OR operation on the destination pixel and the source pixel
-                # because glyph bitmaps may overlap if character kerning is applied, e.g.
-                # in the string "AVA", the "A" and "V" glyphs must be rendered with
-                # overlapping bounding boxes.
-                self.pixels[dstpixel] = self.pixels[dstpixel] or src.pixels[srcpixel]
-                srcpixel += 1
-                dstpixel += 1
-            dstpixel += row_offset
+        n_pixels = border_size(self.height, height_pct)
+        return Bitmap.from_array(np.pad(self.array, n_pixels))
+
+    def bitblt(self, src: Bitmap, x, y):
+        """
+        OR all pixels from `src` into this bitmap with src's upper-left corner at (x, y).
+        anything that falls outside of this bitmap is clipped.
+
+        OR rather than copy because glyph bitmaps may overlap if character kerning is
+        applied, e.g. in the string "AVA", the "A" and "V" glyphs must be rendered with
+        overlapping bounding boxes.
+        """
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + src.width, self.width), min(y + src.height, self.height)
+        if x0 < x1 and y0 < y1:
+            self.array[y0:y1, x0:x1] |= src.array[y0 - y:y1 - y, x0 - x:x1 - x]
+
+
+def border_size(height, height_pct=10.) -> int:
+    """number of pixels `Bitmap.add_border` adds to each side"""
+    return int(height * height_pct // 100) + 1
+
+
+def area_weights(src_len: int, dst_len: int) -> np.ndarray:
+    """
+    (dst_len, src_len) matrix for downsampling by averaging: each output pixel
+    is the mean of the `src_len / dst_len` input pixels it covers, weighted by overlap
+    """
+    scale = src_len / dst_len
+    return overlap_weights(np.arange(dst_len)[:, None] * scale, scale, np.arange(src_len)[None, :])
+
+
+def overlap_weights(start, scale, idxs: np.ndarray) -> np.ndarray:
+    """how much of [start, start + scale) each pixel [idx, idx + 1) covers, divided by `scale`"""
+    return np.clip(np.minimum(idxs + 1, start + scale) - np.maximum(idxs, start), 0, None) / scale
+
+
+def _area_resample_rows(arr: np.ndarray, dst_len: int) -> np.ndarray:
+    """same as `area_weights(len(arr), dst_len) @ arr`, but in linear time
+
+    each output row is the difference of the (linearly interpolated) running sum at its edges"""
+    src_len = len(arr)
+    edges = np.arange(dst_len + 1) * (src_len / dst_len)
+    idxs = np.minimum(edges.astype(int), src_len - 1)
+    cum = np.cumsum(arr, axis=0, dtype=float) - arr
+    at_edges = cum[idxs] + (edges - idxs)[:, None] * arr[idxs]
+    return np.diff(at_edges, axis=0) * (dst_len / src_len)
+
+
+def area_resample(arr: np.ndarray, shape) -> np.ndarray:
+    """downsample a 2d array to `shape` (rows, cols) by area averaging. returns floats"""
+    num_rows, num_cols = shape
+    return _area_resample_rows(_area_resample_rows(arr, num_rows).T, num_cols).T
+
+
+@lru_cache()
+def color_levels(color: Color) -> List[Color]:
+    """
+    256 colors from off to `color`, indexed by coverage (0-255).
+
+    built by converting a tiny gradient image, so antialiased text gets exactly the
+    colors that `ColorMatrix.from_image` would give it
+    """
+    rgb = np.array(color.rgb[:3], dtype=float)
+    gradient = np.rint(np.arange(256)[:, None] / 255 * rgb).astype(np.uint8)
+    return list(ColorMatrix.from_image(Image.frombytes('RGB', (256, 1), gradient.tobytes()))[0])
 
 
 class Glyph:
@@ -143,65 +193,130 @@ class Glyph:
 
         return Glyph(pixels, width, height, top, advance_width)
 
+    @staticmethod
+    def _packed_rows(bitmap) -> np.ndarray:
+        """(rows, pitch) array of the packed bytes in a freetype bitmap"""
+        num_bytes = bitmap.rows * bitmap.pitch
+        if (ft_bitmap := getattr(bitmap, '_FT_Bitmap', None)) is not None:
+            # read the buffer in one go. `bitmap.buffer` builds a list one byte at a time
+            packed = np.frombuffer(ctypes.string_at(ft_bitmap.buffer, num_bytes), dtype=np.uint8)
+        else:
+            packed = np.array(bitmap.buffer[:num_bytes], dtype=np.uint8)
+        return packed.reshape(bitmap.rows, bitmap.pitch)
+
     @staticmethod
     def unpack_mono_bitmap(bitmap):
         """
         Unpack a freetype FT_LOAD_TARGET_MONO glyph bitmap into a bytearray where each
         pixel is represented by a single byte.
+
+        each row is `pitch` bytes holding 8 pixels apiece, most significant bit first.
+        rows are padded out to a byte boundary, so only the first `width` bits are kept.
         """
-        # Allocate a bytearray of sufficient size to hold the glyph bitmap.
-        data = bytearray(bitmap.rows * bitmap.width)
+        if not bitmap.rows * bitmap.width:
+            return bytearray(bitmap.rows * bitmap.width)
+        bits = np.unpackbits(Glyph._packed_rows(bitmap), axis=1, count=bitmap.width)
+        return bytearray(bits.tobytes())
 
-        # Iterate over every byte in the glyph bitmap. Note that we're not
-        # iterating over every pixel in the resulting unpacked bitmap --
-        # we're iterating over the packed bytes in the input bitmap.
-        for y in range(bitmap.rows):
-            for byte_index in range(bitmap.pitch):
 
-                # Read the byte that contains the packed pixel data.
-                byte_value = bitmap.buffer[y * bitmap.pitch + byte_index]
+class TextDims(NamedTuple):
+    width: int
+    height: int
+    baseline: int
 
-                # We've processed this many bits (=pixels) so far. This determines
-                # where we'll read the next batch of pixels from.
-                num_bits_done = byte_index * 8
 
-                # Pre-compute where to write the pixels that we're going
-                # to unpack from the current byte in the glyph bitmap.
-                rowstart = y * bitmap.width + byte_index * 8
+class TextLayout(NamedTuple):
+    """where each glyph of `text` goes. compute once with `Font.layout`, render as often as needed"""
+    text: str
+    width: int
+    height: int
+    baseline: int
+    glyphs: Tuple[Tuple[Glyph, int], ...]  # (glyph, x)
 
-                # Iterate over every bit (=pixel) that's still a part of the
-                # output bitmap. Sometimes we're only unpacking a fraction of a byte
-                # because glyphs may not always fit on a byte boundary. So we make sure
-                # to stop if we unpack past the current row of pixels.
-                for bit_index in range(min(8, bitmap.width - num_bits_done)):
-                    # Unpack the next pixel from the current glyph byte.
-                    bit = byte_value & (1 << (7 - bit_index))
+    @property
+    def dims(self) -> TextDims:
+        return TextDims(self.width, self.height, self.baseline)
 
-                    # Write the pixel to the output bytearray. We ensure that `off`
-                    # pixels have a value of 0 and `on` pixels have a value of 1.
-                    data[rowstart + bit_index] = 1 if bit else 0
+    def render(self, width=None, height=None, baseline=None) -> Bitmap:
+        """render into a new Bitmap. dimensions default to the layout's own"""
+        if None in (width, height, baseline):
+            width, height, baseline = self.dims
 
-        return data
+        outbuffer = Bitmap(width, height)
+        for glyph, x in self.glyphs:
+            # The vertical drawing position should place the glyph
+            # on the baseline as intended.
+            outbuffer.bitblt(glyph.bitmap, x, height - glyph.ascent - baseline)
+        return outbuffer
 
 
-class TextDims(NamedTuple):
-    width: int
-    height: int
-    baseline: int
+class Font:
+    """
+    printable ascii glyphs come from a `GlyphAtlas` shared on disk, see `glyph_atlas`.
+    the freetype face is only opened to build the atlas or for chars outside of it.
+    set `atlas_dir` to None to always render with freetype
 
+    layouts of recently used strings are memoized, see `layout`
+    """
 
-class Font:
-    def __init__(self, filename, size):
-        self.face = freetype.Face(filename)
-        self.face.set_pixel_sizes(0, size)
+    def __init__(self, filename, size, *, atlas_dir: Optional[Path] = default_atlas_dir):
+        self.filename = str(filename)
+        self.size = size
+        self._atlas_dir = atlas_dir
+        self._face: Optional[freetype.Face] = None
+        self._atlas: Optional[GlyphAtlas] = None
+        self._glyphs: Dict[str, Glyph] = {}
+        self._kerning: Optional[Dict[str, int]] = None
+        self._layouts = lru_cache(layout_cache_size)(self._layout)
 
-    @lru_cache(128)
-    def glyph_for_character(self, char):
+    @property
+    def face(self) -> freetype.Face:
+        if self._face is None:
+            self._face = freetype.Face(self.filename)
+            self._face.set_pixel_sizes(0, self.size)
+        return self._face
+
+    @property
+    def atlas(self) -> Optional[GlyphAtlas]:
+        if self._atlas is None and self._atlas_dir is not None:
+            self._atlas = load_or_build(self.filename, self.size, self._build_atlas, self._atlas_dir)
+        return self._atlas
+
+    @property
+    def kerning_table(self) -> Dict[str, int]:
+        """non-zero kerning offsets in pixels, keyed by 'ab' for the pair a, b
+
+        precomputed for printable ascii (taken from the atlas if there is one).
+        other pairs are added as they're looked up"""
+        if self._kerning is None:
+            if self.atlas is not None:
+                self._kerning = dict(self.atlas.kerning)
+            elif self.face.has_kerning:
+                self._kerning = {a + b: k for a in atlas_chars for b in atlas_chars
+                                 if (k := self._face_kerning_offset(a, b))}
+            else:
+                self._kerning = {}
+        return self._kerning
+
+    def _build_atlas(self) -> GlyphAtlas:
+        return GlyphAtlas.build(self._render_glyph, self._face_kerning_offset, has_kerning=self.face.has_kerning)
+
+    def _render_glyph(self, char) -> Glyph:
         # Let FreeType load the glyph for the given character and tell it to render
         # a monochromatic bitmap representation.
         self.face.load_char(char, freetype.FT_LOAD_RENDER | freetype.FT_LOAD_TARGET_MONO)
         return Glyph.from_glyphslot(self.face.glyph)
 
+    def glyph_for_character(self, char) -> Glyph:
+        if (res := self._glyphs.get(char)) is None:
+            if self.atlas is not None and (pixels_info := self.atlas.glyph(char)) is not None:
+                pixels, (_, width, height, top, advance_width) = pixels_info
+                res = Glyph(pixels, width, height, top, advance_width)
+            else:
+                res = self._render_glyph(char)
+            self._glyphs[char] = res
+        return res
+
     def render_character(self, char):
         glyph = self.glyph_for_character(char)
         return glyph.bitmap
@@ -216,36 +331,59 @@ class Font:
         case the glyph for "V" has a negative horizontal kerning offset as it is
         moved slightly towards the "A".
         """
+        if previous_char is None:
+            return 0
+        pair = previous_char + char
+        if (res := self.kerning_table.get(pair)) is None:
+            res = 0
+            if not (previous_char in atlas_chars and char in atlas_chars):
+                res = self._kerning[pair] = self._face_kerning_offset(previous_char, char)
+        return res
+
+    def _face_kerning_offset(self, previous_char, char):
         kerning = self.face.get_kerning(previous_char, char)
 
         # The kerning offset is given in FreeType's 26.6 fixed point format,
         # which means that the pixel values are multiples of 64.
         return kerning.x // 64
 
-    def text_dimensions(self, text) -> TextDims:
-        """Return (width, height, baseline) of `text` rendered in the current font."""
+    def _layout(self, text) -> TextLayout:
         width = 0
         max_ascent = 0
         max_descent = 0
+        x = 0
         previous_char = None
+        placed = []
 
-        # For each character in the text string we get the glyph
+        # For each character in the text string we get the glyph, place it,
         # and update the overall dimensions of the resulting bitmap.
         for char in text:
             glyph = self.glyph_for_character(char)
             max_ascent = max(max_ascent, glyph.ascent)
             max_descent = max(max_descent, glyph.descent)
+
+            # Take kerning information into account before we place the glyph.
             kerning_x = self.kerning_offset(previous_char, char)
+            x += kerning_x
+            placed.append((glyph, x))
 
             # With kerning, the advance width may be less than the width of the glyph's bitmap.
             # Make sure we compute the total width so that all of the glyph's pixels
             # fit into the returned dimensions.
             width += max(glyph.advance_width + kerning_x, glyph.width + kerning_x)
 
+            x += glyph.advance_width
             previous_char = char
 
-        height = max_ascent + max_descent
-        return TextDims(width, height, max_descent)
+        return TextLayout(text, width, max_ascent + max_descent, max_descent, tuple(placed))
+
+    def layout(self, text) -> TextLayout:
+        """`TextLayout` for `text`, memoized for the last `layout_cache_size` strings"""
+        return self._layouts(text)
+
+    def text_dimensions(self, text) -> TextDims:
+        """Return (width, height, baseline) of `text` rendered in the current font."""
+        return self.layout(text).dims
 
     def render_text(self, text, width=None, height=None, baseline=None) -> Bitmap:
         """
@@ -253,43 +391,31 @@ class Font:
         If `width`, `height`, and `baseline` are not specified they are computed using
         the `text_dimensions' method.
         """
-        if None in (width, height, baseline):
-            width, height, baseline = self.text_dimensions(text)
-
-        x = 0
-        previous_char = None
-        outbuffer = Bitmap(width, height)
-
-        for char in text:
-            glyph = self.glyph_for_character(char)
-
-            # Take kerning information into account before we render the
-            # glyph to the output bitmap.
-            x += self.kerning_offset(previous_char, char)
-
-            # The vertical drawing position should place the glyph
-            # on the baseline as intended.
-            y = height - glyph.ascent - baseline
-
-            outbuffer.bitblt(glyph.bitmap, x, y)
-
-            x += glyph.advance_width
-            previous_char = char
-
-        return outbuffer
+        return self.layout(text).render(width, height, baseline)
 
     @timer
     def to_image(self, text: str, color: Color = Colors.YELLOW) -> Image.Image:
-        bm = self.render_text(text).add_border(10)
-        color = color.rgb[:3]
-        colors = bytearray(collapse(color if px else (0, 0, 0) for px in bm.pixels))
-        return Image.frombytes('RGB', (bm.width, bm.height), bytes(colors))
+        on = self.render_text(text).add_border(10).array.astype(bool)
+        return Image.fromarray(np.where(on[..., None], np.array(color.rgb[:3], dtype=np.uint8), 0).astype(np.uint8))
 
     def to_color_matrix(self, text: str, color: Color = Colors.YELLOW, height=16) -> ColorMatrix:
+        """
+        render `text` scaled down to `height` rows, preserving aspect ratio
+
+        each output pixel's coverage is the area average of the bitmap pixels under it,
+        which then picks its color from `color_levels`
+        """
+        on = self.render_text(text).add_border(10).array.astype(bool)
+        width = int(on.shape[1] * height / on.shape[0])
+        coverage = np.rint(255 * area_resample(on, (height, width))).astype(np.uint8)
+        levels = color_levels(color)
+        return ColorMatrix([[levels[v] for v in row] for row in coverage.tolist()])
+
+    def _to_color_matrix_pil(self, text: str, color: Color = Colors.YELLOW, height=16) -> ColorMatrix:
+        """the old way, through a full size PIL image. kept for `benchmark_to_color_matrix`"""
         im = self.to_image(text, color)
         width = int(im.width * height / im.height)
-        im = im.resize((width, height), Image.ANTIALIAS)
-        return ColorMatrix.from_image(im.resize((width, height), Image.ANTIALIAS))
+        return ColorMatrix.from_image(im.resize((width, height), Image.LANCZOS))
 
 
 class Fonts(Enum):
@@ -302,6 +428,7 @@ class Fonts(Enum):
     papyrus = 'Papyrus.ttc'
 
 
+@lru_cache()
 def load_font(font_name: str | Fonts = 'Courier New.ttf', size=13):
     if isinstance(font_name, Fonts):
         font_name = font_name.value
@@ -318,6 +445,18 @@ def display_dimensions(font_name='Courier New.ttf', r=range(13, 50)):
     print(font_name)
 
 
+def benchmark_to_color_matrix(font_name: str | Fonts = Fonts.courier_new, size=50, n=20,
+                              text='!! sunny with a high of 54. winds W at 10 to 15 mph !!'):
+    """compare `Font.to_color_matrix` with going through PIL"""
+    fnt = load_font(font_name, size)
+    fnt.render_text(text)
+    for name, f in ('direct', fnt.to_color_matrix), ('pil', fnt._to_color_matrix_pil):
+        start = time.perf_counter()
+        for _ in range(n):
+            f(text)
+        print(f'{name:>8}: {1000 * (time.perf_counter() - start) / n:.2f} ms')
+
+
 def _play():
     # Single characters
     fnt = load_font('Courier New.ttf', 13)
@@ -0,0 +1,249 @@
+"""
+only send what changed
+
+most animations only change a handful of pixels per frame, but `set_cm` pushes the whole
+matrix to every tile every time. `FrameDiffTransport` keeps the last frame sent to a device,
+and for each new frame only sends the tiles that changed, and only the smallest rectangle
+within each tile that covers the changes. every `keyframe_every` frames it sends everything
+again, in case the device missed something
+
+usage:
+    transport = FrameDiffTransport.for_device(TileChainDevice(tile_chain))
+    while True:
+        transport.send(cm)
+"""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from lifxlan3 import Color
+from lifxlan3.routines.tile.tile_utils import RC, ColorMatrix, default_color
+
+__author__ = 'acushner'
+
+tile_shape = RC(8, 8)
+
+# sizes of a lifx Set64 message: a 36 byte header, 10 bytes of tile index/rect/duration and 8 bytes per color
+header_bytes = 36
+set_64_bytes = 10
+color_bytes = 8
+
+
+class Rect(NamedTuple):
+    """rectangle within a tile: upper-left corner and shape"""
+    ul: RC
+    shape: RC
+
+    @property
+    def area(self) -> int:
+        return self.shape.r * self.shape.c
+
+
+class TileDelta(NamedTuple):
+    """new colors for `rect` in the tile at position `tile` (in tiles, not pixels)
+
+    `colors` are row-major"""
+    tile: RC
+    rect: Rect
+    colors: List[Color]
+
+    @property
+    def num_bytes(self) -> int:
+        return header_bytes + set_64_bytes + color_bytes * len(self.colors)
+
+
+@dataclass
+class TransportStats:
+    """what was actually sent vs what sending every tile in full would've cost"""
+    frames: int = 0
+    keyframes: int = 0
+    messages: int = 0
+    bytes: int = 0
+    full_messages: int = 0
+    full_bytes: int = 0
+
+    @property
+    def messages_saved(self) -> int:
+        return self.full_messages - self.messages
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.full_bytes - self.bytes
+
+    def __str__(self):
+        pct = 100 * self.bytes_saved / (self.full_bytes or 1)
+        return (f'{self.frames} frames ({self.keyframes} keyframes): '
+                f'{self.messages}/{self.full_messages} messages, {self.bytes}/{self.full_bytes} bytes ({pct:.1f}% saved)')
+
+
+# ======================================================================================================================
+# devices
+# ======================================================================================================================
+
+class Device(ABC):
+    """something that can receive tile deltas
+
+    `shape` is the size of the frames it shows, in pixels"""
+    shape: RC
+    transport: Optional[FrameDiffTransport] = None  # set by `FrameDiffTransport.for_device`
+
+    @abstractmethod
+    def send(self, deltas: List[TileDelta], duration_msec: int = 0):
+        """apply all `deltas`"""
+
+
+def _check_tiles(shape: RC, tile_shape: RC) -> RC:
+    """number of (rows, cols) of tiles in a frame of `shape`"""
+    if shape.r % tile_shape.r or shape.c % tile_shape.c:
+        raise ValueError(f'shape {tuple(shape)} is not a multiple of tile shape {tuple(tile_shape)}')
+    return RC(shape.r // tile_shape.r, shape.c // tile_shape.c)
+
+
+class TileChainDevice(Device):
+    """a lifx tile chain showing frames of `shape`
+
+    `tile_indices` maps tile positions to their index in the chain. defaults to row-major
+    order over the tiles of `shape`"""
+
+    def __init__(self, tile_chain, tile_indices: Optional[Dict[RC, int]] = None, *, shape: RC = RC(16, 16),
+                 tile_shape: RC = tile_shape):
+        self.shape = RC(*shape)
+        num_rows, num_cols = _check_tiles(self.shape, tile_shape)
+        self._tile_chain = tile_chain
+        self._tile_indices = tile_indices or {RC(*divmod(i, num_cols)): i for i in range(num_rows * num_cols)}
+        if missing := {RC(r, c) for r in range(num_rows) for c in range(num_cols)} - set(self._tile_indices):
+            raise ValueError(f'no tile index for tile positions {sorted(missing)} of shape {tuple(self.shape)}')
+
+    def send(self, deltas: List[TileDelta], duration_msec: int = 0):
+        for d in deltas:
+            self._tile_chain.set_tile_colors(self._tile_indices[d.tile], d.colors, duration_msec,
+                                             x=d.rect.ul.c, y=d.rect.ul.r, width=d.rect.shape.c, rapid=True)
+
+
+class LocalDevice(Device):
+    """stand-in for a real device: applies deltas to an in-memory frame"""
+
+    def __init__(self, shape: RC = RC(16, 16), tile_shape: RC = tile_shape):
+        self.shape = RC(*shape)
+        _check_tiles(self.shape, tile_shape)
+        self._tile_shape = tile_shape
+        self.frame = [[default_color] * shape.c for _ in range(shape.r)]
+        self.num_messages = 0
+
+    def send(self, deltas: List[TileDelta], duration_msec: int = 0):
+        for tile, (ul, shape), colors in deltas:
+            r0 = tile.r * self._tile_shape.r + ul.r
+            c0 = tile.c * self._tile_shape.c + ul.c
+            for i, color in enumerate(colors):
+                r, c = divmod(i, shape.c)
+                self.frame[r0 + r][c0 + c] = color
+            self.num_messages += 1
+
+    @property
+    def cm(self) -> ColorMatrix:
+        return ColorMatrix([list(row) for row in self.frame])
+
+
+# ======================================================================================================================
+# transport
+# ======================================================================================================================
+
+def to_array(cm: ColorMatrix) -> np.ndarray:
+    """(num_rows, num_cols, 4) array of hsbk values"""
+    return np.array([[tuple(c) for c in row] for row in cm])
+
+
+class FrameDiffTransport:
+    """send only the tiles/pixels that changed since the last frame. see module docstring"""
+
+    def __init__(self, device: Device, *, tile_shape: RC = tile_shape, keyframe_every: Optional[int] = 60):
+        _check_tiles(device.shape, tile_shape)
+        self.device = device
+        self.tile_shape = tile_shape
+        self.keyframe_every = keyframe_every
+        self.stats = TransportStats()
+        self._last: Optional[np.ndarray] = None
+        self._frames_since_keyframe = 0  # including the keyframe itself
+
+    @classmethod
+    def for_device(cls, device: Device, **kwargs) -> FrameDiffTransport:
+        """one transport, and so one last frame, per device. it lives on the device, so goes away with it"""
+        if device.transport is None:
+            device.transport = cls(device, **kwargs)
+        return device.transport
+
+    def reset(self):
+        """forget the last frame so the next one is sent in full"""
+        self._last = None
+
+    def _is_keyframe(self, arr: np.ndarray) -> bool:
+        return (self._last is None
+                or self._last.shape != arr.shape
+                or bool(self.keyframe_every and self._frames_since_keyframe >= self.keyframe_every))
+
+    def diff(self, cm: ColorMatrix) -> List[TileDelta]:
+        """compute deltas for `cm` against the last frame and remember it as the last frame"""
+        arr = to_array(cm)
+        num_rows, num_cols = arr.shape[:2]
+        if (num_rows, num_cols) != self.device.shape:
+            raise ValueError(f'frame shape {num_rows, num_cols} does not match device shape {tuple(self.device.shape)}')
+        tr, tc = self.tile_shape
+
+        if keyframe := self._is_keyframe(arr):
+            changed = np.ones((num_rows, num_cols), dtype=bool)
+            self._frames_since_keyframe = 0
+        else:
+            changed = (arr != self._last).any(axis=-1)
+        self._frames_since_keyframe += 1
+
+        # (tile_row, row_in_tile, tile_col, col_in_tile)
+        by_tile = changed.reshape(num_rows // tr, tr, num_cols // tc, tc)
+        res = []
+        for t_r, t_c in zip(*np.nonzero(by_tile.any(axis=(1, 3)))):
+            tile = by_tile[t_r, :, t_c]
+            rows, = np.nonzero(tile.any(axis=1))
+            cols, = np.nonzero(tile.any(axis=0))
+            r0, r1, c0, c1 = int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+            base_r, base_c = int(t_r) * tr, int(t_c) * tc
+            colors = [cm[base_r + r][base_c + c] for r in range(r0, r1) for c in range(c0, c1)]
+            res.append(TileDelta(RC(int(t_r), int(t_c)), Rect(RC(r0, c0), RC(r1 - r0, c1 - c0)), colors))
+
+        self._last = arr
+        self._update_stats(res, num_rows // tr * num_cols // tc, keyframe)
+        return res
+
+    def _update_stats(self, deltas: List[TileDelta], num_tiles: int, keyframe: bool):
+        s = self.stats
+        s.frames += 1
+        s.keyframes += keyframe
+        s.messages += len(deltas)
+        s.bytes += sum(d.num_bytes for d in deltas)
+        s.full_messages += num_tiles
+        s.full_bytes += num_tiles * (header_bytes + set_64_bytes + color_bytes * self.tile_shape.r * self.tile_shape.c)
+
+    def send(self, cm: ColorMatrix, duration_msec: int = 0) -> List[TileDelta]:
+        """send whatever changed in `cm` to the device"""
+        deltas = self.diff(cm)
+        if deltas:
+            self.device.send(deltas, duration_msec)
+        return deltas
+
+
+def __main():
+    import random
+    from lifxlan3 import Colors
+    device = LocalDevice()
+    transport = FrameDiffTransport.for_device(device)
+    cm = ColorMatrix.from_shape(RC(16, 16), default_color)
+    for _ in range(100):
+        cm[random.randrange(16)][random.randrange(16)] = random.choice([Colors.RED, Colors.GREEN, Colors.BLUE])
+        transport.send(cm)
+    assert device.cm == cm
+    print(transport.stats)
+
+
+if __name__ == '__main__':
+    __main()
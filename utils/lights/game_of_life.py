@@ -1,17 +1,25 @@
 from __future__ import annotations
 import time
-from collections import Counter
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from functools import reduce
 from itertools import product
-from typing import NamedTuple, FrozenSet, Set, Optional
+from operator import xor
+from typing import NamedTuple, FrozenSet, Set, Optional, Tuple, Dict, Type, Iterable, List, Collection, Union
+
+import numpy as np
 
 from utils.assets_path import ASSETS_PATH
 from utils.core import Coord
+from utils.lights.hashlife import Universe
 import utils.core as U
 
 __author__ = 'acushner'
 
 _neighbor_offsets = {Coord(*xy) for xy in product(range(-1, 2), range(-1, 2))} - {Coord(0, 0)}
 
+Shape = Tuple[int, int]  # (num_rows, num_cols)
+
 
 class BSRule(NamedTuple):
     """born/survive rulestring
@@ -28,26 +36,418 @@ class BSRule(NamedTuple):
         return cls(to_fs(b), to_fs(s))
 
 
+# ======================================================================================================================
+# engines
+# ======================================================================================================================
+
+class Engine(ABC):
+    """steps a board forward one generation at a time
+
+    with no `shape`, the board is unbounded.
+    with a `shape` of (num_rows, num_cols), cells outside of it are either dead (bounded)
+    or wrap around to the other side (`wrap=True`, toroidal)
+    """
+    name: str
+    _registered: Dict[str, Type[Engine]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'name' in vars(cls):
+            cls._registered[cls.name] = cls
+
+    def __init__(self, rule: BSRule, alive: Iterable[Coord], shape: Optional[Shape] = None, wrap=False):
+        self.rule = rule
+        self.shape = shape
+        self.wrap = wrap
+        self._check_shape()
+        self._set_alive(self._in_bounds(alive))
+
+    def _check_shape(self):
+        pass
+
+    @classmethod
+    def get(cls, name: str) -> Type[Engine]:
+        return cls._registered[name]
+
+    def _in_bounds(self, alive: Iterable[Coord]) -> Set[Coord]:
+        """apply `shape`/`wrap` to coords"""
+        if not self.shape:
+            return set(alive)
+        num_rows, num_cols = self.shape
+        if self.wrap:
+            return {Coord(x % num_cols, y % num_rows) for x, y in alive}
+        return {c for c in alive if 0 <= c.x < num_cols and 0 <= c.y < num_rows}
+
+    @abstractmethod
+    def _set_alive(self, alive: Set[Coord]):
+        """set the state of the board"""
+
+    @property
+    @abstractmethod
+    def alive(self) -> Set[Coord]:
+        """living cells"""
+
+    @abstractmethod
+    def tick(self) -> Set[Coord]:
+        """advance one generation. returns the cells that were born or died"""
+
+    def advance(self, n: int):
+        """advance `n` generations"""
+        for _ in range(n):
+            self.tick()
+
+
+class SparseEngine(Engine):
+    """count neighbors of living cells only. the only engine that supports unbounded boards"""
+    name = 'sparse'
+
+    def _set_alive(self, alive: Set[Coord]):
+        self._alive = alive
+
+    @property
+    def alive(self) -> Set[Coord]:
+        return self._alive
+
+    def _neighbors(self) -> Iterable[Coord]:
+        if self.shape and self.wrap:
+            num_rows, num_cols = self.shape
+            return (Coord((c.x + dx) % num_cols, (c.y + dy) % num_rows)
+                    for c in self._alive
+                    for dx, dy in _neighbor_offsets)
+        return (c + offset
+                for c in self._alive
+                for offset in _neighbor_offsets)
+
+    def tick(self) -> Set[Coord]:
+        living_neighbor_count = Counter(self._neighbors())
+        born = {c
+                for c, v in living_neighbor_count.items()
+                if c not in self._alive and v in self.rule.born}
+        if self.shape and not self.wrap:
+            born = self._in_bounds(born)
+        died = {c for c in self._alive if living_neighbor_count[c] not in self.rule.survive}
+        self._alive = (self._alive - died) | born
+        return born | died
+
+
+class _BoundedEngine(Engine, ABC):
+    """engines that need a `shape`"""
+
+    def _check_shape(self):
+        if not self.shape:
+            raise ValueError(f'{type(self).__name__} requires a `shape`')
+
+
+class DenseEngine(_BoundedEngine):
+    """numpy bool array of the whole board. neighbor counts are the sum of 8 shifted copies"""
+    name = 'dense'
+
+    def _set_alive(self, alive: Set[Coord]):
+        self._board = np.zeros(self.shape, dtype=bool)
+        if alive:
+            xs, ys = zip(*alive)
+            self._board[ys, xs] = True
+        max_neighbors = len(_neighbor_offsets) + 1
+        self._born = np.isin(np.arange(max_neighbors), list(self.rule.born))
+        self._survive = np.isin(np.arange(max_neighbors), list(self.rule.survive))
+
+    @property
+    def alive(self) -> Set[Coord]:
+        ys, xs = np.nonzero(self._board)
+        return set(map(Coord, xs.tolist(), ys.tolist()))
+
+    @property
+    def board(self) -> np.ndarray:
+        """(num_rows, num_cols) bool array. NOT a copy"""
+        return self._board
+
+    def _neighbor_counts(self) -> np.ndarray:
+        b = self._board.astype(np.uint8)
+        if self.wrap:
+            return sum(np.roll(b, (dy, dx), axis=(0, 1)) for dx, dy in _neighbor_offsets)
+
+        num_rows, num_cols = self.shape
+        padded = np.pad(b, 1)
+        return sum(padded[1 + dy:1 + dy + num_rows, 1 + dx:1 + dx + num_cols] for dx, dy in _neighbor_offsets)
+
+    def tick(self) -> Set[Coord]:
+        counts = self._neighbor_counts()
+        board = np.where(self._board, self._survive[counts], self._born[counts])
+        ys, xs = np.nonzero(board ^ self._board)
+        self._board = board
+        return set(map(Coord, xs.tolist(), ys.tolist()))
+
+
+class BitPackedEngine(_BoundedEngine):
+    """whole board packed into a single int, bit `y * num_cols + x` per cell
+
+    each generation is a few dozen big-int ops regardless of population:
+    shift the board to get the 8 neighbor boards, sum them with bit-sliced adders,
+    then match the 4-bit counts against the rule
+    """
+    name = 'bitpacked'
+
+    def _set_alive(self, alive: Set[Coord]):
+        num_rows, num_cols = self.shape
+        self._size = num_rows * num_cols
+        self._full = (1 << self._size) - 1
+        first_col = sum(1 << (r * num_cols) for r in range(num_rows))
+        self._first_col = first_col
+        self._last_col = first_col << (num_cols - 1)
+        self._first_row = (1 << num_cols) - 1
+        self._last_row_shift = num_cols * (num_rows - 1)
+        self._bits = sum(1 << (y * num_cols + x) for x, y in alive)
+
+    @property
+    def alive(self) -> Set[Coord]:
+        return self._to_coords(self._bits)
+
+    def _to_coords(self, bits: int) -> Set[Coord]:
+        num_cols = self.shape[1]
+        as_bytes = np.frombuffer(bits.to_bytes((self._size + 7) // 8, 'little'), dtype=np.uint8)
+        idxs = np.flatnonzero(np.unpackbits(as_bytes, bitorder='little')).tolist()
+        return {Coord(*reversed(divmod(i, num_cols))) for i in idxs}
+
+    def _west(self, b: int) -> int:
+        """bit at x is the value at x - 1"""
+        res = (b << 1) & self._full & ~self._first_col
+        if self.wrap:
+            res |= (b & self._last_col) >> (self.shape[1] - 1)
+        return res
+
+    def _east(self, b: int) -> int:
+        """bit at x is the value at x + 1"""
+        res = (b >> 1) & ~self._last_col
+        if self.wrap:
+            res |= (b & self._first_col) << (self.shape[1] - 1)
+        return res
+
+    def _north(self, b: int) -> int:
+        """bit at y is the value at y - 1"""
+        res = (b << self.shape[1]) & self._full
+        if self.wrap:
+            res |= b >> self._last_row_shift
+        return res
+
+    def _south(self, b: int) -> int:
+        """bit at y is the value at y + 1"""
+        res = b >> self.shape[1]
+        if self.wrap:
+            res |= (b & self._first_row) << self._last_row_shift
+        return res
+
+    def _neighbor_boards(self) -> Iterable[int]:
+        b = self._bits
+        n, s = self._north(b), self._south(b)
+        for v in n, b, s:
+            yield self._west(v)
+            yield self._east(v)
+        yield n
+        yield s
+
+    def _count_bits(self) -> List[int]:
+        """bit-sliced neighbor counts: bit i of the count for each cell"""
+        counts = [0, 0, 0, 0]
+        for carry in self._neighbor_boards():
+            for i, c in enumerate(counts):
+                if not carry:
+                    break
+                counts[i], carry = c ^ carry, c & carry
+        return counts
+
+    def _matching(self, counts: List[int], ns: Iterable[int]) -> int:
+        """cells whose neighbor count is in `ns`"""
+        res = 0
+        for n in ns:
+            cur = self._full
+            for i, c in enumerate(counts):
+                cur &= c if n >> i & 1 else ~c
+            res |= cur
+        return res
+
+    def tick(self) -> Set[Coord]:
+        counts = self._count_bits()
+        b = self._bits
+        self._bits = (self._matching(counts, self.rule.born) & ~b
+                      | self._matching(counts, self.rule.survive) & b)
+        return self._to_coords(self._bits ^ b)
+
+
+class HashlifeEngine(Engine):
+    """memoized quadtree (hashlife). unbounded boards only
+
+    `advance(n)` jumps ahead with one 2^j generation step per set bit of n,
+    which is what makes fast-forwarding thousands of generations cheap.
+    `max_nodes` caps the node/successor caches, see `hashlife.Universe`
+    """
+    name = 'hashlife'
+
+    def __init__(self, rule: BSRule, alive: Iterable[Coord], shape: Optional[Shape] = None, wrap=False,
+                 *, max_nodes: int = 1 << 20):
+        self._max_nodes = max_nodes
+        super().__init__(rule, alive, shape, wrap)
+
+    def _check_shape(self):
+        if self.shape:
+            raise ValueError(f'{type(self).__name__} only supports unbounded boards')
+
+    def _set_alive(self, alive: Set[Coord]):
+        self._universe = Universe(self.rule.born, self.rule.survive, max_nodes=self._max_nodes)
+        self._root, self._origin = self._universe.from_points(alive)
+        self._alive = set(alive)
+
+    @property
+    def alive(self) -> Set[Coord]:
+        if self._alive is None:
+            self._alive = set(map(Coord._make, self._universe.to_points(self._root, self._origin)))
+        return self._alive
+
+    def tick(self) -> Set[Coord]:
+        # the tree doesn't know which cells changed, so compare the cells before and after
+        prev = self.alive
+        self.advance(1)
+        return prev ^ self.alive
+
+    def advance(self, n: int):
+        self._root, self._origin = self._universe.advance(self._root, self._origin, n)
+        self._alive = None
+
+
+# crossovers from timing a tick of random boards from 16x16 to 512x512:
+# below `_sparse_density`, counting neighbors of living cells beats processing the whole board.
+# at `_dense_density` and up, numpy beats big ints, but only once the board is big enough
+# for numpy's per-call overhead not to matter
+_sparse_density = .001
+_dense_density = .1
+_dense_min_cells = 64 * 64
+
+
+def select_engine(alive: Collection[Coord], shape: Optional[Shape] = None) -> Type[Engine]:
+    """choose an engine for a board based on its population density
+
+    unbounded boards always get `SparseEngine`. for bounded ones:
+        - sparse: `SparseEngine`
+        - dense and big: `DenseEngine`
+        - everything else: `BitPackedEngine`
+    """
+    if not shape:
+        return SparseEngine
+    num_cells = shape[0] * shape[1]
+    density = len(alive) / num_cells
+    if density < _sparse_density:
+        return SparseEngine
+    if density >= _dense_density and num_cells >= _dense_min_cells:
+        return DenseEngine
+    return BitPackedEngine
+
+
+_mask64 = (1 << 64) - 1
+
+
+def _zobrist(c: Coord) -> int:
+    """random-looking 64-bit key for a cell (splitmix64 of its coords)
+
+    computed rather than looked up in a table so it works for unbounded boards"""
+    z = ((c.x & 0xffffffff) << 32 | (c.y & 0xffffffff)) + 0x9e3779b97f4a7c15
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & _mask64
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & _mask64
+    return z ^ (z >> 31)
+
+
+def _zobrist_hash(cells: Iterable[Coord]) -> int:
+    return reduce(xor, map(_zobrist, cells), 0)
+
+
 class GameOfLife:
-    """conway's game of life"""
+    """conway's game of life
+
+    `engine` can be an `Engine` subclass or its name. if not provided, one is chosen
+    with `select_engine`. see `Engine` for `shape` and `wrap`.
+    `engine_kwargs` are passed through to the engine, e.g. `max_nodes` for hashlife
+
+    each `tick` updates a zobrist hash of the board with the cells that changed.
+    the last `history_len` hashes are kept to detect when the board repeats itself,
+    see `period`. set `history_len=0` to turn this off
+    """
 
-    def __init__(self, rule: BSRule, alive: Set[Coord]):
-        self.alive = alive
+    def __init__(self, rule: BSRule, alive: Set[Coord], *, shape: Optional[Shape] = None, wrap=False,
+                 engine: Union[str, Type[Engine], None] = None, history_len=32, **engine_kwargs):
         self.rule = rule
+        if isinstance(engine, str):
+            engine = Engine.get(engine)
+        engine = engine or select_engine(alive, shape)
+        self._engine: Engine = engine(rule, alive, shape, wrap, **engine_kwargs)
+        self._engine_kwargs = engine_kwargs
+        self.generation = 0
+        self._history_len = history_len
+        self._reset_history()
 
     @classmethod
-    def from_pattern(cls, p: Pattern):
-        return cls(p.rule, p.start)
+    def from_pattern(cls, p: Pattern, **kwargs):
+        return cls(p.rule, p.start, **kwargs)
+
+    @property
+    def engine(self) -> Engine:
+        return self._engine
+
+    @property
+    def alive(self) -> Set[Coord]:
+        return self._engine.alive
+
+    @alive.setter
+    def alive(self, alive: Set[Coord]):
+        e = self._engine
+        self._engine = type(e)(self.rule, alive, e.shape, e.wrap, **self._engine_kwargs)
+        self._reset_history()
+
+    # ==================================================================================================================
+    # cycle detection
+    # ==================================================================================================================
+
+    def _reset_history(self):
+        self._hash = _zobrist_hash(self.alive) if self._history_len else None
+        self._hashes = deque([self._hash], maxlen=self._history_len)
+        self._period: Optional[int] = None
+        self.settled_at: Optional[int] = None
+
+    def _update_history(self, changed: Set[Coord]):
+        if not self._history_len or self._period:
+            return
+
+        self._hash ^= _zobrist_hash(changed)
+        if self._hash in self._hashes:
+            # most recent hashes are on the right
+            self._period = len(self._hashes) - self._hashes.index(self._hash)
+            self.settled_at = self.generation - self._period
+        self._hashes.append(self._hash)
+
+    @property
+    def period(self) -> Optional[int]:
+        """number of generations between repeats of the board, once it's been detected
+
+        `None` if it hasn't repeated (yet) within the last `history_len` generations.
+        once the board repeats, it'll keep repeating, so this never changes back
+        """
+        return self._period
+
+    @property
+    def is_static(self) -> bool:
+        """True if the board has died or settled into a still life"""
+        return self._period == 1
 
     def tick(self):
-        living_neighbor_count = Counter(c + offset
-                                        for c in self.alive
-                                        for offset in _neighbor_offsets)
-        res = {c
-               for c, v in living_neighbor_count.items()
-               if c not in self.alive and v in self.rule.born}
-        res.update(c for c in self.alive if living_neighbor_count[c] in self.rule.survive)
-        self.alive = res
+        changed = self._engine.tick()
+        self.generation += 1
+        self._update_history(changed)
+
+    def advance(self, n: int):
+        """advance `n` generations. with the hashlife engine, this is much faster than `n` ticks
+
+        jumps forward, so cycle detection starts over"""
+        self._engine.advance(n)
+        self.generation += n
+        if n:
+            self._reset_history()
 
     def display(self, size=10):
         res = [['.'] * size for _ in range(size)]
@@ -0,0 +1,148 @@
+"""
+on-disk cache of rendered glyphs, shared across processes
+
+an atlas holds every printable ascii glyph of one font at one pixel size, plus the
+non-zero kerning pairs between them. atlases are keyed by (font file hash, pixel size)
+and saved under `default_atlas_dir` as:
+    - `<key>.npy`: every glyph's unpacked pixels, concatenated. loaded with mmap, so
+      processes share the same pages and only touch the glyphs they use
+    - `<key>.json`: where each glyph lives in the pixels, plus its metrics and the kerning table
+
+the first process to need an atlas builds it with freetype. every process after that
+can render ascii text without touching freetype at all
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import string
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+__author__ = 'acushner'
+
+default_atlas_dir = Path('~/.cache/utils/glyph_atlas').expanduser()
+atlas_chars = string.printable
+_version = 1
+
+
+class GlyphInfo(NamedTuple):
+    offset: int  # into the atlas's pixels
+    width: int
+    height: int
+    top: int
+    advance_width: int
+
+
+@lru_cache()
+def _font_hash(filename: str, mtime: float) -> str:
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def font_hash(filename) -> str:
+    """sha1 of the font file's contents, cached per (filename, mtime)"""
+    return _font_hash(str(filename), os.path.getmtime(filename))
+
+
+class GlyphAtlas:
+    """pixels and metrics for a set of glyphs, plus the kerning between them
+
+    see module docstring"""
+
+    def __init__(self, pixels: np.ndarray, glyphs: Dict[str, GlyphInfo], kerning: Dict[str, int]):
+        self.pixels = pixels
+        self.glyphs = glyphs
+        self.kerning = kerning  # keyed by 'ab' for the pair a, b. missing pairs have 0 kerning
+
+    def __contains__(self, char: str):
+        return char in self.glyphs
+
+    def __len__(self):
+        return len(self.glyphs)
+
+    def glyph(self, char: str) -> Optional[tuple[bytearray, GlyphInfo]]:
+        """(pixels, info) for `char` or None if it's not in the atlas"""
+        if (info := self.glyphs.get(char)) is None:
+            return None
+        return bytearray(self.pixels[info.offset:info.offset + info.width * info.height]), info
+
+    @classmethod
+    def build(cls, render_glyph: Callable, kerning_offset: Callable[[str, str], int], *, has_kerning=True,
+              chars: Iterable[str] = atlas_chars) -> GlyphAtlas:
+        """render `chars` with `render_glyph`, which returns something `Glyph`-like"""
+        chars = list(dict.fromkeys(chars))
+        glyphs, pixels, offset = {}, [], 0
+        for char in chars:
+            g = render_glyph(char)
+            glyphs[char] = GlyphInfo(offset, g.width, g.height, g.top, g.advance_width)
+            pixels.append(np.frombuffer(bytes(g.bitmap.pixels), dtype=np.uint8))
+            offset += g.width * g.height
+
+        kerning = {}
+        if has_kerning:
+            kerning = {a + b: k for a in chars for b in chars if (k := kerning_offset(a, b))}
+
+        pixels = np.concatenate(pixels) if pixels else np.zeros(0, dtype=np.uint8)
+        return cls(pixels, glyphs, kerning)
+
+    # ==================================================================================================================
+    # persistence
+    # ==================================================================================================================
+
+    def save(self, path: Path):
+        """write `path`.npy and `path`.json, each atomically
+
+        the json goes last, so an atlas is only visible to `load` once it's complete"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = dict(version=_version, glyphs={c: list(info) for c, info in self.glyphs.items()}, kerning=self.kerning)
+        _atomic_write(path.with_suffix('.npy'), lambda f: np.save(f, np.asarray(self.pixels)))
+        _atomic_write(path.with_suffix('.json'), lambda f: f.write(json.dumps(meta).encode()))
+
+    @classmethod
+    def load(cls, path: Path) -> Optional[GlyphAtlas]:
+        """read an atlas saved with `save`. None if it doesn't exist or is stale"""
+        try:
+            with open(path.with_suffix('.json')) as f:
+                meta = json.load(f)
+            if meta.get('version') != _version:
+                return None
+            pixels = np.load(path.with_suffix('.npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        return cls(pixels, {c: GlyphInfo(*info) for c, info in meta['glyphs'].items()}, meta['kerning'])
+
+
+def _atomic_write(path: Path, write: Callable):
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.', delete=False) as f:
+        try:
+            write(f)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+def atlas_path(filename, size: int, atlas_dir: Path = default_atlas_dir) -> Path:
+    return Path(atlas_dir) / f'{font_hash(filename)}_{size}'
+
+
+def load_or_build(filename, size: int, build: Callable[[], GlyphAtlas],
+                  atlas_dir: Path = default_atlas_dir) -> GlyphAtlas:
+    """load the atlas for (`filename`, `size`) from disk, building and saving it if necessary"""
+    path = atlas_path(filename, size, atlas_dir)
+    if (res := GlyphAtlas.load(path)) is not None:
+        return res
+
+    res = build()
+    try:
+        res.save(path)
+    except OSError:
+        # read-only or full disk: still usable for this process
+        pass
+    return res
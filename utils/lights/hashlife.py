@@ -0,0 +1,216 @@
+"""
+hashlife: memoized quadtrees for fast-forwarding life-like cellular automata
+
+see https://conwaylife.com/wiki/HashLife
+
+every square of 2^k x 2^k cells is a canonical `Node`: building the same square twice
+returns the same object. the result of running a node forward is memoized per node, so
+repeated structure (still lifes, oscillators, empty space, spaceship trails) only ever
+gets computed once, and a node can be jumped 2^(k-2) generations forward at once
+"""
+from __future__ import annotations
+
+from itertools import product
+from typing import Dict, FrozenSet, Iterable, Iterator, Optional, Tuple
+
+__author__ = 'acushner'
+
+Point = Tuple[int, int]  # (x, y)
+
+
+class Node:
+    """square of 2^k x 2^k cells made up of 4 2^(k-1) quadrants: a b
+                                                                  c d"""
+    __slots__ = 'k', 'a', 'b', 'c', 'd', 'n'
+
+    def __init__(self, k: int, a: Optional[Node], b: Optional[Node], c: Optional[Node], d: Optional[Node], n: int):
+        self.k = k
+        self.a, self.b, self.c, self.d = a, b, c, d
+        self.n = n  # population
+
+    def __repr__(self):
+        return f'{type(self).__name__}(k={self.k}, n={self.n})'
+
+
+_off = Node(0, None, None, None, None, 0)
+_on = Node(0, None, None, None, None, 1)
+
+
+class Universe:
+    """canonical node store plus memoized successors for a single born/survive rule
+
+    the caches only ever grow while running. once they hold more than `max_nodes`
+    entries, they're collected between steps: successors are dropped and only
+    nodes reachable from the current root are kept
+    """
+
+    def __init__(self, born: FrozenSet[int], survive: FrozenSet[int], *, max_nodes: int = 1 << 20):
+        if 0 in born:
+            raise ValueError('hashlife does not support B0 rules')
+        self.born = born
+        self.survive = survive
+        self.max_nodes = max_nodes
+        self._nodes: Dict[Tuple[Node, Node, Node, Node], Node] = {}
+        self._successors: Dict[Tuple[Node, int], Node] = {}
+        self._empties: Dict[int, Node] = {0: _off}
+
+    def __len__(self):
+        return len(self._nodes) + len(self._successors)
+
+    # ==================================================================================================================
+    # construction
+    # ==================================================================================================================
+
+    def join(self, a: Node, b: Node, c: Node, d: Node) -> Node:
+        key = a, b, c, d
+        if (res := self._nodes.get(key)) is None:
+            res = self._nodes[key] = Node(a.k + 1, a, b, c, d, a.n + b.n + c.n + d.n)
+        return res
+
+    def empty(self, k: int) -> Node:
+        if (res := self._empties.get(k)) is None:
+            e = self.empty(k - 1)
+            res = self._empties[k] = self.join(e, e, e, e)
+        return res
+
+    def centre(self, m: Node) -> Node:
+        """node twice as big with `m` in the middle"""
+        z = self.empty(m.k - 1)
+        return self.join(self.join(z, z, z, m.a), self.join(z, z, m.b, z),
+                         self.join(z, m.c, z, z), self.join(m.d, z, z, z))
+
+    def from_points(self, points: Iterable[Point]) -> Tuple[Node, Point]:
+        """build a (root, origin) pair from living cells. `origin` is root's upper-left corner"""
+        points = set(points)
+        if not points:
+            return self.empty(3), (0, 0)
+
+        ox = min(x for x, _ in points)
+        oy = min(y for _, y in points)
+        level = {(x - ox, y - oy): _on for x, y in points}
+        extent = max(max(x for x, _ in level), max(y for _, y in level)) + 1
+        k = max(3, (extent - 1).bit_length())
+
+        for cur_k in range(k):
+            z = self.empty(cur_k)
+            parents = {(x >> 1, y >> 1) for x, y in level}
+            level = {(x, y): self.join(level.get((2 * x, 2 * y), z), level.get((2 * x + 1, 2 * y), z),
+                                       level.get((2 * x, 2 * y + 1), z), level.get((2 * x + 1, 2 * y + 1), z))
+                     for x, y in parents}
+        return level[0, 0], (ox, oy)
+
+    @staticmethod
+    def to_points(root: Node, origin: Point) -> Iterator[Point]:
+        """yield living cells"""
+        stack = [(root, *origin)]
+        while stack:
+            node, x, y = stack.pop()
+            if not node.n:
+                continue
+            if not node.k:
+                yield x, y
+                continue
+            half = 1 << (node.k - 1)
+            stack.extend(((node.a, x, y), (node.b, x + half, y),
+                          (node.c, x, y + half), (node.d, x + half, y + half)))
+
+    # ==================================================================================================================
+    # evolution
+    # ==================================================================================================================
+
+    def _life_4x4(self, m: Node) -> Node:
+        """center 2x2 of a 4x4 node after one generation"""
+        a, b, c, d = m.a, m.b, m.c, m.d
+        cells = [[a.a.n, a.b.n, b.a.n, b.b.n],
+                 [a.c.n, a.d.n, b.c.n, b.d.n],
+                 [c.a.n, c.b.n, d.a.n, d.b.n],
+                 [c.c.n, c.d.n, d.c.n, d.d.n]]
+
+        def next_state(r, c):
+            total = sum(cells[r + dr][c + dc] for dr, dc in product((-1, 0, 1), repeat=2)) - cells[r][c]
+            alive = total in self.survive if cells[r][c] else total in self.born
+            return _on if alive else _off
+
+        return self.join(next_state(1, 1), next_state(1, 2), next_state(2, 1), next_state(2, 2))
+
+    def successor(self, m: Node, j: Optional[int] = None) -> Node:
+        """center half of `m` (level k - 1) after 2^j generations. j is at most k - 2"""
+        j = m.k - 2 if j is None else min(j, m.k - 2)
+        key = m, j
+        if (res := self._successors.get(key)) is not None:
+            return res
+
+        if not m.n:
+            res = m.a
+        elif m.k == 2:
+            res = self._life_4x4(m)
+        else:
+            join, succ = self.join, self.successor
+            c1 = succ(join(m.a.a, m.a.b, m.a.c, m.a.d), j)
+            c2 = succ(join(m.a.b, m.b.a, m.a.d, m.b.c), j)
+            c3 = succ(join(m.b.a, m.b.b, m.b.c, m.b.d), j)
+            c4 = succ(join(m.a.c, m.a.d, m.c.a, m.c.b), j)
+            c5 = succ(join(m.a.d, m.b.c, m.c.b, m.d.a), j)
+            c6 = succ(join(m.b.c, m.b.d, m.d.a, m.d.b), j)
+            c7 = succ(join(m.c.a, m.c.b, m.c.c, m.c.d), j)
+            c8 = succ(join(m.c.b, m.d.a, m.c.d, m.d.c), j)
+            c9 = succ(join(m.d.a, m.d.b, m.d.c, m.d.d), j)
+
+            if j < m.k - 2:
+                # c1-c9 are already 2^j generations ahead, just stitch their centers together
+                res = join(join(c1.d, c2.c, c4.b, c5.a), join(c2.d, c3.c, c5.b, c6.a),
+                           join(c4.d, c5.c, c7.b, c8.a), join(c5.d, c6.c, c8.b, c9.a))
+            else:
+                # c1-c9 are halfway there, run them forward again
+                res = join(succ(join(c1, c2, c4, c5), j), succ(join(c2, c3, c5, c6), j),
+                           succ(join(c4, c5, c7, c8), j), succ(join(c5, c6, c8, c9), j))
+
+        self._successors[key] = res
+        return res
+
+    @staticmethod
+    def _is_padded(m: Node) -> bool:
+        """True if all living cells are in the center quarter of `m`"""
+        return m.k >= 3 and m.n == m.a.d.d.n + m.b.c.c.n + m.c.b.b.n + m.d.a.a.n
+
+    def _step(self, root: Node, origin: Point, j: int) -> Tuple[Node, Point]:
+        """advance 2^j generations"""
+        # with everything in the center quarter and at most 2^(k - 3) generations,
+        # nothing can escape the center half that `successor` returns
+        x, y = origin
+        while root.k < j + 3 or not self._is_padded(root):
+            offset = 1 << (root.k - 1)
+            root, x, y = self.centre(root), x - offset, y - offset
+        offset = 1 << (root.k - 2)
+        return self.successor(root, j), (x + offset, y + offset)
+
+    def advance(self, root: Node, origin: Point, n: int) -> Tuple[Node, Point]:
+        """advance `n` generations in one 2^j jump per set bit of `n`"""
+        for j in range(n.bit_length()):
+            if n >> j & 1:
+                root, origin = self._step(root, origin, j)
+                self._maybe_collect(root)
+        return root, origin
+
+    # ==================================================================================================================
+    # memory
+    # ==================================================================================================================
+
+    def _maybe_collect(self, root: Node):
+        if len(self) > self.max_nodes:
+            self.collect(root)
+
+    def collect(self, root: Node):
+        """drop memoized successors and any nodes not reachable from `root`"""
+        self._successors.clear()
+        nodes = {}
+        stack = [root, *self._empties.values()]
+        while stack:
+            node = stack.pop()
+            if not node.k:
+                continue
+            key = node.a, node.b, node.c, node.d
+            if key not in nodes:
+                nodes[key] = node
+                stack.extend(key)
+        self._nodes = nodes
@@ -0,0 +1,142 @@
+"""
+scroll long text across tiles without ever rendering all of it at once
+
+`Font.to_color_matrix` renders a whole message to one image and resizes it, so memory
+grows with the message. `Marquee` instead lays glyphs out one at a time into a ring buffer
+of source columns only as wide as one glyph plus a few output columns' worth, downsamples
+each output column as soon as nothing else can draw on it, and keeps only one tile's width
+of output columns around
+"""
+from __future__ import annotations
+
+import time
+from collections import deque
+from itertools import chain, repeat
+from typing import Deque, Iterator, NamedTuple, Optional
+
+import numpy as np
+from lifxlan3 import Color, Colors
+from lifxlan3.routines.tile.core import set_cm
+from lifxlan3.routines.tile.tile_utils import RC, ColorMatrix
+
+from utils.lights.font_to_bitmap import Font, border_size, area_weights, color_levels, overlap_weights
+from utils.lights.frame_diff import FrameDiffTransport
+
+__author__ = 'acushner'
+
+
+class _Metrics(NamedTuple):
+    ascent: int
+    descent: int
+    max_width: int
+    lookbehind: int  # how far the message's kerning pulls a glyph back onto earlier columns
+
+
+class Marquee:
+    """
+    scroll `text` right to left across tiles of shape `shape`, `color` on black.
+
+    like `Font.to_color_matrix`, text gets a border of `border_pct` of its height
+    and is scaled down by area averaging to `shape.r` rows
+
+    usage:
+        Marquee(load_font('Courier New.ttf', 50), 'hello there').run()
+    """
+
+    def __init__(self, font: Font, text: str, color: Color = Colors.YELLOW, shape: RC = RC(16, 16), *,
+                 border_pct=10.):
+        self.font = font
+        self.text = text
+        self.shape = shape
+        self._levels = color_levels(color)
+        self._border_pct = border_pct
+
+    def _metrics(self) -> _Metrics:
+        ascent = descent = max_width = lookbehind = 0
+        previous_char = None
+        for char in self.text:
+            glyph = self.font.glyph_for_character(char)
+            ascent = max(ascent, glyph.ascent)
+            descent = max(descent, glyph.descent)
+            max_width = max(max_width, glyph.width)
+            lookbehind = max(lookbehind, -self.font.kerning_offset(previous_char, char))
+            previous_char = char
+        return _Metrics(ascent, descent, max_width, lookbehind)
+
+    def columns(self) -> Iterator[np.ndarray]:
+        """yield each output column as `shape.r` coverage levels (0-255)"""
+        font, num_rows = self.font, self.shape.r
+        ascent, descent, max_width, lookbehind = self._metrics()
+        border = border_size(ascent + descent, self._border_pct)
+        src_rows = ascent + descent + 2 * border
+        scale = src_rows / num_rows
+        row_weights = area_weights(src_rows, num_rows)
+
+        # later glyphs can be kerned back onto columns before the current glyph
+        ring = np.zeros((src_rows, max_width + lookbehind + int(np.ceil(scale)) + 2), dtype=np.uint8)
+        ring_len = ring.shape[1]
+        num_done = num_cleared = 0  # output columns yielded, source columns cleared for reuse
+
+        def flush(final_cols: int) -> Iterator[np.ndarray]:
+            """yield output columns made up entirely of source columns < `final_cols`"""
+            nonlocal num_done, num_cleared
+            while (num_done + 1) * src_rows <= final_cols * num_rows:
+                start = num_done * scale
+                idxs = np.arange(num_done * src_rows // num_rows, -(-(num_done + 1) * src_rows // num_rows))
+                col = row_weights @ (ring[:, idxs % ring_len] @ overlap_weights(start, scale, idxs))
+                yield np.rint(255 * col).astype(np.uint8)
+
+                num_done += 1
+                next_start = num_done * src_rows // num_rows
+                ring[:, np.arange(num_cleared, next_start) % ring_len] = 0
+                num_cleared = next_start
+
+        x, width, previous_char = border, 0, None
+        for char in self.text:
+            glyph = font.glyph_for_character(char)
+            kerning_x = font.kerning_offset(previous_char, char)
+            x += kerning_x
+            yield from flush(x - lookbehind)
+
+            y = border + ascent - glyph.ascent
+            ring[y:y + glyph.height, np.arange(x, x + glyph.width) % ring_len] |= glyph.bitmap.array
+
+            # same as `Font.text_dimensions`
+            width += max(glyph.advance_width + kerning_x, glyph.width + kerning_x)
+            x += glyph.advance_width
+            previous_char = char
+
+        yield from flush(width + 2 * border)
+
+    def _to_color_matrix(self, window: Deque[np.ndarray]) -> ColorMatrix:
+        levels = self._levels
+        return ColorMatrix([[levels[v] for v in row] for row in np.stack(window, axis=1).tolist()])
+
+    def frames(self, pixels_per_step=1) -> Iterator[ColorMatrix]:
+        """scroll in from the right until the text has completely scrolled off the left"""
+        num_rows, num_cols = self.shape
+        blank = np.zeros(num_rows, dtype=np.uint8)
+        window = deque(num_cols * [blank], maxlen=num_cols)
+        for i, col in enumerate(chain(self.columns(), repeat(blank, num_cols)), 1):
+            window.append(col)
+            if not i % pixels_per_step:
+                yield self._to_color_matrix(window)
+
+    def run(self, sleep_secs=.05, pixels_per_step=2, *, in_terminal=False,
+            transport: Optional[FrameDiffTransport] = None):
+        """if `transport` is provided, send frames through it instead of `set_cm`"""
+        for cm in self.frames(pixels_per_step):
+            if transport:
+                transport.send(cm)
+            else:
+                set_cm(cm, in_terminal=in_terminal, strip=False, verbose=False)
+            time.sleep(sleep_secs)
+
+
+def __main():
+    from utils.lights.font_to_bitmap import load_font
+    Marquee(load_font('Courier New.ttf', 50), '!! it is 54 degrees and sunny !!').run(in_terminal=True)
+
+
+if __name__ == '__main__':
+    __main()
@@ -6,12 +6,11 @@ from contextlib import suppress
 from itertools import repeat
 from queue import Queue, Empty
 
-from lifxlan3 import Dir
 from lifxlan3.routines.tile.cli import run_animate
-from lifxlan3.routines.tile.core import translate
 from lifxlan3.routines.tile.snek import run_as_ambiance
 
 from utils.lights.font_to_bitmap import load_font
+from utils.lights.marquee import Marquee
 from utils.lights.tile_game_of_life import TileGameOfLife
 from utils.lights.weather import weather
 
@@ -27,8 +26,7 @@ def display_msgs():
     with suppress(Empty):
         while True:
             msg = msg_queue.get_nowait()
-            translate(fnt.to_color_matrix(f'!! {msg} !!'), in_terminal=False, split=False, dir=Dir.left, n_iterations=1,
-                      pixels_per_step=2, sleep_secs=.05)
+            Marquee(fnt, f'!! {msg} !!').run(sleep_secs=.05, pixels_per_step=2)
             time.sleep(.5)
 
 
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('lifxlan3')
+
+from lifxlan3 import Themes
+from lifxlan3.routines.tile.tile_utils import RC
+
+from utils.lights.color_func import (BaseColorFunc, DefaultColorFunc, DistColorFunc, default_color_func, manhattan,
+                                     quadrant, to_frame_func)
+
+__author__ = 'acushner'
+
+
+def _per_cell(color_func, alive, iteration):
+    return [color_func(RC(r, c), bool(alive[r, c]), iteration) for r, c in np.ndindex(alive.shape)]
+
+
+def _frames_match(make_color_func, shape=(20, 20), iterations=5):
+    rng = np.random.default_rng(0)
+    per_cell, vectorized = make_color_func(), to_frame_func(make_color_func())
+    rows, cols = np.indices(shape)
+    for i in range(iterations):
+        alive = rng.random(shape) < .3
+        assert _per_cell(per_cell, alive, i) == vectorized(alive, rows, cols, i).ravel().tolist()
+
+
+def test_default_color_func():
+    _frames_match(lambda: default_color_func)
+
+
+def test_default_color_func_class():
+    _frames_match(DefaultColorFunc)
+
+
+@pytest.mark.parametrize('dist_func', [manhattan, quadrant])
+def test_dist_color_func(dist_func):
+    _frames_match(lambda: DistColorFunc([('rainbow', Themes.rainbow)], dist_func))
+
+
+def test_fallback():
+    class Checkerboard(BaseColorFunc):
+        def __call__(self, rc, alive, iteration):
+            return list(Themes.rainbow)[(sum(rc) + iteration) % 2] if alive else None
+
+        @classmethod
+        def from_random(cls):
+            return cls()
+
+    _frames_match(Checkerboard)
+    _frames_match(lambda: Checkerboard().__call__)
@@ -0,0 +1,98 @@
+import string
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('lifxlan3')
+
+from utils.assets_path import ASSETS_PATH
+from utils.lights.font_to_bitmap import Bitmap, Font, Fonts, Glyph, area_resample, area_weights
+from utils.lights.glyph_atlas import GlyphAtlas, atlas_path
+
+__author__ = 'acushner'
+
+
+def _unpack_slow(bitmap):
+    return bytearray(int(bool(bitmap.buffer[r * bitmap.pitch + c // 8] & (0x80 >> c % 8)))
+                     for r in range(bitmap.rows) for c in range(bitmap.width))
+
+
+def test_unpack_mono_bitmap():
+    rng = np.random.default_rng(0)
+    for width in (1, 7, 8, 9, 17):
+        pitch = (width + 7) // 8 + 1
+        bitmap = SimpleNamespace(rows=5, width=width, pitch=pitch, buffer=rng.integers(0, 256, 5 * pitch).tolist())
+        assert Glyph.unpack_mono_bitmap(bitmap) == _unpack_slow(bitmap)
+
+
+def test_bitblt_ors_and_clips():
+    dst = Bitmap(4, 3)
+    src = Bitmap.from_array(np.array([[1, 0], [0, 1]]))
+    dst.bitblt(src, 0, 0)
+    dst.bitblt(src, 1, 0)
+    dst.bitblt(src, 3, 2)
+    dst.bitblt(src, -1, -1)
+    assert dst.array.tolist() == [[1, 1, 0, 0],
+                                  [0, 1, 1, 0],
+                                  [0, 0, 0, 1]]
+
+
+def _font(font: Fonts, size, atlas_dir):
+    return Font(ASSETS_PATH / 'fonts' / font.value, size, atlas_dir=atlas_dir)
+
+
+def test_render_text(tmp_path):
+    fnt = _font(Fonts.courier_new, 20, tmp_path)
+    bm = fnt.render_text(string.ascii_letters)
+    assert bm.array.shape == (bm.height, bm.width)
+    assert bm.array.any()
+    bordered = bm.add_border()
+    n = (bordered.width - bm.width) // 2
+    assert (bordered.array[n:-n, n:-n] == bm.array).all()
+
+
+@pytest.mark.parametrize('font', [Fonts.courier_new, Fonts.futura])
+def test_glyph_atlas(tmp_path, font):
+    text = 'AVA Wa To. ' + string.printable
+    expected = _font(font, 30, None).render_text(text)
+
+    _font(font, 30, tmp_path).glyph_for_character('a')
+    atlas = GlyphAtlas.load(atlas_path(ASSETS_PATH / 'fonts' / font.value, 30, tmp_path))
+    assert len(atlas) == len(string.printable)
+
+    cold = _font(font, 30, tmp_path)
+    assert cold.render_text(text).pixels == expected.pixels
+    assert cold._face is None
+
+    assert cold.render_text('née').pixels == _font(font, 30, None).render_text('née').pixels
+
+
+def test_layout(tmp_path):
+    fnt = _font(Fonts.futura, 30, tmp_path)
+    layout = fnt.layout('AVA To')
+    assert fnt.layout('AVA To') is layout
+    assert fnt.text_dimensions('AVA To') == layout.dims
+    assert fnt.kerning_table.get('AV', 0) < 0
+
+    # kerning pulls the V in under the A
+    (a, a_x), (v, v_x), *_ = layout.glyphs
+    assert v_x < a_x + a.advance_width
+    assert layout.render().pixels == fnt.render_text('AVA To').pixels
+
+
+def test_area_resample_matches_weights():
+    rng = np.random.default_rng(0)
+    arr = rng.random((37, 101))
+    expected = area_weights(37, 16) @ arr @ area_weights(101, 43).T
+    assert np.allclose(area_resample(arr, (16, 43)), expected)
+
+
+def test_to_color_matrix(tmp_path):
+    fnt = _font(Fonts.courier_new, 40, tmp_path)
+    text = '!! sunny, 54 !!'
+    cm = fnt.to_color_matrix(text, height=16)
+    im = fnt.to_image(text)
+    assert (len(cm), len(cm[0])) == (16, int(im.width * 16 / im.height))
+    pil = fnt._to_color_matrix_pil(text, height=16)
+    assert np.abs(np.array(cm, dtype=float) - np.array(pil, dtype=float)).mean() < 8
@@ -0,0 +1,93 @@
+import gc
+import random
+import weakref
+
+import pytest
+
+pytest.importorskip('lifxlan3')
+
+from lifxlan3 import Colors
+from lifxlan3.routines.tile.tile_utils import RC, ColorMatrix, default_color
+
+from utils.lights.frame_diff import FrameDiffTransport, LocalDevice, Rect, TileChainDevice
+
+__author__ = 'acushner'
+
+
+def _blank():
+    return ColorMatrix.from_shape(RC(16, 16), default_color)
+
+
+def test_only_changes_sent():
+    transport = FrameDiffTransport(LocalDevice())
+    cm = _blank()
+    assert len(transport.send(cm)) == 4
+    assert transport.send(cm) == []
+
+    cm[9][3] = Colors.RED
+    cm[10][5] = Colors.RED
+    delta, = transport.send(cm)
+    assert delta.tile == RC(1, 0)
+    assert delta.rect == Rect(RC(1, 3), RC(2, 3))
+    assert delta.colors == [Colors.RED, default_color, default_color, default_color, default_color, Colors.RED]
+
+    assert transport.stats.messages == 5
+    assert transport.stats.messages_saved == 7
+    assert transport.stats.bytes_saved > 0
+
+
+def test_local_device_matches():
+    random.seed(0)
+    device = LocalDevice()
+    transport = FrameDiffTransport.for_device(device, keyframe_every=10)
+    assert FrameDiffTransport.for_device(device) is transport
+
+    cm = _blank()
+    for _ in range(50):
+        for _ in range(random.randrange(4)):
+            cm[random.randrange(16)][random.randrange(16)] = random.choice([Colors.RED, Colors.GREEN, default_color])
+        transport.send(cm)
+        assert device.cm == cm
+    assert transport.stats.keyframes == 5
+
+
+def test_keyframe_cadence():
+    transport = FrameDiffTransport(LocalDevice(), keyframe_every=4)
+    cm = _blank()
+    keyframes = []
+    for i in range(13):
+        cm[0][0] = Colors.RED if i % 2 else default_color
+        prev = transport.stats.keyframes
+        transport.send(cm)
+        if transport.stats.keyframes > prev:
+            keyframes.append(i)
+    assert keyframes == [0, 4, 8, 12]
+
+
+def test_for_device_does_not_keep_device():
+    device = LocalDevice()
+    transport = FrameDiffTransport.for_device(device)
+    transport.send(_blank())
+    ref = weakref.ref(device)
+    del device, transport
+    gc.collect()
+    assert ref() is None
+
+
+def test_shapes():
+    device = LocalDevice(RC(48, 48))
+    transport = FrameDiffTransport(device)
+    cm = ColorMatrix.from_shape(RC(48, 48), default_color)
+    cm[47][47] = Colors.RED
+    assert len(transport.send(cm)) == 36
+    assert device.cm == cm
+
+    with pytest.raises(ValueError):
+        transport.send(_blank())
+    with pytest.raises(ValueError):
+        LocalDevice(RC(12, 16))
+
+    chain = TileChainDevice(None, shape=RC(16, 24))
+    assert chain._tile_indices[RC(1, 2)] == 5
+    with pytest.raises(ValueError):
+        TileChainDevice(None, {RC(0, 0): 0}, shape=RC(16, 16))
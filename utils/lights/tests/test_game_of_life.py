@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from utils.core import Coord
+from utils.lights.game_of_life import (BSRule, BigPatterns, BitPackedEngine, DenseEngine, GameOfLife, Patterns,
+                                       SparseEngine, select_engine)
+
+engines = 'sparse', 'dense', 'bitpacked'
+rules = 'B3/S23', 'B36/S23', 'B2/S', 'B3678/S34678'
+
+
+@pytest.mark.parametrize('wrap', [False, True])
+@pytest.mark.parametrize('rule', rules)
+def test_engines_agree(rule, wrap):
+    rng = random.Random(rule)
+    for _ in range(10):
+        shape = rng.randint(1, 20), rng.randint(1, 20)
+        alive = {Coord(rng.randrange(shape[1]), rng.randrange(shape[0])) for _ in range(shape[0] * shape[1] // 3)}
+        gols = [GameOfLife(BSRule.from_str(rule), alive, shape=shape, wrap=wrap, engine=e) for e in engines]
+        for _ in range(12):
+            expected = gols[0].alive
+            assert all(g.alive == expected for g in gols[1:])
+            for g in gols:
+                g.tick()
+
+
+@pytest.mark.parametrize('engine, shape, wrap', [('sparse', None, False), ('hashlife', None, False),
+                                                 *((e, (12, 10), w) for e in engines for w in (False, True))])
+def test_tick_returns_changes(engine, shape, wrap):
+    gol = GameOfLife.from_pattern(Patterns.glider, shape=shape, wrap=wrap, engine=engine)
+    for _ in range(30):
+        prev = gol.alive
+        assert gol.engine.tick() == prev ^ gol.alive
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_glider_wraps(engine):
+    gol = GameOfLife.from_pattern(Patterns.glider, shape=(8, 8), wrap=True, engine=engine)
+    start = gol.alive
+    for _ in range(4 * 8):
+        gol.tick()
+    assert gol.alive == start
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_cordership(engine):
+    p = BigPatterns.two_engine_cordership
+    unbounded = GameOfLife.from_pattern(p, engine='sparse')
+    gol = GameOfLife.from_pattern(p, shape=(64, 64), engine=engine)
+    for _ in range(24):
+        unbounded.tick()
+        gol.tick()
+    assert gol.alive == unbounded.alive
+
+
+def test_select_engine():
+    assert select_engine(Patterns.glider.start) is SparseEngine
+    assert select_engine(Patterns.glider.start, (16, 16)) is BitPackedEngine
+    assert select_engine(Patterns.glider.start, (1024, 1024)) is SparseEngine
+    soup = {Coord(x, y) for x in range(64) for y in range(64) if (x * y) % 5 == 0}
+    assert select_engine(soup, (64, 64)) is DenseEngine
+    assert select_engine(soup, (1024, 1024)) is BitPackedEngine
+    assert select_engine({c for c in soup if c.x < 16 and c.y < 16}, (16, 16)) is BitPackedEngine
+    with pytest.raises(ValueError):
+        GameOfLife.from_pattern(Patterns.glider, engine='bitpacked')
+
+
+@pytest.mark.parametrize('p', [*Patterns, BigPatterns.two_engine_cordership])
+def test_hashlife_matches_sparse(p):
+    sparse = GameOfLife.from_pattern(p, engine='sparse')
+    hashlife = GameOfLife.from_pattern(p, engine='hashlife')
+    for n in 1, 2, 3, 5, 8, 13, 30:
+        sparse.advance(n)
+        hashlife.advance(n)
+        assert hashlife.alive == sparse.alive
+    assert hashlife.generation == sparse.generation == 62
+
+
+def test_hashlife_rule_and_memory_cap():
+    rule = BSRule.from_str('B36/S23')
+    sparse = GameOfLife(rule, set(BigPatterns.two_engine_cordership.start), engine='sparse')
+    hashlife = GameOfLife(rule, set(BigPatterns.two_engine_cordership.start), engine='hashlife', max_nodes=2000)
+    sparse.advance(100)
+    hashlife.advance(100)
+    assert hashlife.alive == sparse.alive
+    assert len(hashlife.engine._universe) <= 2000
+
+    with pytest.raises(ValueError):
+        GameOfLife(BSRule.from_str('B03/S23'), set(), engine='hashlife')
+
+
+def test_period():
+    blinker = {Coord(1, 0), Coord(1, 1), Coord(1, 2)}
+    gol = GameOfLife(BSRule.from_str('B3/S23'), blinker, shape=(5, 5))
+    gol.tick()
+    assert gol.period is None
+    gol.tick()
+    assert gol.period == 2 and not gol.is_static
+    assert gol.settled_at == 0
+
+    block = {Coord(0, 0), Coord(0, 1), Coord(1, 0), Coord(1, 1), Coord(4, 4)}
+    gol = GameOfLife(BSRule.from_str('B3/S23'), block)
+    gol.tick()
+    assert gol.period is None
+    gol.tick()
+    assert gol.is_static and gol.settled_at == 1
+
+
+def test_period_glider_on_torus():
+    gol = GameOfLife.from_pattern(Patterns.glider, shape=(8, 8), wrap=True)
+    for _ in range(31):
+        gol.tick()
+        assert gol.period is None
+    gol.tick()
+    assert gol.period == 32
+
+    unbounded = GameOfLife.from_pattern(Patterns.glider, history_len=64)
+    unbounded.advance(3)
+    for _ in range(40):
+        unbounded.tick()
+    assert unbounded.period is None
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('lifxlan3')
+
+from lifxlan3 import Colors
+from lifxlan3.routines.tile.tile_utils import RC
+
+from utils.assets_path import ASSETS_PATH
+from utils.lights.font_to_bitmap import Font, Fonts, area_resample, area_weights, color_levels, overlap_weights
+from utils.lights.marquee import Marquee
+
+__author__ = 'acushner'
+
+
+def test_area_resample():
+    arr = np.arange(36, dtype=float).reshape(6, 6)
+    assert np.allclose(area_resample(arr, (3, 2)), arr.reshape(3, 2, 2, 3).mean(axis=(1, 3)))
+    assert np.allclose(area_weights(7, 3).sum(axis=1), 1)
+
+
+def _kern_non_ascii(fnt: Font, monkeypatch):
+    """a big negative kerning for a pair that isn't in the font's kerning table"""
+    kerning_offset = fnt.kerning_offset
+    monkeypatch.setattr(fnt, 'kerning_offset', lambda a, b: -30 if (a, b) == ('é', 'W') else kerning_offset(a, b))
+    assert 'éW' not in fnt.kerning_table
+
+
+@pytest.mark.parametrize('font, text', [(Fonts.courier_new, '!! AVA To. Wa, 54 degrees !!'),
+                                        (Fonts.futura, '!! AVA To. Wa, 54 degrees !!'),
+                                        (Fonts.courier_new, 'ab caféWW xyz')])
+def test_columns_match_full_render(tmp_path, monkeypatch, font, text):
+    """streaming should give exactly what downsampling the fully rendered text would"""
+    fnt = Font(ASSETS_PATH / 'fonts' / font.value, 40, atlas_dir=tmp_path)
+    if 'é' in text:
+        _kern_non_ascii(fnt, monkeypatch)
+    cols = np.stack(list(Marquee(fnt, text).columns()), axis=1)
+
+    full = fnt.render_text(text).add_border().array
+    scale = full.shape[0] / 16
+    rows = area_weights(full.shape[0], 16) @ full
+    expected = np.stack([rows @ overlap_weights(j * scale, scale, np.arange(full.shape[1]))
+                         for j in range(int(full.shape[1] / scale))], axis=1)
+    assert (cols == np.rint(255 * expected)).all()
+
+
+def test_frames(tmp_path):
+    fnt = Font(ASSETS_PATH / 'fonts' / Fonts.courier_new.value, 30, atlas_dir=tmp_path)
+    m = Marquee(fnt, 'hi', Colors.RED, RC(16, 8))
+    num_cols = sum(1 for _ in m.columns())
+    frames = list(m.frames())
+    assert len(frames) == num_cols + 8
+    assert all(len(cm) == 16 and len(cm[0]) == 8 for cm in frames)
+
+    off = color_levels(Colors.RED)[0]
+    assert {c for row in frames[-1] for c in row} == {off}
+    assert any(c != off for cm in frames for row in cm for c in row)
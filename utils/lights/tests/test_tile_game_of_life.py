@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('lifxlan3')
+
+from utils.lights.game_of_life import BigPatterns, GameOfLife, Patterns, SparseEngine
+from utils.lights.tile_game_of_life import TileGameOfLife, _board_padding
+
+__author__ = 'acushner'
+
+
+@pytest.mark.parametrize('p', [Patterns.glider, Patterns.pulsar, BigPatterns.two_engine_cordership])
+def test_padded_board_matches_unbounded(p):
+    tgol = TileGameOfLife(p, shape=(48, 48))
+    unbounded = GameOfLife.from_pattern(p, engine='sparse')
+    # long enough that moving patterns have to rebuild the board
+    for _ in range(8 * _board_padding):
+        assert tgol.alive == unbounded.alive
+        expected = np.zeros((48, 48), dtype=bool)
+        for x, y in unbounded.alive:
+            expected[y % 48, x % 48] = True
+        assert (tgol._alive_mask == expected).all()
+        tgol.tick()
+        unbounded.tick()
+
+
+def test_cordership_runs_bounded():
+    tgol = TileGameOfLife.from_pattern(BigPatterns.two_engine_cordership)
+    assert tgol._gol.engine.shape and not isinstance(tgol._gol.engine, SparseEngine)
@@ -2,25 +2,43 @@ import os
 import time
 from collections import defaultdict
 import random
-from typing import Optional, NamedTuple
+from typing import Optional, NamedTuple, Set
 
+import numpy as np
 from lifxlan3 import Colors, timer
 from lifxlan3.routines.tile.core import set_cm
 from lifxlan3.routines.tile.tile_utils import RC, ColorMatrix
 
+from utils.core import Coord
+from utils.lights.frame_diff import FrameDiffTransport
 from utils.lights.game_of_life import GameOfLife, Patterns, Pattern, BigPatterns
-from utils.lights.color_func import ColorFunc, BaseColorFunc, PhaseColorFunc, default_color_func
+from utils.lights.color_func import ColorFunc, BaseColorFunc, PhaseColorFunc, default_color_func, to_frame_func
 
 __author__ = 'acushner'
 
 tile_shape = RC(16, 16)
 
+# empty cells around the pattern on every side of the board. a pattern grows at most one cell a
+# generation, so the board lasts at least this many generations before it has to be rebuilt
+_board_padding = 16
+
 
 class TileGameOfLife:
     def __init__(self, pattern: Pattern = Patterns.glider, color_func: ColorFunc = default_color_func, sleep_time=1.,
-                 *, rotate_every: Optional[int] = None, shape=tile_shape, run_time_secs=60, base_rotation=0):
-        self._gol = GameOfLife.from_pattern(pattern)
+                 *, rotate_every: Optional[int] = None, shape=tile_shape, run_time_secs=60, base_rotation=0,
+                 stop_at_period: Optional[int] = 2, linger_iterations=4):
+        """
+        once the board has died or settled into a cycle of at most `stop_at_period` generations,
+        `run` shows it for `linger_iterations` more (or a full cycle, if longer) and then stops.
+        set `stop_at_period` to `None` to always run for `run_time_secs`
+        """
+        # the board is bounded so a fast engine can run it, and padded so the pattern acts as if it
+        # were unbounded, see `_fit_board`. cells are only wrapped onto `shape` when drawn, see `_alive_mask`
+        self._rule = pattern.rule
+        self._fit_board(pattern.start)
         self._color_func = color_func
+        self._frame_func = to_frame_func(color_func)
+        self._rows, self._cols = np.indices(tuple(shape))
         self._rotate_every = rotate_every
         self._sleep_time = sleep_time
         self._shape = shape
@@ -28,6 +46,8 @@ class TileGameOfLife:
 
         self._cur_iteration = 0
         self._run_time_secs = run_time_secs
+        self._stop_at_period = stop_at_period
+        self._linger_iterations = linger_iterations
 
     @classmethod
     def from_pattern(cls, p: Pattern):
@@ -39,15 +59,49 @@ class TileGameOfLife:
                    rotate_every=int(random.random() > .8) and random.randrange(1, 12),
                    run_time_secs=random.randint(60, 180))
 
+    def _fit_board(self, alive):
+        """(re)build the board around `alive` (in pattern coords) with `_board_padding` empty cells on each side
+
+        a cell can only be born next to a living one, so while nothing is alive on the board's edge,
+        the next generation is exactly what it would be on an unbounded board. `tick` rebuilds
+        the board before that stops being true.
+        the engine is picked by `select_engine` for the padded board
+
+        rebuilding starts cycle detection over, but a pattern that reaches the edge is still growing
+        """
+        xs, ys = zip(*alive) if alive else ((0,), (0,))
+        self._origin = Coord(min(xs) - _board_padding, min(ys) - _board_padding)
+        shape = max(ys) - min(ys) + 1 + 2 * _board_padding, max(xs) - min(xs) + 1 + 2 * _board_padding
+        self._gol = GameOfLife(self._rule, {c + (-self._origin.x, -self._origin.y) for c in alive}, shape=shape)
+
+    @property
+    def _on_edge(self) -> bool:
+        num_rows, num_cols = self._gol.engine.shape
+        return any(c.x in (0, num_cols - 1) or c.y in (0, num_rows - 1) for c in self._gol.alive)
+
+    @property
+    def alive(self) -> Set[Coord]:
+        """living cells in pattern coords, i.e. as if the board were unbounded"""
+        return {c + self._origin for c in self._gol.alive}
+
+    @property
+    def _alive_mask(self) -> np.ndarray:
+        num_rows, num_cols = self._shape
+        res = np.zeros((num_rows, num_cols), dtype=bool)
+        if alive := self._gol.alive:
+            xs, ys = np.array(list(alive)).T
+            res[(ys + self._origin.y) % num_rows, (xs + self._origin.x) % num_cols] = True
+        return res
+
     @property
-    def _cur_colors(self):
-        alive = {RC(*reversed(c)) % self._shape for c in self._gol.alive}
-        return [self._color_func(rc, rc in alive, self._cur_iteration) for rc in RC(0, 0).to(self._shape)]
+    def _cur_colors(self) -> np.ndarray:
+        """(num_rows, num_cols) object array of colors"""
+        return self._frame_func(self._alive_mask, self._rows, self._cols, self._cur_iteration)
 
     @property
     @timer
     def cm(self):
-        cm = ColorMatrix.from_colors(self._cur_colors, self._shape)
+        cm = ColorMatrix(self._cur_colors.tolist())
         rotate = self._base_rotation
         if self._rotate_every:
             rotate += self._cur_iteration // self._rotate_every
@@ -58,10 +112,23 @@ class TileGameOfLife:
         return cm
 
     def tick(self):
+        if self._on_edge:
+            self._fit_board(self.alive)
         self._gol.tick()
         self._cur_iteration += 1
 
-    def run(self, *, in_terminal=False):
+    def should_stop(self) -> bool:
+        """early-exit hook for `run`: True once the board has settled and lingered long enough"""
+        period = self._gol.period
+        if self._stop_at_period is None or period is None or period > self._stop_at_period:
+            return False
+        return self._gol.generation - self._gol.settled_at >= max(period, self._linger_iterations)
+
+    def run(self, *, in_terminal=False, transport: Optional[FrameDiffTransport] = None):
+        """if `transport` is provided, send frames through it instead of `set_cm`"""
+        if transport and tuple(transport.device.shape) != tuple(size := max(tile_shape, self._shape)):
+            raise ValueError(f'frames are {tuple(size)} but the device shows {tuple(transport.device.shape)}: '
+                             f'create it with `shape={tuple(size)}`')
         start = time.time()
         transition_duration_msecs = 0
         if random.random() < 1:
@@ -69,11 +136,14 @@ class TileGameOfLife:
             transition_duration_msecs = 1000 * int(max(.5 * self._sleep_time, random.random() * self._sleep_time))
 
         print('TRANS', transition_duration_msecs)
-        while time.time() - start <= self._run_time_secs:
+        while time.time() - start <= self._run_time_secs and not self.should_stop():
             if in_terminal:
                 os.system('clear')
-            set_cm(self.cm, strip=False, in_terminal=in_terminal, size=max(tile_shape, self._shape), verbose=False,
-                   duration_msec=transition_duration_msecs)
+            if transport:
+                transport.send(self.cm, duration_msec=transition_duration_msecs)
+            else:
+                set_cm(self.cm, strip=False, in_terminal=in_terminal, size=max(tile_shape, self._shape),
+                       verbose=False, duration_msec=transition_duration_msecs)
             self.tick()
             time.sleep(self._sleep_time)
 